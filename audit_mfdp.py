@@ -0,0 +1,34 @@
+"""
+audit_mfdp.py: reads and checks every mfdp.dat under a directory
+
+- finds all the mfdp.dat files under search_dir (e.g. your scratch space)
+- reads and checks them in parallel
+- writes what it read to a file, one JSON record per line
+- prints the ones that couldn't be read or didn't make sense
+"""
+from os.path import realpath
+import json
+from sub_modules.file_manager import read_mfdp_tree
+
+# change these to suit your needs
+search_dir = realpath("./gpfs/alpine/nph123/scratch/navratil/")
+output_file = realpath("mfdp_audit.jsonl")
+n_workers = 16
+# True = use processes, quicker if the filesystem isn't the slow part
+processes = False
+
+if __name__ == "__main__":
+    n_good = 0
+    n_bad = 0
+    with open(output_file, "w") as open_file:
+        for path, params, error in read_mfdp_tree(
+                search_dir, n_workers=n_workers, processes=processes):
+            if error is not None:
+                n_bad += 1
+                print("BAD: " + path + "\n    " + error)
+                continue
+            n_good += 1
+            record = params.param_dict()
+            record["path"] = path
+            open_file.write(json.dumps(record) + "\n")
+    print(str(n_good)+" files ok, "+str(n_bad)+" bad, records in "+output_file)
@@ -0,0 +1,229 @@
+"""times each stage of making runs, for sweeps of increasing size
+
+run from the top directory with e.g.
+
+    python benchmarks/bench_generation.py --sizes 10 100 1000 10000
+
+Each stage is timed on its own for every sweep size, using a made-up
+frequency scan and fake interaction files in a scratch directory (on tmpfs
+if there is one), and the throughput and peak memory are printed.
+
+--save-baseline stores the results in benchmarks/baseline.json. Every run is
+compared against it, and stages that got slower or use more memory than
+--tolerance allows are flagged. The baseline in the repository was taken with
+the default sizes on a 1-CPU Linux box, times on another machine won't match
+it, so save your own there before changing anything.
+"""
+import sys
+import os
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from shutil import rmtree
+from contextlib import redirect_stdout
+from os.path import dirname, realpath, join, exists
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+from sub_modules.data_structures import ManParams, DefaultParamsObj, \
+    PolicyParams
+from sub_modules.parameter_calculations import calc_params
+from sub_modules.ncsd_multi_run import prepare_input, create_dirs
+from sub_modules.file_manager import MFDP, CedarBatch, Defaults, \
+    parse_mfdp
+from sub_modules.sweep import Product, make_sweep
+
+baseline_path = join(dirname(realpath(__file__)), "baseline.json")
+
+two_body = "TBMEA2srg-n3lo2.0_14.20_910"
+three_body = "v3trans_J3T3.int_3NFlocnonloc-srg2.0_from24_220_11109.20"
+
+base_params = ManParams(
+    Z=3, N=5, hbar_omega=20, N_1max=9, N_12max=10, N_123max=11,
+    two_body_interaction=two_body, three_body_interaction=three_body,
+    potential_name="NNn3lo_3NlnlcD0.7cE-0.06-srg2.0",
+    Nmax_min=0, Nmax_max=8, Nmax_IT=6, interaction_type=-3, n_states=10,
+    iterations_required=200, irest=0, nhw_restart=-1, kappa_points=4,
+    kappa_vals="2.0 3.0 5.0 10.0", kappa_restart=-1, saved_pivot="F",
+    time="0 8 0", mem=80.0, n_nodes=1024)
+
+# runs never ask questions in here
+quiet_policy = PolicyParams(
+    existing_dir="suffix", tbme_nmax_mismatch="warn",
+    tbme_freq_mismatch="warn", three_body_nmax_mismatch="warn",
+    three_body_freq_mismatch="warn", kappa_points_mismatch="warn",
+    int_file_problem="warn")
+
+
+def scratch_dir():
+    """somewhere quick to write, /dev/shm if it's there"""
+    if exists("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return tempfile.mkdtemp(prefix="ncsd_bench_", dir="/dev/shm")
+    return tempfile.mkdtemp(prefix="ncsd_bench_")
+
+
+def make_fake_paths(root):
+    """an int_dir with (one-line) interaction files, an exe and a
+    working_dir"""
+    int_dir = join(root, "int")
+    working_dir = join(root, "work")
+    os.mkdir(root)
+    os.mkdir(int_dir)
+    os.mkdir(working_dir)
+    for filename in [two_body, three_body]:
+        with open(join(int_dir, filename), "w") as open_file:
+            open_file.write("1 2 0.5\n")
+    ncsd_path = join(root, "ncsd-it.exe")
+    open(ncsd_path, "w").close()
+    return [int_dir, ncsd_path, working_dir]
+
+
+def sweep_of(n_runs):
+    """a frequency scan with n_runs runs"""
+    return Product(hbar_omega=[10 + 0.001 * i for i in range(n_runs)])
+
+
+def measure(function):
+    """runs function, returns (seconds, peak MB allocated while it ran)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 1e6
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def bench_size(n_runs, root, n_workers):
+    """times every stage for one sweep size, returns {stage: result}"""
+    paths = make_fake_paths(join(root, str(n_runs)))
+    working_dir = paths[2]
+    files_dir = join(root, str(n_runs), "files")
+    os.mkdir(files_dir)
+    run_list = make_sweep(base_params, sweep_of(n_runs))
+    dicts = [m.param_dict() for m in run_list]
+    calculated = [
+        calc_params(join(working_dir, "run"+str(i)), paths, m,
+                    DefaultParamsObj, "cedar")
+        for i, m in enumerate(run_list)]
+    mfdp_paths = [join(files_dir, "mfdp_"+str(i)+".dat")
+                  for i in range(n_runs)]
+
+    def expand():
+        for _ in prepare_input(base_params, sweep_of(n_runs)):
+            pass
+
+    def construct():
+        for run_dict in dicts:
+            ManParams(**run_dict)
+
+    def calculate():
+        for i, m in enumerate(run_list):
+            calc_params(join(working_dir, "run"+str(i)), paths, m,
+                        DefaultParamsObj, "cedar")
+
+    def write():
+        for i, (mfdp_params, batch_params) in enumerate(calculated):
+            MFDP(filename=mfdp_paths[i], params=mfdp_params).write()
+            CedarBatch(filename=join(files_dir, "batch_"+str(i)),
+                       params=batch_params).write()
+
+    def read():
+        # just parsing, the made-up frequencies don't match the TBME file
+        # so check_mfdp_read would (rightly) complain
+        for mfdp_path in mfdp_paths:
+            parse_mfdp(mfdp_path)
+
+    def make_dirs():
+        create_dirs(Defaults(), run_list, paths, "cedar",
+                    n_workers=n_workers, policy=quiet_policy)
+
+    results = {}
+    for stage, function in [("prepare_input", expand),
+                            ("Params", construct),
+                            ("calc_params", calculate),
+                            ("FileManager.write", write),
+                            ("parse_mfdp", read),
+                            ("create_dirs", make_dirs)]:
+        try:
+            # printed output goes nowhere, rather than piling up in memory
+            with open(os.devnull, "w") as devnull:
+                with redirect_stdout(devnull):
+                    seconds, peak = measure(function)
+        except Exception as e:
+            results[stage] = {"error": repr(e)}
+            continue
+        results[stage] = {
+            "seconds": seconds,
+            "runs_per_s": n_runs / seconds if seconds > 0 else float("inf"),
+            "peak_mb": peak}
+    return results
+
+
+def compare(key, result, baseline, tolerance):
+    """returns a note on how result compares to the baseline"""
+    if key not in baseline or "error" in baseline[key]:
+        return ""
+    old = baseline[key]
+    notes = []
+    if result["runs_per_s"] < old["runs_per_s"] * (1 - tolerance):
+        notes.append("SLOWER ({:.0%} of baseline)".format(
+            result["runs_per_s"] / old["runs_per_s"]))
+    if result["peak_mb"] > old["peak_mb"] * (1 + tolerance) \
+            and result["peak_mb"] - old["peak_mb"] > 1:
+        notes.append("MORE MEMORY ({:.1f} MB before)".format(old["peak_mb"]))
+    return ", ".join(notes) if notes else "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10, 100, 1000],
+                        help="numbers of runs to try, e.g. 10 100 100000")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="n_workers for create_dirs")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed fraction slower / bigger than baseline")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store these results as the new baseline")
+    args = parser.parse_args()
+
+    baseline = {}
+    if exists(baseline_path):
+        with open(baseline_path) as open_file:
+            baseline = json.load(open_file)
+    else:
+        print("no baseline yet, use --save-baseline to store one\n")
+
+    all_results = {}
+    root = scratch_dir()
+    print("scratch directory: " + root + "\n")
+    print("{:<18} {:>7} {:>10} {:>12} {:>9}  {}".format(
+        "stage", "runs", "seconds", "runs/s", "peak MB", "vs baseline"))
+    try:
+        for n_runs in args.sizes:
+            for stage, result in bench_size(
+                    n_runs, root, args.workers).items():
+                key = stage + "/" + str(n_runs)
+                all_results[key] = result
+                if "error" in result:
+                    print("{:<18} {:>7}  failed: {}".format(
+                        stage, n_runs, result["error"]))
+                    continue
+                print("{:<18} {:>7} {:>10.3f} {:>12.0f} {:>9.1f}  {}".format(
+                    stage, n_runs, result["seconds"], result["runs_per_s"],
+                    result["peak_mb"],
+                    compare(key, result, baseline, args.tolerance)))
+    finally:
+        rmtree(root)
+
+    if args.save_baseline:
+        baseline.update(all_results)
+        with open(baseline_path, "w") as open_file:
+            json.dump(baseline, open_file, indent=2, sort_keys=True)
+        print("\nsaved baseline to " + baseline_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""checks the compiled renderers against str.format, and times them
+
+run from the top directory with: python benchmarks/bench_render.py
+"""
+import sys
+import time
+import tempfile
+from os.path import dirname, realpath, join
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+from sub_modules.data_structures import ManParams, DefaultParamsObj
+from sub_modules.parameter_calculations import calc_params
+from sub_modules.renderer import renderers
+
+n_renders = 20000  # renders per template for the timings
+n_files = 2000  # files written for the write timings
+
+man_params = ManParams(
+    Z=3, N=5, hbar_omega=20, N_1max=9, N_12max=10, N_123max=11,
+    two_body_interaction="TBMEA2srg-n3lo2.0_14.20_910",
+    three_body_interaction="v3trans_J3T3.int_3NFlocnonloc-srg2.0_from24_220_11109.20",
+    potential_name="NNn3lo_3NlnlcD0.7cE-0.06-srg2.0",
+    Nmax_min=0, Nmax_max=8, Nmax_IT=6, interaction_type=-3, n_states=10,
+    iterations_required=200, irest=0, nhw_restart=-1, kappa_points=4,
+    kappa_vals="2.0 3.0 5.0 10.0", kappa_restart=-1, saved_pivot="F",
+    time="0 8 0", mem=80.0, n_nodes=1024)
+paths = ["/int", "/ncsd-it.exe", "/work"]
+mfdp_params, cedar_params = calc_params(
+    "/work/Li8", paths, man_params, DefaultParamsObj, "cedar")
+_, summit_params = calc_params(
+    "/work/Li8", paths, man_params, DefaultParamsObj, "summit")
+
+
+def timed(function, repeats):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return time.perf_counter() - start
+
+
+print("{:<14} {:>12} {:>12} {:>8}".format(
+    "template", "format (s)", "compiled (s)", "speedup"))
+for filetype, params in [("MFDP", mfdp_params),
+                         ("CEDAR_BATCH", cedar_params),
+                         ("SUMMIT_BATCH", summit_params)]:
+    renderer = renderers[filetype]
+    old = renderer.format_string.format(**params.param_dict())
+    new = renderer.render_params(params)
+    if old.encode() != new.encode():
+        raise ValueError(filetype + " output is not byte-identical!")
+    t_old = timed(
+        lambda: renderer.format_string.format(**params.param_dict()),
+        n_renders)
+    t_new = timed(lambda: renderer.render_params(params), n_renders)
+    print("{:<14} {:>12.3f} {:>12.3f} {:>7.1f}x".format(
+        filetype, t_old, t_new, t_old / t_new))
+
+# writing many mfdp.dat files from columns, e.g. a whole frequency scan
+renderer = renderers["MFDP"]
+row = mfdp_params.param_dict()
+columns = {key: [value] * n_files for key, value in row.items()}
+columns["hbar_omega"] = [10 + i % 30 for i in range(n_files)]
+with tempfile.TemporaryDirectory() as tmp:
+    filenames = [join(tmp, "mfdp_"+str(i)+".dat") for i in range(n_files)]
+    start = time.perf_counter()
+    renderer.write_many(filenames, columns)
+    t_many = time.perf_counter() - start
+    # check a file against str.format
+    row["hbar_omega"] = columns["hbar_omega"][-1]
+    with open(filenames[-1]) as open_file:
+        if open_file.read() != renderer.format_string.format(**row):
+            raise ValueError("write_many output is not byte-identical!")
+print("write_many: {} files in {:.3f} s ({:.0f} files/s)".format(
+    n_files, t_many, n_files / t_many))
@@ -0,0 +1,138 @@
+"""a stand-in for sbatch / squeue, to try the job monitor without a cluster
+
+run from the top directory with e.g.
+
+    python benchmarks/fake_scheduler.py --cap 10 demo --runs 40
+
+which makes some fake runs, and feeds them through the monitor
+(sub_modules/monitor.py) into this "scheduler", checking that it never has
+more than --cap jobs queued and that every run finishes.
+
+The scheduler itself is the submit and status commands:
+
+    python benchmarks/fake_scheduler.py submit <batch file>
+    python benchmarks/fake_scheduler.py status
+
+Jobs don't actually run: each one is PENDING until one of --slots is free,
+RUNNING for --seconds, then gone. Submitting with a full queue fails like
+sbatch does when you're over the per-user limit. The state is kept in a
+JSON file (--state), locked while it's being changed, so parallel
+submissions are fine.
+"""
+import sys
+import json
+import time
+import fcntl
+import asyncio
+import argparse
+import tempfile
+from os import mkdir
+from os.path import dirname, realpath, join, exists
+sys.path.insert(0, dirname(dirname(realpath(__file__))))
+
+from sub_modules.monitor import Monitor
+
+default_state = join(tempfile.gettempdir(), "fake_scheduler.json")
+
+
+def update(state_path, slots, seconds, change=None):
+    """moves jobs along (pending --> running --> gone), then applies change
+    (a function taking the state) if given, all under a lock"""
+    with open(state_path + ".lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        state = {"next_id": 1000, "jobs": []}
+        if exists(state_path):
+            with open(state_path) as open_file:
+                state = json.load(open_file)
+        now = time.time()
+        jobs = [job for job in state["jobs"]
+                if job["start"] is None or now - job["start"] < seconds]
+        running = sum(job["start"] is not None for job in jobs)
+        for job in jobs:
+            if job["start"] is None and running < slots:
+                job["start"] = now
+                running += 1
+        state["jobs"] = jobs
+        result = change(state) if change is not None else None
+        with open(state_path, "w") as open_file:
+            json.dump(state, open_file)
+    return state, result
+
+
+def submit(args):
+    def add_job(state):
+        if len(state["jobs"]) >= args.cap:
+            return None
+        job_id = state["next_id"]
+        state["next_id"] += 1
+        state["jobs"].append({"id": job_id, "batch": args.batch_path,
+                              "start": None})
+        return job_id
+    _, job_id = update(args.state, args.slots, args.seconds, add_job)
+    if job_id is None:
+        print("sbatch: error: QOSMaxSubmitJobPerUserLimit")
+        sys.exit(1)
+    print("Submitted batch job " + str(job_id))
+
+
+def status(args):
+    state, _ = update(args.state, args.slots, args.seconds)
+    for job in state["jobs"]:
+        print(str(job["id"]) + " " +
+              ("PENDING" if job["start"] is None else "RUNNING"))
+
+
+def demo(args):
+    work_dir = tempfile.mkdtemp()
+    state_path = join(work_dir, "scheduler.json")
+    batch_paths = []
+    for i in range(args.runs):
+        run_dir = join(work_dir, "run_" + str(i))
+        mkdir(run_dir)
+        batch_paths.append(join(run_dir, "batch_ncsd"))
+        open(batch_paths[-1], "w").close()
+    options = ["--state", state_path, "--slots", str(args.slots),
+               "--seconds", str(args.seconds), "--cap", str(args.cap)]
+    command = [sys.executable, realpath(__file__)]
+    monitor = Monitor(
+        "cedar", queue_cap=args.cap, poll_interval=args.seconds / 2,
+        submit_command=command + options + ["submit"],
+        status_command=command + options + ["status"])
+
+    # check the queue never goes over the cap, as the monitor sees it
+    most_queued = [0]
+    poll = monitor.poll
+
+    async def checked_poll():
+        n_queued = await poll()
+        most_queued[0] = max(most_queued[0], n_queued)
+        return n_queued
+    monitor.poll = checked_poll
+
+    start = time.time()
+    counts = asyncio.run(monitor.feed(batch_paths))
+    print("{} runs in {:.1f} s, at most {} queued at once".format(
+        args.runs, time.time() - start, most_queued[0]))
+    if counts.get("left_queue", 0) != args.runs or most_queued[0] > args.cap:
+        print("FAILED: " + str(counts))
+        sys.exit(1)
+    print("ok")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--state", default=default_state)
+    parser.add_argument("--slots", type=int, default=4,
+                        help="jobs that can run at once")
+    parser.add_argument("--seconds", type=float, default=2.0,
+                        help="how long each job runs")
+    parser.add_argument("--cap", type=int, default=10,
+                        help="most jobs that can be queued at once")
+    commands = parser.add_subparsers(dest="command")
+    submit_parser = commands.add_parser("submit")
+    submit_parser.add_argument("batch_path")
+    commands.add_parser("status")
+    demo_parser = commands.add_parser("demo")
+    demo_parser.add_argument("--runs", type=int, default=40)
+    args = parser.parse_args()
+    {"submit": submit, "status": status, "demo": demo}[args.command](args)
@@ -0,0 +1,51 @@
+"""shared fixtures for the tests in tests/
+
+Nothing a test does should end up in the user's home directory, so the
+per-user caches are pointed at a temporary directory for every test.
+"""
+import pytest
+from sub_modules import int_index, int_verify
+from sub_modules.data_structures import ManParams
+
+
+@pytest.fixture(autouse=True)
+def user_caches(tmp_path, monkeypatch):
+    """per-user cache files in tmp_path, and no indexes left over from
+    earlier tests"""
+    monkeypatch.setattr(int_index, "cache_path",
+                        str(tmp_path / "int_index.json"))
+    monkeypatch.setattr(int_verify, "cache_path",
+                        str(tmp_path / "int_verified.json"))
+    monkeypatch.setattr(int_index, "loaded_indexes", {})
+
+
+two_body = "TBMEA2srg-n3lo2.0_14.20_910"
+three_body = "v3trans_J3T3.int_3NFlocnonloc-srg2.0_from24_220_11109.20"
+
+
+@pytest.fixture
+def man_params():
+    """the parameters of one Li8 run, like the example in ncsd_multi.py"""
+    return ManParams(
+        Z=3, N=5, hbar_omega=20, N_1max=9, N_12max=10, N_123max=11,
+        two_body_interaction=two_body, three_body_interaction=three_body,
+        potential_name="NNn3lo", Nmax_min=0, Nmax_max=8, Nmax_IT=6,
+        interaction_type=-3, n_states=10, iterations_required=200, irest=0,
+        nhw_restart=-1, kappa_points=4, kappa_vals="2.0 3.0 5.0 10.0",
+        kappa_restart=-1, saved_pivot="F", time="0 8 0", mem=80.0,
+        n_nodes=4)
+
+
+@pytest.fixture
+def paths(tmp_path):
+    """[int_dir, ncsd_path, working_dir] with (one-line) interaction files
+    and an empty ncsd-it.exe"""
+    int_dir = tmp_path / "int"
+    working_dir = tmp_path / "work"
+    int_dir.mkdir()
+    working_dir.mkdir()
+    for filename in [two_body, three_body]:
+        (int_dir / filename).write_text("1 2 0.5\n")
+    ncsd_path = tmp_path / "ncsd-it.exe"
+    ncsd_path.write_text("")
+    return [str(int_dir), str(ncsd_path), str(working_dir)]
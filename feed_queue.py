@@ -0,0 +1,28 @@
+"""
+feed_queue.py: submits written runs a few at a time, and keeps track of them
+
+- takes every run in the catalog that's been written but not submitted
+  (make them with run=False in ncsd_multi.py, with a catalog_path)
+- submits them until queue_cap of your jobs are queued, then checks the
+  queue every poll_interval seconds and submits more as jobs leave it
+- records each run's state (submitted / running / left_queue) in the catalog
+- stops once every run has left the queue, so leave it running (e.g. in
+  screen or tmux) for big sweeps
+"""
+from os.path import realpath, join
+from sub_modules.monitor import monitor_runs
+
+# change these to suit your needs
+machine = "cedar"
+working_dir = realpath("./gpfs/alpine/nph123/scratch/navratil/")
+catalog_path = join(working_dir, "ncsd_runs.db")
+# most of your jobs (including ones that aren't ncsd) queued at once,
+# cedar allows 1000 per user
+queue_cap = 1000
+# seconds between checks of the queue, please don't hammer the scheduler
+poll_interval = 300
+
+if __name__ == "__main__":
+    counts = monitor_runs(machine, catalog_path=catalog_path,
+                          queue_cap=queue_cap, poll_interval=poll_interval)
+    print(counts)
@@ -0,0 +1,28 @@
+"""
+harvest_results.py: collects the energies of every finished run
+
+- finds every renamed mfd.log (mfd.log_<output file>) under search_dir
+- reads the ones that are new or changed since last time, in parallel
+- adds each state (Nmax, kappa, energy, J, T, and what the run was) to the
+  results store in results_dir, see sub_modules/harvester.py
+"""
+from os.path import realpath, join
+from sub_modules.harvester import harvest, ResultsStore
+
+# change these to suit your needs
+search_dir = realpath("./gpfs/alpine/nph123/scratch/navratil/")
+results_dir = join(search_dir, "results")
+n_workers = 16
+# True = use processes, quicker if the filesystem isn't the slow part
+processes = False
+# rewrite the store as one chunk afterwards (worth it now and then)
+compact = False
+
+if __name__ == "__main__":
+    n_logs, n_rows, n_problems = harvest(
+        search_dir, results_dir, n_workers=n_workers, processes=processes)
+    print(str(n_logs) + " logs read, " + str(n_rows) + " states added, " +
+          str(n_problems) + " logs couldn't be read")
+    if compact:
+        ResultsStore(results_dir).compact()
+    print("results in " + results_dir)
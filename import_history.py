@@ -0,0 +1,31 @@
+"""
+import_history.py: records how long past runs took and how much memory
+they used, for sizing new runs (see sizing in ncsd_multi.py)
+
+- takes the submitted runs in the catalog, and/or every run under search_dir
+  (for runs made before there was a catalog)
+- asks the scheduler (sacct / bjobs) how long each job took and its peak
+  memory, or reads the time from mfd.log if the scheduler has forgotten it
+- adds one JSON record per run to history_file
+"""
+from os.path import realpath, join, exists
+from sub_modules.resource_model import import_catalog, import_run_dirs
+
+# change these to suit your needs
+machine = "summit"
+working_dir = realpath("./gpfs/alpine/nph123/scratch/navratil/")
+catalog_path = join(working_dir, "ncsd_runs.db")
+# None to only use the catalog
+search_dir = working_dir
+history_file = join(working_dir, "resource_history.jsonl")
+n_workers = 8
+
+if __name__ == "__main__":
+    if exists(catalog_path):
+        added = import_catalog(catalog_path, history_file)
+        print(str(added) + " runs added from " + catalog_path)
+    if search_dir is not None:
+        added = import_run_dirs(search_dir, machine, history_file,
+                                n_workers=n_workers)
+        print(str(added) + " runs added from " + search_dir)
+    print("history in " + history_file)
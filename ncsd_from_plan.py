@@ -0,0 +1,24 @@
+"""
+ncsd_from_plan.py: makes (and submits) the runs in a plan from ncsd_multi.py
+
+- run ncsd_multi.py with plan_path set first, that makes the plan
+- then this writes every run in it, exactly as planned, without checking
+  the input again
+- more details in README.md
+"""
+from os.path import realpath
+from sub_modules.manifest import generate_from_manifest
+
+# change these to suit your needs
+plan_path = realpath("plan.json")
+n_workers = 8  # number of threads writing run directories
+job_array = False  # these are the same as in ncsd_multi.py
+max_running = 0
+task_farm = False
+farm_slots = 4
+catalog_path = None  # SQLite file recording the runs, None to not keep one
+
+generate_from_manifest(plan_path, run=False,  # run all batch scripts?
+                       n_workers=n_workers, job_array=job_array,
+                       max_running=max_running, task_farm=task_farm,
+                       farm_slots=farm_slots, catalog_path=catalog_path)
@@ -8,9 +8,9 @@ ncsd_multi.py: facilitates running ncsd-it.exe with many nuclei
     - runs each process at the end, if desired
 - more details in README.md
 """
-from os.path import realpath
+from os.path import realpath, join
 import sys
-from sub_modules.data_structures import ManParams
+from sub_modules.data_structures import ManParams, PolicyParams
 from sub_modules.ncsd_multi_run import ncsd_multi_run
 from sub_modules.data_checker import get_int_dir
 
@@ -24,9 +24,10 @@ int_dir = realpath("./gpfs/alpine/nph123/scratch/navratil/int/")
 # you can also get int_dir from environment variable INT_DIR:
 # int_dir = get_int_dir()
 
-# set machine name, make sure it's valid
+# set machine name, make sure it's valid: "cedar", "summit", or "local" to
+# run on this computer without a scheduler (see sub_modules/backends.py)
 machine = "summit"
-assert machine in ["cedar", "summit"]
+assert machine in ["cedar", "summit", "local"]
 
 # PARAMETERS -- specify all as single parameter or list []
 man_params = ManParams(
@@ -66,8 +67,84 @@ man_params = ManParams(
     n_nodes=1024  # number of nodes
 )
 
+# optional: a sweep over combinations of parameters, see README.md
+# parameters set here override the ones in man_params, e.g.
+# from sub_modules.sweep import Product, Zip
+# sweep = Product(Zip(Z=[3, 3], N=[5, 6]), hbar_omega=[16, 20, 24])
+sweep = None
+
+# optional: pick time, mem and n_nodes for each run from how long past runs
+# took and how much memory they used (see import_history.py), instead of the
+# ones in man_params. The margins multiply the predictions, to be safe.
+# from sub_modules.resource_model import ResourceModel
+# sizing = ResourceModel.from_history(
+#     join(working_dir, "resource_history.jsonl"),
+#     time_margin=1.5, mem_margin=1.3)
+sizing = None
+
+# optional: run ncsd-it.exe from each node's local disk, copying the
+# interaction files there once per node, rather than from working_dir
+# from sub_modules.backends import register, SummitBackend
+# register(SummitBackend(scratch=True))
+
 # default parameters can be found at the bottom of data_structures.py
 # (which is in the sub_modules directory)
 
+# number of threads used to write run directories (1 = one at a time)
+n_workers = 8
+# submit each run as soon as it's written, rather than after all are written
+stream = False
+# write every run into a hidden directory in working_dir first, and only move
+# them into place if they all worked (can't be used with stream)
+staged = False
+# submit all runs as one job array (per set of resources) instead of one job
+# per run, with at most max_running array tasks running at once (0 = no limit)
+job_array = False
+max_running = 0
+# or pack all runs into one job that runs farm_slots of them side by side
+# (good for lots of short runs, e.g. light nuclei at low Nmax)
+task_farm = False
+farm_slots = 4
+# or split each run into a chain of jobs, one per Nmax step (True), or ending
+# at the Nmax values in a list, each job sized for its own step
+chain = None
+# only write (and submit) runs that are new or changed since they were last
+# written, leaving the rest alone. existing_dir below says what to do with
+# changed runs ("overwrite" only rewrites their input files, never results)
+incremental = False
+# read all of each interaction file to check it (once per file), rather
+# than only its start and end, and keep a checksum of it
+full_int_check = False
+
+# what to do instead of asking questions, so this can run unattended
+policy = PolicyParams(
+    # if a run directory exists:
+    # "prompt", "overwrite", "skip", "suffix" or "fail"
+    existing_dir="prompt",
+    # if a filename doesn't match the parameters: "prompt", "warn", "fail"
+    tbme_nmax_mismatch="prompt",
+    tbme_freq_mismatch="prompt",
+    three_body_nmax_mismatch="prompt",
+    three_body_freq_mismatch="prompt",
+    # if there are more kappa_vals than kappa_points: "prompt", "warn", "fail"
+    kappa_points_mismatch="prompt",
+    # if an interaction file looks cut short or corrupt (see int_verify.py):
+    # "prompt", "warn", "fail"
+    int_file_problem="warn"
+)
+
+# set to a file name to only plan the runs: nothing is written except that
+# file (a manifest of every run), use ncsd_from_plan.py to make them later
+plan_path = None
+
+# SQLite file recording every run made / submitted, None to not keep one
+catalog_path = join(working_dir, "ncsd_runs.db")
+
 paths = [int_dir, ncsd_path, working_dir]
-ncsd_multi_run(man_params, paths, machine, run=False)  # run all batch scripts?
+ncsd_multi_run(man_params, paths, machine, run=False,  # run all batch scripts?
+               n_workers=n_workers, sweep=sweep, stream=stream,
+               job_array=job_array, max_running=max_running,
+               task_farm=task_farm, farm_slots=farm_slots, policy=policy,
+               catalog_path=catalog_path, staged=staged, plan_path=plan_path,
+               sizing=sizing, chain=chain, incremental=incremental,
+               full_int_check=full_int_check)
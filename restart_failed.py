@@ -0,0 +1,37 @@
+"""
+restart_failed.py: finds runs that failed, and restarts the ones it can
+
+- looks at every run in the catalog that has left the queue
+- works out why the ones that didn't finish failed (out of time, out of
+  memory, a node died, bad input...) from the scheduler and the logs
+- restarts the ones that more time / memory / another go will fix, from the
+  first Nmax (or kappa) that didn't finish, so nothing is done twice
+- prints what it did with each run, the rest are left for you to look at
+- with run=False (the default) the restarts are written but not submitted,
+  so you can look at them first (submit them with feed_queue.py)
+"""
+from os.path import realpath, join
+from sub_modules.restarts import restart_failed
+
+# change these to suit your needs, same as in ncsd_multi.py
+ncsd_path = realpath("ncsd-it.exe")
+working_dir = realpath("./gpfs/alpine/nph123/scratch/navratil/")
+int_dir = realpath("./gpfs/alpine/nph123/scratch/navratil/int/")
+machine = "summit"
+catalog_path = join(working_dir, "ncsd_runs.db")
+
+# runs that ran out of time get time_factor times as much, and out of
+# memory, mem_factor times as much memory (or twice the nodes)
+time_factor = 1.5
+mem_factor = 1.5
+# don't restart any run more than this many times
+max_restarts = 3
+
+if __name__ == "__main__":
+    paths = [int_dir, ncsd_path, working_dir]
+    report = restart_failed(catalog_path, paths, machine,
+                            run=False,  # submit the restarts?
+                            time_factor=time_factor, mem_factor=mem_factor,
+                            max_restarts=max_restarts)
+    n_finished = sum(kind is None for _, kind, _ in report)
+    print(str(n_finished) + " of " + str(len(report)) + " runs finished")
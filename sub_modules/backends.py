@@ -0,0 +1,474 @@
+"""where runs are run: one Backend per machine, looked up by name
+
+Everything about a run that depends on the machine goes through its
+Backend: the batch params and template (batch_params, write_batch), how
+batch files write times (format_time, parse_time), and how jobs are
+submitted and followed (submit, poll, wait). They're kept by name,
+
+    get_backend("cedar").submit("Li8/batch_ncsd")
+
+and a new machine is one more Backend subclass (a SchedulerBackend, if it
+has a queue to submit to) and a register() call. Anything a subclass has
+to have is an abstractmethod, so one that's missing some can't be made.
+register() also replaces one, e.g. for the local backend with other
+settings than the defaults:
+
+    register(LocalBackend(max_workers=16, cores_per_run=4))
+
+Backends can run ncsd-it.exe from each node's local disk (scratch) instead
+of from the run directory, so hundreds of ranks don't all read the
+interaction files from the shared filesystem at once:
+
+    register(SummitBackend(scratch=True))  # or a path on the nodes
+
+Each run directory then gets staged_ncsd.sh, which the batch file starts in
+place of ncsd-it.exe. It copies each interaction file to a node once (runs
+in a task farm that share one copy it), runs there, and copies the
+results back into the run directory (see formats.py). scratch=True is
+$SLURM_TMPDIR on cedar and the NVMe burst buffer on summit.
+
+cedar (Slurm) and summit (LSF) hand runs to the scheduler. "local" runs
+them itself, for small runs on a workstation or an interactive node with
+no scheduler: each batch file is run by bash, at most max_workers at once,
+pinned (with taskset) to its own cores_per_run CPUs, and its output goes
+to ncsd-local-<job ID>.out in the run directory. Submitting returns at
+once, wait() (called by Submitter.finish) returns when they've all run.
+"""
+import re
+import threading
+from abc import ABC, abstractmethod
+from os import cpu_count, sysconf
+from os.path import dirname, join
+from queue import Queue
+from shutil import which
+from getpass import getuser
+from subprocess import run, PIPE, STDOUT, DEVNULL
+from concurrent.futures import ThreadPoolExecutor, wait
+from .data_structures import CedarBatchParams, SummitBatchParams, \
+    LocalBatchParams
+from .renderer import renderers
+from .formats import mfdp_format, staged_ncsd_format
+
+try:
+    from os import sched_getaffinity
+except ImportError:  # not on Linux
+    sched_getaffinity = None
+
+# what the batch file starts instead of ncsd-it.exe when staging to scratch
+staging_script = "staged_ncsd.sh"
+# where it finds the interaction files in mfdp.dat: the 2-body file is on a
+# fixed line, the 3-body one is the line before the N1B N2B N3B line (the
+# occupation restrictions before it can be any number of lines)
+mfdp_lines = mfdp_format.split("\n")
+two_body_line = mfdp_lines.index("{two_body_interaction}") + 1
+three_body_marker = mfdp_lines[
+    mfdp_lines.index("{three_body_interaction}") + 1].split("!")[1].strip()
+
+# what squeue / bjobs call each state --> catalog run state (see catalog.py)
+queue_states = {
+    # slurm
+    "PENDING": "submitted",
+    "CONFIGURING": "running",
+    "RUNNING": "running",
+    "COMPLETING": "running",
+    "SUSPENDED": "running",
+    "COMPLETED": "finished",
+    "FAILED": "failed",
+    "TIMEOUT": "failed",
+    "CANCELLED": "failed",
+    "OUT_OF_MEMORY": "failed",
+    "NODE_FAIL": "failed",
+    # LSF
+    "PEND": "submitted",
+    "PSUSP": "submitted",
+    "RUN": "running",
+    "USUSP": "running",
+    "SSUSP": "running",
+    "DONE": "finished",
+    "EXIT": "failed"}
+
+
+class Backend(ABC):
+    """the machine-specific parts of writing, submitting and following runs
+
+    params_class / filetype: the batch params, and their name in key_map
+    and renderers (which has the batch_ncsd template)
+    nodes_key: the batch params field with the number of nodes (None if
+    there's no such thing)
+    scheduler: False if the backend runs jobs itself, so there's no queue
+    for job arrays, task farms, chains or the monitor to use
+    scratch: the directory on each node to run from (None = don't stage,
+    True = default_scratch), it can use shell variables
+    """
+    name = None
+    params_class = None
+    filetype = None
+    nodes_key = None
+    scheduler = True
+    ranks_per_node = 1
+    max_mem_per_rank = None  # GB, None = no limit
+    default_scratch = None
+
+    def __init__(self, scratch=None):
+        if scratch is True:
+            scratch = self.default_scratch
+            if scratch is None:
+                raise ValueError(self.name + " has no scratch to stage to, "
+                                 "give a path")
+        self.scratch = scratch
+
+    def ncsd_command(self, ncsd_path):
+        """what the batch file runs, ncsd_path relative to the run directory
+        (it's run from there)"""
+        if self.scratch is None:
+            return ncsd_path
+        return "bash " + staging_script
+
+    @abstractmethod
+    def batch_params(self, man_params, default_params, minutes, **fields):
+        """the batch params for a run, fields are the ones every machine's
+        batch file has (run_directory, potential, ..., output_file) and
+        minutes is the walltime"""
+
+    def write_batch(self, batch_path, batch_params):
+        """writes batch_ncsd (and staged_ncsd.sh next to it, if staging)"""
+        renderers[self.filetype].write(batch_path, batch_params)
+        if self.scratch is not None:
+            self.write_staging(dirname(batch_path))
+
+    def write_staging(self, run_dir):
+        with open(join(run_dir, staging_script), "w") as open_file:
+            open_file.write(staged_ncsd_format.format(
+                scratch=self.scratch, two_body_line=two_body_line,
+                three_body_marker=three_body_marker))
+
+    @abstractmethod
+    def format_time(self, minutes):
+        """a number of minutes, as the batch file wants it"""
+
+    @abstractmethod
+    def parse_time(self, batch_time):
+        """the reverse of format_time"""
+
+    @abstractmethod
+    def submit(self, batch_path, after=None):
+        """starts one batch file (after the job with ID after has finished
+        properly), returns the job ID"""
+
+    @abstractmethod
+    def poll(self):
+        """{job_id: catalog state} for the user's jobs that haven't left the
+        queue"""
+
+    def wait(self):
+        """waits for jobs the backend runs itself, returns {job_id: state}
+        (nothing to wait for with a scheduler)"""
+        return {}
+
+
+class SchedulerBackend(Backend):
+    """a Backend that hands runs to a scheduler: submitting and polling
+    run its submit and status commands
+
+    job_id_pattern: finds the job ID in what the submit command printed
+    """
+    job_id_pattern = None
+
+    @abstractmethod
+    def submit_command(self, after=None):
+        """the command to submit a batch file with, without the file
+        (after is a job ID that has to finish properly first)"""
+
+    @abstractmethod
+    def status_command(self):
+        """the command that lists the user's queued jobs"""
+
+    def submit(self, batch_path, after=None):
+        """sends one batch file to the queue, returns the job ID
+
+        The ID is None if it couldn't be found in what the submit command
+        printed, if it fails, a RuntimeError is raised with what it said.
+        """
+        command = self.submit_command(after) + [batch_path]
+        try:
+            result = run(command, stdout=PIPE, stderr=STDOUT,
+                         universal_newlines=True)
+        except OSError as e:
+            raise RuntimeError(command[0] + " couldn't be run: " + repr(e))
+        print(result.stdout, end="")
+        if result.returncode != 0:
+            raise RuntimeError(
+                " ".join(command) + " failed:\n" + result.stdout)
+        match = self.job_id_pattern.search(result.stdout)
+        return match.group(1) if match else None
+
+    def parse_status(self, output):
+        """{job_id: catalog state} from what the status command printed,
+        one "job_id STATE" line per job"""
+        states = {}
+        for line in output.splitlines():
+            fields = line.split()
+            if len(fields) >= 2:
+                states[fields[0]] = queue_states.get(fields[1], "running")
+        return states
+
+    def poll(self):
+        try:
+            output = run(self.status_command(), stdout=PIPE,
+                         stderr=DEVNULL, universal_newlines=True).stdout
+        except OSError:
+            return {}
+        return self.parse_status(output)
+
+
+class CedarBackend(SchedulerBackend):
+    name = "cedar"
+    params_class = CedarBatchParams
+    filetype = "CEDAR_BATCH"
+    nodes_key = "nodes"
+    job_id_pattern = re.compile(r"Submitted batch job (\d+)")
+    # memory per MPI rank (GB) we can ask for without wasting nodes:
+    # a 192GB cedar node has 48 ranks (and mem_per_core is whole GB)
+    ranks_per_node = 48
+    max_mem_per_rank = 4.0
+    # made on every node of a job, and deleted after it
+    default_scratch = "$SLURM_TMPDIR"
+
+    def batch_params(self, man_params, default_params, minutes, **fields):
+        m = man_params
+        d = default_params
+        return CedarBatchParams(
+            account="rrg-navratil",
+            nodes=m.n_nodes,
+            tasks_per_node=d.tasks_per_node,
+            mem_per_core=int(m.mem),
+            mem=d.mem,
+            time=self.format_time(minutes),
+            output="ncsd-%J.out",
+            **fields)
+
+    def format_time(self, minutes):
+        hours, minutes = divmod(minutes, 60)
+        days, hours = divmod(hours, 24)
+        return "{}-{:02}:{:02}".format(days, hours, minutes)
+
+    def parse_time(self, batch_time):
+        days, hours_minutes = batch_time.split("-")
+        hours, minutes = map(int, hours_minutes.split(":"))
+        return 60 * (hours + 24 * int(days)) + minutes
+
+    def submit_command(self, after=None):
+        if after is None:
+            return ["sbatch"]
+        # if the job it waits for fails, slurm cancels this one
+        return ["sbatch", "--dependency=afterok:" + after,
+                "--kill-on-invalid-dep=yes"]
+
+    def status_command(self):
+        # -r lists each array task on its own line, as <job>_<task> (the
+        # IDs JobArrays records), pending ones too
+        return ["squeue", "-h", "-r", "-u", getuser(), "-o", "%i %T"]
+
+
+class SummitBackend(SchedulerBackend):
+    name = "summit"
+    params_class = SummitBatchParams
+    filetype = "SUMMIT_BATCH"
+    nodes_key = "nnodes"
+    job_id_pattern = re.compile(r"Job <(\d+)> is submitted")
+    # a 512GB summit node has 6
+    ranks_per_node = 6
+    max_mem_per_rank = 80.0
+    # needs -alloc_flags NVME, which submit_command adds
+    default_scratch = "/mnt/bb/$USER"
+
+    def batch_params(self, man_params, default_params, minutes, **fields):
+        m = man_params
+        return SummitBatchParams(
+            account="nph123",
+            nnodes=m.n_nodes,
+            time=self.format_time(minutes),
+            resource_sets=6 * m.n_nodes,
+            output="ncsd-run_"+fields["nucleus_name"]+".out",
+            **fields)
+
+    def format_time(self, minutes):
+        return "{}:{:02}".format(*divmod(minutes, 60))
+
+    def parse_time(self, batch_time):
+        hours, minutes = map(int, batch_time.split(":"))
+        return 60 * hours + minutes
+
+    def submit_command(self, after=None):
+        command = ["bsub"]
+        if self.scratch is not None:
+            command += ["-alloc_flags", "NVME"]
+        if after is not None:
+            # if the job it waits for fails, LSF leaves this one pending
+            command += ["-w", "done(" + after + ")"]
+        return command
+
+    def status_command(self):
+        return ["bjobs", "-a", "-noheader", "-u", getuser(),
+                "-o", "jobid jobindex stat delimiter=';'"]
+
+    def parse_status(self, output):
+        """array tasks are <job>[<index>] (the IDs JobArrays records, and
+        resource_model.lsf_accounting uses), other jobs just <job>"""
+        states = {}
+        for line in output.splitlines():
+            fields = line.split(";")
+            if len(fields) != 3:
+                continue
+            job_id, index, state = [field.strip() for field in fields]
+            if index not in ["", "0"]:
+                job_id += "[" + index + "]"
+            states[job_id] = queue_states.get(state, "running")
+        return states
+
+
+class LocalBackend(Backend):
+    """runs batch files on this machine, max_workers at a time
+
+    cpus are the CPUs to use (by default, every one this process may use),
+    each run gets cores_per_run of them to itself, and that many MPI ranks
+    (started with launcher, if more than one). max_workers defaults to as
+    many runs as there are CPUs for.
+    """
+    name = "local"
+    params_class = LocalBatchParams
+    filetype = "LOCAL_BATCH"
+    scheduler = False
+    default_scratch = "${TMPDIR:-/tmp}"
+
+    def __init__(self, max_workers=None, cores_per_run=1, cpus=None,
+                 launcher="mpirun -np {ranks} --bind-to none ", scratch=None):
+        super(LocalBackend, self).__init__(scratch=scratch)
+        if cpus is None:
+            cpus = sorted(sched_getaffinity(0)) \
+                if sched_getaffinity is not None else range(cpu_count())
+        cpus = list(cpus)
+        if max_workers is None:
+            max_workers = len(cpus) // cores_per_run
+        if cores_per_run < 1 or max_workers < 1 or \
+                max_workers * cores_per_run > len(cpus):
+            raise ValueError(
+                str(max_workers) + " runs of " + str(cores_per_run) +
+                " cores don't fit on " + str(len(cpus)) + " CPUs")
+        self.max_workers = max_workers
+        self.cores_per_run = cores_per_run
+        self.ranks_per_node = cores_per_run
+        self.launcher = launcher
+        try:
+            memory = sysconf("SC_PAGE_SIZE") * sysconf("SC_PHYS_PAGES")
+            self.max_mem_per_rank = memory / 1024**3 / len(cpus)
+        except (ValueError, OSError):
+            self.max_mem_per_rank = None
+        # each run takes a set of CPUs from here, and puts it back after
+        self.free_cpus = Queue()
+        for i in range(max_workers):
+            self.free_cpus.put(
+                cpus[i * cores_per_run:(i + 1) * cores_per_run])
+        self.taskset = which("taskset")
+        self.lock = threading.Lock()
+        self.pool = None
+        self.jobs = {}  # job ID --> Future of the exit code
+        self.started = set()
+        self.next_id = 1
+
+    def batch_params(self, man_params, default_params, minutes, **fields):
+        ranks = self.cores_per_run
+        return LocalBatchParams(
+            ranks=ranks,
+            launcher=self.launcher.format(ranks=ranks) if ranks > 1 else "",
+            **fields)
+
+    def format_time(self, minutes):
+        return str(minutes)
+
+    def parse_time(self, batch_time):
+        return int(batch_time)
+
+    def run_job(self, job_id, batch_path, waits_for):
+        """runs one batch file on a free set of CPUs, returns its exit code
+        (None if it never started, because the job before it failed)"""
+        if waits_for is not None:
+            try:
+                if waits_for.result() != 0:
+                    return None
+            except Exception:
+                return None
+        cpus = self.free_cpus.get()
+        self.started.add(job_id)
+        try:
+            run_dir = dirname(batch_path)
+            command = ["bash", batch_path]
+            if self.taskset is not None:
+                command = [self.taskset, "-c", ",".join(map(str, cpus))] + \
+                    command
+            output_path = join(run_dir, "ncsd-local-" + job_id + ".out")
+            with open(output_path, "w") as output:
+                return run(command, cwd=run_dir, stdout=output,
+                           stderr=STDOUT).returncode
+        finally:
+            self.free_cpus.put(cpus)
+
+    def submit(self, batch_path, after=None):
+        """queues a batch file to run as soon as CPUs are free (and after
+        the job with ID after has run without failing)"""
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            job_id = str(self.next_id)
+            self.next_id += 1
+            # jobs start in the order they're queued, so a job never waits
+            # for one that's behind it
+            self.jobs[job_id] = self.pool.submit(
+                self.run_job, job_id, batch_path, self.jobs.get(after))
+        print("local job " + job_id + ": " + batch_path)
+        return job_id
+
+    def poll(self):
+        states = {}
+        for job_id, future in list(self.jobs.items()):
+            if not future.done():
+                states[job_id] = "running" if job_id in self.started \
+                    else "submitted"
+            elif future.exception() is None and future.result() == 0:
+                states[job_id] = "finished"
+            else:
+                states[job_id] = "failed"
+        return states
+
+    def wait(self):
+        with self.lock:
+            pool = self.pool
+            self.pool = None
+        if pool is not None:
+            wait(list(self.jobs.values()))
+            pool.shutdown()
+        return self.poll()
+
+
+# name --> Backend
+backends = {}
+
+
+def register(backend):
+    """adds a backend (or replaces the one with the same name)"""
+    backends[backend.name] = backend
+
+
+def get_backend(machine):
+    """the Backend called machine, ValueError if there isn't one. The local
+    one is made the first time it's asked for (it looks at this computer's
+    CPUs and memory), unless one was registered before that."""
+    if machine == "local" and machine not in backends:
+        register(LocalBackend())
+    if machine not in backends:
+        raise ValueError("Invalid machine!")
+    return backends[machine]
+
+
+register(CedarBackend())
+register(SummitBackend())
@@ -0,0 +1,141 @@
+"""how big the M-scheme basis of a run is, to size runs before submitting
+
+The basis is every Slater determinant of Z protons and N neutrons in
+harmonic oscillator states, with total oscillator quanta E <= Nhw (and
+E = parity mod 2), no nucleon above shell N_1max, the occupation
+restrictions from mfdp.dat, and total 2M = total_2Jz.
+
+Rather than listing determinants, we go through the shells one at a time,
+keeping the number of ways to get each (protons so far, neutrons so far, E)
+for every M. The counts for all the M values are packed into one big Python
+int (coefficient i sits in bits i*width to (i+1)*width), so combining two
+sets of counts is one multiplication. Results are cached, since a frequency
+scan asks the same question over and over.
+
+    dimensions(mfdp_params, Nmax_min)  # --> {Nmax: dimension}
+"""
+from functools import lru_cache
+
+# how many different inputs each of the cached functions remembers
+cache_size = 256
+
+
+def choose(n, k):
+    """n choose k"""
+    result = 1
+    for i in range(min(k, n - k)):
+        result = result * (n - i) // (i + 1)
+    return result if 0 <= k <= n else 0
+
+
+def shell_m_values(shell):
+    """2m for every single-particle state in oscillator shell N = shell"""
+    two_ms = []
+    for l in range(shell, -1, -2):
+        for two_j in [2*l + 1, 2*l - 1]:
+            if two_j > 0:
+                two_ms.extend(range(-two_j, two_j + 1, 2))
+    return two_ms
+
+
+def parse_occupation(occupation_string):
+    """the occupation restrictions from calc_params, as a tuple with
+    (p min, p max, n min, n max, p+n min, p+n max) for each shell"""
+    restrictions = []
+    for line in occupation_string.split("\n"):
+        numbers = line.split("!")[0].split()
+        if numbers:
+            restrictions.append(tuple(map(int, numbers)))
+    return tuple(restrictions)
+
+
+@lru_cache(maxsize=cache_size)
+def shell_table(shell, max_k, offset, width):
+    """counts for putting k = 0, 1, ... max_k nucleons of one kind in shell
+
+    Entry k is the packed count of k-particle choices, by total 2M
+    (coefficient i is for 2M = 2i - k*offset).
+    """
+    table = [1]
+    for two_m in shell_m_values(shell):
+        shift = width * ((two_m + offset) // 2)
+        if len(table) <= max_k:
+            table.append(0)
+        # go down in k so each state is only used once
+        for k in range(len(table) - 1, 0, -1):
+            table[k] += table[k - 1] << shift
+    return tuple(table)
+
+
+@lru_cache(maxsize=cache_size)
+def dimensions_by_E(Z, N, Nhw, parity, total_2Jz, N_1max, occupation):
+    """{E: number of determinants with E quanta}, for E <= Nhw with
+    E = parity mod 2, where occupation comes from parse_occupation"""
+    if (total_2Jz - Z - N) % 2 != 0:
+        return {}
+    # every 2m + offset is even and >= 0, so it works as a bit position
+    offset = 2 * N_1max + 1
+    n_states = sum((shell + 1) * (shell + 2) for shell in range(N_1max + 1))
+    # enough bits that no count can spill into the next one
+    width = (choose(n_states, Z) * choose(n_states, N)).bit_length() + 1
+
+    states = {(0, 0, 0): 1}  # (protons, neutrons, E) --> packed counts
+    for shell in range(N_1max + 1):
+        if shell < len(occupation):
+            p_min, p_max, n_min, n_max, pn_min, pn_max = occupation[shell]
+        else:
+            p_min, p_max, n_min, n_max, pn_min, pn_max = 0, Z, 0, N, 0, Z+N
+        table = shell_table(shell, max(Z, N), offset, width)
+        last_shell = (shell == N_1max)
+        new_states = {}
+        for (z, n, E), counts in states.items():
+            for k_p in range(p_min, min(p_max, Z - z, len(table) - 1) + 1):
+                E_p = E + shell * k_p
+                if E_p > Nhw:
+                    break
+                counts_p = counts * table[k_p]
+                for k_n in range(n_min,
+                                 min(n_max, N - n, len(table) - 1) + 1):
+                    if not pn_min <= k_p + k_n <= pn_max:
+                        continue
+                    new_E = E_p + shell * k_n
+                    if new_E > Nhw:
+                        break
+                    # everyone left goes in a higher shell, so costs more
+                    left = (Z - z - k_p) + (N - n - k_n)
+                    if new_E + left * (shell + 1) > Nhw or \
+                            (last_shell and left > 0):
+                        continue
+                    key = (z + k_p, n + k_n, new_E)
+                    new_states[key] = new_states.get(key, 0) + \
+                        counts_p * table[k_n]
+        states = new_states
+
+    # pick out 2M = total_2Jz
+    position = width * ((total_2Jz + (Z + N) * offset) // 2)
+    mask = (1 << width) - 1
+    result = {}
+    for (z, n, E), counts in states.items():
+        if z == Z and n == N and E % 2 == parity % 2:
+            count = (counts >> position) & mask
+            if count:
+                result[E] = result.get(E, 0) + count
+    return result
+
+
+def basis_dimension(Z, N, Nhw, parity, total_2Jz, N_1max, occupation_string):
+    """the number of M-scheme basis states with up to Nhw quanta"""
+    by_E = dimensions_by_E(Z, N, Nhw, parity, total_2Jz, N_1max,
+                           parse_occupation(occupation_string))
+    return sum(by_E.values())
+
+
+def dimensions(mfdp_params, Nmax_min):
+    """{Nmax: dimension} for each Nmax a run goes through (Nmax_min up to
+    its Nmax_max in steps of 2), from the run's MFDPParams"""
+    m = mfdp_params
+    Ngs = m.nhw0 - Nmax_min
+    by_E = dimensions_by_E(m.Z, m.N, m.Nhw, m.parity, m.total_2Jz, m.N_1max,
+                           parse_occupation(m.occupation_string))
+    return {Nmax: sum(count for E, count in by_E.items() if E <= Ngs + Nmax)
+            for Nmax in range(Nmax_min, m.Nhw - Ngs + 1, 2)}
@@ -0,0 +1,253 @@
+"""a record of every run that's been made, kept in an SQLite database
+
+Each run is one row, keyed by its run directory, holding the ManParams,
+MFDPParams and batch params it was made with (as JSON), a hash of them,
+the job ID once it's submitted, the state it's in, the size of its
+M-scheme basis (see basis_dimension.py) at each Nmax, and if it failed,
+why and how many times it's been restarted (see restarts.py). The columns
+people search by (nucleus, frequency, Nmax, interactions, state) are
+indexed, so questions like "did Li8 at hw=20, Nmax 8 already run?" don't
+mean walking the scratch directory.
+
+    with Catalog("runs.db") as catalog:
+        for row in catalog.find(Z=3, N=5, hbar_omega=20, Nmax_range=(8, 8)):
+            print(row["run_dir"], row["state"], row["job_id"])
+
+A Catalog should only be used from the thread that opened it.
+"""
+import json
+import sqlite3
+import time
+from os.path import join
+from hashlib import sha1
+from .data_structures import ManParams, MFDPParams
+from .backends import get_backend
+from .basis_dimension import dimensions
+
+# generated = files written, submitted = handed to the queue (job_id is set)
+# left_queue = the scheduler doesn't list it anymore, but whether it worked
+# hasn't been checked (restarts.py does), the rest are for whatever checks
+# on runs later
+run_states = ["generated", "submitted", "running", "left_queue", "finished",
+              "failed"]
+
+schema = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_dir TEXT PRIMARY KEY,
+    params_hash TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    Z INTEGER NOT NULL,
+    N INTEGER NOT NULL,
+    hbar_omega REAL NOT NULL,
+    Nmax_min INTEGER NOT NULL,
+    Nmax_max INTEGER NOT NULL,
+    two_body_interaction TEXT NOT NULL,
+    three_body_interaction TEXT NOT NULL,
+    man_params TEXT NOT NULL,
+    mfdp_params TEXT NOT NULL,
+    batch_params TEXT NOT NULL,
+    job_id TEXT,
+    state TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    dimension INTEGER,
+    dimensions TEXT,
+    failure TEXT,
+    restarts INTEGER);
+CREATE INDEX IF NOT EXISTS runs_nucleus ON runs (Z, N, hbar_omega);
+CREATE INDEX IF NOT EXISTS runs_hbar_omega ON runs (hbar_omega);
+CREATE INDEX IF NOT EXISTS runs_Nmax ON runs (Nmax_max, Nmax_min);
+CREATE INDEX IF NOT EXISTS runs_two_body ON runs (two_body_interaction);
+CREATE INDEX IF NOT EXISTS runs_three_body ON runs (three_body_interaction);
+CREATE INDEX IF NOT EXISTS runs_state ON runs (state);
+CREATE INDEX IF NOT EXISTS runs_params_hash ON runs (params_hash);
+CREATE INDEX IF NOT EXISTS runs_job_id ON runs (job_id);
+"""
+
+# in each run directory, the run_hash of what was written there, so a sweep
+# that's run again can tell which runs changed, and the run_key of the run,
+# so it can tell which directory each run is in (see update_runs)
+stamp_filename = ".ncsd_params_hash"
+
+# ManParams that only say how a run is run, not what it calculates
+resource_keys = ["time", "mem", "n_nodes"]
+
+# columns added since the first version, for updating older catalogs
+added_columns = [("dimension", "INTEGER"), ("dimensions", "TEXT"),
+                 ("failure", "TEXT"), ("restarts", "INTEGER")]
+
+
+def run_hash(mfdp_params, batch_params):
+    """one hash for everything that gets written into a run directory"""
+    return sha1(
+        (mfdp_params.digest() + batch_params.digest()).encode()).hexdigest()
+
+
+def run_key(man_params):
+    """a hash of what a run calculates, which stays the same when only its
+    resources (resource_keys) change"""
+    return man_params.replace(
+        **{key: None for key in resource_keys}).digest()
+
+
+def write_stamp(run_dir, mfdp_params, batch_params, key=None):
+    """records the run_hash (and the run_key, if given) in run_dir, once
+    everything else is written"""
+    with open(join(run_dir, stamp_filename), "w") as open_file:
+        open_file.write(run_hash(mfdp_params, batch_params) + "\n")
+        if key is not None:
+            open_file.write(key + "\n")
+
+
+def read_stamps(run_dir):
+    """(run_hash, run_key) recorded in run_dir, None for each one that
+    isn't there (stamps from before run keys only have the hash)"""
+    try:
+        with open(join(run_dir, stamp_filename)) as open_file:
+            lines = open_file.read().split()
+    except OSError:
+        return None, None
+    lines += [None, None]
+    return lines[0], lines[1]
+
+
+def read_stamp(run_dir):
+    """the run_hash recorded in run_dir, or None if there isn't one"""
+    return read_stamps(run_dir)[0]
+
+
+class Catalog(object):
+    """the runs table in the SQLite file at db_path (made if needed)
+
+    Changes are committed every commit_every changes, and on close(),
+    so recording 100000 runs doesn't mean 100000 writes to disk.
+    """
+    def __init__(self, db_path, commit_every=100):
+        self.db_path = db_path
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(schema)
+        existing = [row["name"] for row in
+                    self.connection.execute("PRAGMA table_info(runs)")]
+        for column, column_type in added_columns:
+            if column not in existing:
+                self.connection.execute(
+                    "ALTER TABLE runs ADD COLUMN "+column+" "+column_type)
+
+    def change(self, sql, values):
+        """runs one INSERT/UPDATE, commits now and then"""
+        cursor = self.connection.execute(sql, values)
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.commit()
+        return cursor.rowcount
+
+    def commit(self):
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_run(self, run_dir, man_params, mfdp_params, batch_params,
+                machine, state="generated"):
+        """records a newly written run, replacing any old record of run_dir
+        (it's been overwritten, if it's being written again)"""
+        now = time.time()
+        Nmax_dimensions = dimensions(mfdp_params, man_params.Nmax_min)
+        self.change(
+            "INSERT OR REPLACE INTO runs (run_dir, params_hash, machine, Z, "
+            "N, hbar_omega, Nmax_min, Nmax_max, two_body_interaction, "
+            "three_body_interaction, man_params, mfdp_params, batch_params, "
+            "job_id, state, created, updated, dimension, dimensions) VALUES "
+            "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (run_dir, run_hash(mfdp_params, batch_params), machine,
+             man_params.Z, man_params.N, man_params.hbar_omega,
+             man_params.Nmax_min, man_params.Nmax_max,
+             man_params.two_body_interaction,
+             man_params.three_body_interaction,
+             json.dumps(man_params.param_dict()),
+             json.dumps(mfdp_params.param_dict()),
+             json.dumps(batch_params.param_dict()),
+             None, state, now, now,
+             Nmax_dimensions.get(man_params.Nmax_max),
+             json.dumps(Nmax_dimensions)))
+
+    def set_job(self, run_dir, job_id, state="submitted"):
+        """records that run_dir was submitted as job_id"""
+        return self.change(
+            "UPDATE runs SET job_id = ?, state = ?, updated = ? "
+            "WHERE run_dir = ?", (job_id, state, time.time(), run_dir))
+
+    def set_state(self, run_dir, state):
+        if state not in run_states:
+            raise ValueError(
+                "invalid run state "+state+", use one of "+str(run_states))
+        return self.change(
+            "UPDATE runs SET state = ?, updated = ? WHERE run_dir = ?",
+            (state, time.time(), run_dir))
+
+    def set_failure(self, run_dir, failure, restarts):
+        """records why a run failed (see restarts.py), and how many times
+        it's been restarted"""
+        return self.change(
+            "UPDATE runs SET failure = ?, restarts = ?, updated = ? "
+            "WHERE run_dir = ?", (failure, restarts, time.time(), run_dir))
+
+    def find(self, Z=None, N=None, hbar_omega=None, Nmax_range=None,
+             interaction=None, state=None, params_hash=None, job_id=None,
+             machine=None):
+        """returns the rows (sqlite3.Row, use like a dict) that match all
+        the given conditions, oldest first
+
+        Nmax_range = (low, high) matches runs with low <= Nmax_max <= high,
+        interaction matches either the 2-body or the 3-body file name,
+        and state can be one state or a list of them.
+        """
+        conditions = []
+        values = []
+        for column, value in [("Z", Z), ("N", N), ("hbar_omega", hbar_omega),
+                              ("params_hash", params_hash),
+                              ("job_id", job_id), ("machine", machine)]:
+            if value is not None:
+                conditions.append(column + " = ?")
+                values.append(value)
+        if Nmax_range is not None:
+            conditions.append("Nmax_max BETWEEN ? AND ?")
+            values.extend(Nmax_range)
+        if interaction is not None:
+            conditions.append(
+                "(two_body_interaction = ? OR three_body_interaction = ?)")
+            values.extend([interaction, interaction])
+        if state is not None:
+            states = [state] if isinstance(state, str) else list(state)
+            conditions.append(
+                "state IN (" + ", ".join("?" * len(states)) + ")")
+            values.extend(states)
+        sql = "SELECT * FROM runs"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        return self.connection.execute(
+            sql + " ORDER BY created", values).fetchall()
+
+    def get(self, run_dir):
+        """the row for run_dir, or None if there isn't one"""
+        return self.connection.execute(
+            "SELECT * FROM runs WHERE run_dir = ?", (run_dir,)).fetchone()
+
+    def params(self, row):
+        """[man_params, mfdp_params, batch_params] for a row from find/get"""
+        return [
+            ManParams(**json.loads(row["man_params"])),
+            MFDPParams(**json.loads(row["mfdp_params"])),
+            get_backend(row["machine"]).params_class(
+                **json.loads(row["batch_params"]))]
@@ -4,6 +4,10 @@ from os.path import join, exists, split
 import os
 import re
 from .parameter_calculations import Ngs_func
+from .int_index import get_int_index, tbme_file_type
+from .int_verify import check_int_file
+from .data_structures import DefaultPolicyObj, existing_dir_policies, \
+    check_policies
 
 
 def get_int_dir():
@@ -18,8 +22,58 @@ def get_int_dir():
     return int_dir
 
 
-def manual_input_check(manual_params, machine, paths):
-    """checks manual input to ensure it is at least self-consistent"""
+def check_policy(policy):
+    """makes sure every policy setting is one we know how to follow"""
+    for key, value in policy.param_dict().items():
+        allowed = existing_dir_policies if key == "existing_dir" \
+            else check_policies
+        if value not in allowed:
+            raise ValueError(
+                "policy "+key+" must be one of "+", ".join(allowed) +
+                ", not "+str(value))
+
+
+def check_failed(action, message, details):
+    """deals with a check that failed, according to the policy for it
+
+    action "fail" raises a ValueError, "warn" prints a warning and carries on,
+    "prompt" asks whether to continue (and exits if not)
+    """
+    if action == "fail":
+        raise ValueError(message + "\n" + "\n".join(details))
+    if action == "warn":
+        print("\nWarning: " + message)
+        for line in details:
+            print(line)
+        return
+    print("\n" + message)
+    for line in details:
+        print(line)
+    yn = ""
+    while yn not in ["y", "n"]:
+        yn = input("Do you want to continue? (y/n): ")
+    if yn == "n":
+        sys.exit(0)
+
+
+def without_prompts(policy):
+    """policy with every "prompt" made "fail", for when nobody's there to
+    answer"""
+    return policy.replace(**{key: "fail" for key, value
+                             in policy.param_dict().items()
+                             if value == "prompt"})
+
+
+def manual_input_check(manual_params, machine, paths,
+                       policy=DefaultPolicyObj, read_only=False,
+                       full_int_check=False):
+    """checks manual input to ensure it is at least self-consistent
+
+    policy (a PolicyParams) says what to do when a check fails,
+    by default we ask the user. read_only=True doesn't write anything
+    (the int_dir index and what's known about the files are only kept
+    in memory). full_int_check=True reads all of each interaction file,
+    not just its start and end (see int_verify.py)"""
     print("checking manual input")
     m = manual_params  # so we don't have to type out manual_params everywhere
 
@@ -34,12 +88,19 @@ def manual_input_check(manual_params, machine, paths):
     if not exists(working_dir):
         raise IOError(
             "Working directory " + working_dir + " does not exist")
+    # the interaction files are looked up in an index of int_dir,
+    # rather than one at a time, see int_index.py
+    int_files = [m.two_body_interaction]
+    if three_body:
+        int_files.append(m.three_body_interaction)
+    int_index = get_int_index(int_dir, refresh=True, save=not read_only,
+                              check=int_files)
     f2 = join(int_dir, m.two_body_interaction)
-    if not exists(f2):
+    if m.two_body_interaction not in int_index:
         raise IOError("Two body file "+f2+" does not exist")
     if three_body:
         f3 = join(int_dir, m.three_body_interaction)
-        if not exists(f3):
+        if m.three_body_interaction not in int_index:
             raise IOError("Three body file "+f3+" does not exist")
     if not exists(ncsd_path):
         raise IOError("NCSD file "+ncsd_path+" does not exist!")
@@ -51,91 +112,81 @@ def manual_input_check(manual_params, machine, paths):
         if not (m.N_123max >= m.N_12max):
             raise ValueError("N_123max must be >= N_12max")
 
-    # check that parameters match with filenames
-    try:
-        # TBME file
-        tbme_filename = m.two_body_interaction
-        last_chunk = tbme_filename.split(".")[-1]
-        [hbar_omega_verif_0, other_stuff] = last_chunk.split("_")
-        hbar_omega_verif_0 = float(hbar_omega_verif_0)
+    # check that parameters match with filenames (parsed by the index)
+    tbme_filename = m.two_body_interaction
+    if tbme_file_type(tbme_filename) is None:
+        print("Warning: can't read the TBME type from", tbme_filename)
+        print("The default two_body_file_type will be used.\n")
+    tbme_metadata = int_index.metadata(tbme_filename, "tbme")
+    if "error" in tbme_metadata:
+        print("Warning raised when parsing TBME filename:",
+              tbme_metadata["error"])
+        print("TBME filename:", tbme_filename)
+        print("We assume everything's fine, but double-check!\n")
+    else:
+        hbar_omega_verif_0 = tbme_metadata["hbar_omega"]
+        other_stuff = tbme_metadata["nmax_code"]
         # see if str(N_1max) + str(N_1max) == other_stuff
         if other_stuff != str(m.N_1max) + str(m.N_12max):
-            print("\nYour TMBE file doesn't seem to match your parameters!")
-            print("N_1max = "+str(m.N_1max))
-            print("N_12max = "+str(m.N_12max))
-            print("TBME filename = "+tbme_filename)
-            print("relevant section = "+other_stuff)
-            yn = ""
-            while yn not in ["y", "n"]:
-                yn = input("Do you want to continue? (y/n): ")
-            if yn == "y":
-                pass
-            else:
-                sys.exit(0)
+            check_failed(
+                policy.tbme_nmax_mismatch,
+                "Your TMBE file doesn't seem to match your parameters!",
+                ["N_1max = "+str(m.N_1max),
+                 "N_12max = "+str(m.N_12max),
+                 "TBME filename = "+tbme_filename,
+                 "relevant section = "+other_stuff])
         # see if hbar_omega matches
         if hbar_omega_verif_0 != m.hbar_omega:
-            print("\nYour TMBE file doesn't seem to match your parameters!")
-            print("hbar_omega = "+str(m.hbar_omega))
-            print("TBME filename = "+tbme_filename)
-            print("hbar_omega from the file is", hbar_omega_verif_0)
-            yn = ""
-            while yn not in ["y", "n"]:
-                yn = input("Do you want to continue? (y/n): ")
-            if yn == "y":
-                pass
-            else:
-                sys.exit(0)
-    except Exception as e:
-        print("Warning raised when parsing TBME filename:", e)
-        print("TBME filename:", tbme_filename)
-        print("We assume everything's fine, but double-check!\n")
+            check_failed(
+                policy.tbme_freq_mismatch,
+                "Your TMBE file doesn't seem to match your parameters!",
+                ["hbar_omega = "+str(m.hbar_omega),
+                 "TBME filename = "+tbme_filename,
+                 "hbar_omega from the file is "+str(hbar_omega_verif_0)])
 
     if three_body:
-        try:
-            # three-body file
-            three_filename = m.three_body_interaction
-            [penultimate_chunk, last_chunk] = three_filename.split(".")[-2:]
-            # get hbar_omega
-            [hbar_omega_verif_1, other_stuff] = last_chunk.split("_")
-            hbar_omega_verif_1 = float(hbar_omega_verif_1)
-            # get N_#max variables
-            n_maxes = penultimate_chunk.split("_")[-1]
+        three_filename = m.three_body_interaction
+        three_metadata = int_index.metadata(three_filename, "three_body")
+        if "error" in three_metadata:
+            print("Warning raised when parsing 3-body filename:",
+                  three_metadata["error"])
+            print("3-body filename:", three_filename)
+            print("We assume everything's fine, but double-check!\n")
+        else:
+            hbar_omega_verif_1 = three_metadata["hbar_omega"]
+            n_maxes = three_metadata["nmax_code"]
             # see if str(N_1max) + str(N_1max) == other_stuff
             if n_maxes != str(m.N_123max) + str(m.N_12max) + str(m.N_1max):
-                print(
-                    "\nYour 3-body file doesn't seem "
-                    "to match your parameters!")
-                print("N_1max = "+str(m.N_1max))
-                print("N_12max = "+str(m.N_12max))
-                print("N_123max = "+str(m.N_123max))
-                print("3-body filename = "+three_filename)
-                print("relevant section = "+n_maxes)
-                yn = ""
-                while yn not in ["y", "n"]:
-                    yn = input("Do you want to continue? (y/n): ")
-                if yn == "y":
-                    pass
-                else:
-                    sys.exit(0)
+                check_failed(
+                    policy.three_body_nmax_mismatch,
+                    "Your 3-body file doesn't seem to match your parameters!",
+                    ["N_1max = "+str(m.N_1max),
+                     "N_12max = "+str(m.N_12max),
+                     "N_123max = "+str(m.N_123max),
+                     "3-body filename = "+three_filename,
+                     "relevant section = "+n_maxes])
             # see if hbar_omega matches
             if hbar_omega_verif_1 != m.hbar_omega:
-                print(
-                    "\nYour 3-body file doesn't seem "
-                    "to match your parameters!")
-                print("hbar_omega = "+str(m.hbar_omega))
-                print("3-body filename = "+three_filename)
-                print("hbar_omega from the file is", hbar_omega_verif_1)
-                yn = ""
-                while yn not in ["y", "n"]:
-                    yn = input("Do you want to continue? (y/n): ")
-                if yn == "y":
-                    pass
-                else:
-                    sys.exit(0)
-        except Exception as e:
-            print("Warning raised when parsing 3-body filename:", e)
-            print("3-body filename:", three_filename)
-            print("We assume everything's fine, but double-check!\n")
+                check_failed(
+                    policy.three_body_freq_mismatch,
+                    "Your 3-body file doesn't seem to match your parameters!",
+                    ["hbar_omega = "+str(m.hbar_omega),
+                     "3-body filename = "+three_filename,
+                     "hbar_omega from the file is "+str(hbar_omega_verif_1)])
+
+    # and that what's in the files looks whole (only read once per file,
+    # see int_verify.py)
+    int_files = [("TBME", m.two_body_interaction, "tbme")]
+    if three_body:
+        int_files.append(("3-body", m.three_body_interaction, "three_body"))
+    for label, filename, kind in int_files:
+        problems = check_int_file(int_index, filename, kind,
+                                  save=not read_only, full=full_int_check)
+        if problems:
+            check_failed(
+                policy.int_file_problem,
+                "Your " + label + " file doesn't look right!",
+                [label + " file = " + join(int_dir, filename)] + problems)
 
     # check there's at least kappa_points kappa values
     kappa_vals = list(map(float, m.kappa_vals.split()))
@@ -146,16 +197,20 @@ def manual_input_check(manual_params, machine, paths):
 
     # and if kappa_points and kappa_vals disagree, make sure they know that
     if len(kappa_vals) > m.kappa_points:
-        print(
+        message = (
             "Did you mean to enter "+str(len(kappa_vals)) +
             " values for kappa_min, but set kappa_points to " +
             str(m.kappa_points)+"?")
-        user_input = ""
-        while user_input not in ["Y", "N"]:
-            user_input = input("Enter Y to proceed, N to cancel: ")
-        if user_input == "N":
-            print("Okay, exiting... Try again!")
-            sys.exit(0)
+        if policy.kappa_points_mismatch == "prompt":
+            print(message)
+            user_input = ""
+            while user_input not in ["Y", "N"]:
+                user_input = input("Enter Y to proceed, N to cancel: ")
+            if user_input == "N":
+                print("Okay, exiting... Try again!")
+                sys.exit(0)
+        else:
+            check_failed(policy.kappa_points_mismatch, message, [])
 
     kr_values = [-1, 1, 2, 3, 4]
     if m.kappa_restart not in kr_values:
@@ -172,9 +227,10 @@ def manual_input_check(manual_params, machine, paths):
     #  if this function runs, the input passes the test
 
 
-def check_mfdp_read(mfdp_params):
+def check_mfdp_read(mfdp_params, quiet=False):
     """checks to see if mfdp data, read from a file, was ok"""
-    print("opening mfdp file, checking data")
+    if not quiet:
+        print("opening mfdp file, checking data")
 
     # 3 body interaction?
     three_body = (abs(mfdp_params.interaction_type) == 3)
@@ -191,11 +247,13 @@ def check_mfdp_read(mfdp_params):
     N_1max_verif = int(other_stuff[0])
     N_12max_verif = int(other_stuff[1:])
 
-    # parse output file name
-    sections = mfdp_params.output_file.split("_")
-    the_rest = sections[2]
-    dot_sections = the_rest.split(".")
-    hbar_omega_verif_1 = float(dot_sections[1])
+    # parse output file name, nucleus_potential_Nmax0-8.freq(_IT),
+    # the potential name can have _ and . in it, so work from the end
+    the_rest = mfdp_params.output_file.split("_Nmax")[-1]
+    freq = the_rest.split(".", 1)[1]
+    if freq.endswith("_IT"):
+        freq = freq[:-3]
+    hbar_omega_verif_1 = float(freq)
 
     # parse 3-body
     if three_body:
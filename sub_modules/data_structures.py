@@ -3,6 +3,9 @@
 they have attributes for every field in the data files, e.g. mfdp.dat files
 have a field for Z, so a MFDPParams object has an attribute .Z
 """
+from operator import attrgetter
+from hashlib import sha1
+
 # all the required/allowed fields for each data structure
 man_keys = [
     "two_body_interaction",
@@ -65,6 +68,93 @@ summit_batch_keys = [
     "potential_end_bit",
     "output_file"
     ]
+local_batch_keys = [
+    "run_directory",
+    "ranks",
+    "launcher",
+    "potential",
+    "nucleus_name",
+    "hbar_omega",
+    "suffix",
+    "Ngs",
+    "ncsd_path",
+    "non_IT_Nmax",
+    "potential_end_bit",
+    "output_file"
+    ]
+cedar_array_keys = [
+    "account",
+    "nodes",
+    "tasks_per_node",
+    "mem_per_core",
+    "mem",
+    "time",
+    "output",
+    "n_runs",
+    "array_limit",
+    "run_list"
+    ]
+summit_array_keys = [
+    "account",
+    "nnodes",
+    "time",
+    "job_name",
+    "n_runs",
+    "array_limit",
+    "output",
+    "run_list"
+    ]
+cedar_farm_keys = [
+    "account",
+    "nodes",
+    "tasks_per_node",
+    "mem_per_core",
+    "mem",
+    "time",
+    "output",
+    "slots",
+    "nodes_per_run",
+    "tasks_per_run",
+    "run_list"
+    ]
+summit_farm_keys = [
+    "account",
+    "nnodes",
+    "time",
+    "job_name",
+    "output",
+    "slots",
+    "nodes_per_run",
+    "run_list"
+    ]
+cedar_stage_keys = [
+    "account",
+    "nodes",
+    "tasks_per_node",
+    "mem_per_core",
+    "mem",
+    "time",
+    "output",
+    "stage",
+    "n_stages",
+    "Nmax",
+    "run_directory",
+    "stage_mfdp",
+    "stage_batch"
+    ]
+summit_stage_keys = [
+    "account",
+    "nnodes",
+    "time",
+    "job_name",
+    "output",
+    "stage",
+    "n_stages",
+    "Nmax",
+    "run_directory",
+    "stage_mfdp",
+    "stage_batch"
+    ]
 mfdp_keys = [
     "output_file",
     "two_body_interaction",
@@ -115,6 +205,17 @@ mfdp_keys = [
     "gsn",
     "saved_pivot",
     "rmemavail"]
+policy_keys = [
+    "existing_dir",
+    "tbme_nmax_mismatch",
+    "tbme_freq_mismatch",
+    "three_body_nmax_mismatch",
+    "three_body_freq_mismatch",
+    "kappa_points_mismatch",
+    "int_file_problem"]
+# allowed values for each policy key
+existing_dir_policies = ["prompt", "overwrite", "skip", "suffix", "fail"]
+check_policies = ["prompt", "warn", "fail"]
 default_keys = [
     "two_body_file_type",
     "N_min",
@@ -145,85 +246,234 @@ default_keys = [
     "tasks_per_node"]
 
 
+# which keys each filetype needs, as sets so checking a key is quick
+key_map = {
+    "MFDP": mfdp_keys,
+    "MANUAL INPUT": man_keys,
+    "CEDAR_BATCH": cedar_batch_keys,
+    "SUMMIT_BATCH": summit_batch_keys,
+    "LOCAL_BATCH": local_batch_keys,
+    "CEDAR_ARRAY": cedar_array_keys,
+    "SUMMIT_ARRAY": summit_array_keys,
+    "CEDAR_FARM": cedar_farm_keys,
+    "SUMMIT_FARM": summit_farm_keys,
+    "CEDAR_STAGE": cedar_stage_keys,
+    "SUMMIT_STAGE": summit_stage_keys,
+    "DEFAULT": default_keys,
+    "POLICY": policy_keys,
+    "EMPTY": []}
+key_sets = {filetype: frozenset(keys) for filetype, keys in key_map.items()}
+
+
+def rebuild_params(params_class, values):
+    """used for pickling, since Params can't be changed after __init__"""
+    return params_class(**dict(zip(params_class.__slots__, values)))
+
+
 class Params(object):
     """I created this rather than just using dictionaries or something
     for parameter passing, because with dicts, I tend to lose track of which
     variables every file type needs, etc.
 
     When you create a Params object, it makes sure that all variables are
-    provided, and that no extra ones are provided!"""
+    provided, and that no extra ones are provided!
+
+    Each subclass stores its keys in __slots__ (no per-object dict), and
+    Params can't be changed once made, use replace() to get a changed copy.
+    That means they can be compared, hashed and used as dict keys, as long as
+    their values are hashable (e.g. not a ManParams with lists in it)."""
+    __slots__ = ()
+    get_values = None
+    setters = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super(Params, cls).__init_subclass__(**kwargs)
+        # grabs all the values at once, in the order of the keys
+        if len(cls.__slots__) > 1:
+            cls.get_values = attrgetter(*cls.__slots__)
+        # and sets them, going around __setattr__ (which always complains)
+        cls.setters = tuple(
+            (key, cls.__dict__[key].__set__) for key in cls.__slots__)
 
     def __init__(self, filetype, **kwargs):
-        key_map = {
-            "MFDP": mfdp_keys,
-            "MANUAL INPUT": man_keys,
-            "CEDAR_BATCH": cedar_batch_keys,
-            "SUMMIT_BATCH": summit_batch_keys,
-            "DEFAULT": default_keys,
-            "EMPTY": []}
-        self.valid_keys = key_map[filetype]
-
-        # ensure we have the right number of args provided
-        if len(kwargs.keys()) < len(self.valid_keys):
-            error_message = "Not all necessary parameters were provided to "\
-                + filetype + ".\n\nThe missing parameters are:\n"
-            for key in self.valid_keys:
-                if key not in kwargs.keys():
-                    error_message += key+"\n"
-            raise ValueError(error_message)
-        if len(kwargs.keys()) > len(self.valid_keys):
-            error_message = "Too many parameters were provided to "\
-                + filetype + ".\n\nThe extra parameters are:\n"
-            for key in kwargs.keys():
-                if key not in self.valid_keys:
-                    error_message += key+"\n"
-            raise ValueError(error_message)
+        valid_keys = key_map[filetype]
+        if len(valid_keys) != len(self.__slots__):
+            raise ValueError("use the Params subclass for " + filetype)
 
-        # now ensure all args were valid
-        if all(key in self.valid_keys for key in kwargs.keys()):
-            # if so, then set self.kwarg = kwarg value
-            for key in self.valid_keys:
-                setattr(self, key, kwargs[key])
-        else:
-            error_message = "Not all parameters supplied to " + filetype\
-                + " were valid!\n\nThe invalid parameters are:\n"
-            for key in kwargs.keys():
-                if key not in self.valid_keys:
-                    error_message += key+"\n"
+        # ensure we have exactly the right args provided
+        if kwargs.keys() != key_sets[filetype]:
+            if len(kwargs.keys()) < len(valid_keys):
+                error_message = "Not all necessary parameters were provided"\
+                    " to " + filetype + ".\n\nThe missing parameters are:\n"
+                for key in valid_keys:
+                    if key not in kwargs:
+                        error_message += key+"\n"
+            elif len(kwargs.keys()) > len(valid_keys):
+                error_message = "Too many parameters were provided to "\
+                    + filetype + ".\n\nThe extra parameters are:\n"
+                for key in kwargs.keys():
+                    if key not in key_sets[filetype]:
+                        error_message += key+"\n"
+            else:
+                error_message = "Not all parameters supplied to " + filetype\
+                    + " were valid!\n\nThe invalid parameters are:\n"
+                for key in kwargs.keys():
+                    if key not in key_sets[filetype]:
+                        error_message += key+"\n"
             raise ValueError(error_message)
 
+        # if so, then set self.kwarg = kwarg value
+        for key, setter in self.setters:
+            setter(self, kwargs[key])
+
+    @property
+    def valid_keys(self):
+        return self.__slots__
+
+    def values(self):
+        """returns the values, in the same order as valid_keys"""
+        if self.get_values is not None:
+            return self.get_values(self)
+        return tuple(getattr(self, key) for key in self.__slots__)
+
     def param_dict(self):
         """returns a dict with the same info contained in the Params object"""
-        pdict = {}
-        for key in self.valid_keys:
-            pdict[key] = getattr(self, key)
-        return pdict
+        return dict(zip(self.__slots__, self.values()))
+
+    def replace(self, **changes):
+        """returns a copy of this Params object, with some values changed"""
+        pdict = self.param_dict()
+        pdict.update(changes)
+        return type(self)(**pdict)
+
+    def __setattr__(self, key, value):
+        raise AttributeError(
+            type(self).__name__ + " can't be changed, use replace() instead")
+
+    def __delattr__(self, key):
+        raise AttributeError(type(self).__name__ + " can't be changed")
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.values() == other.values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.values()))
+
+    def digest(self):
+        """a hash that stays the same between sessions (unlike hash()),
+        for recording which parameters a run was made with"""
+        return sha1(repr(self).encode()).hexdigest()
+
+    def __reduce__(self):
+        return (rebuild_params, (type(self), self.values()))
+
+    def __repr__(self):
+        return type(self).__name__ + "(" + ", ".join(
+            key + "=" + repr(value)
+            for key, value in zip(self.__slots__, self.values())) + ")"
 
 
 class ManParams(Params):
+    __slots__ = tuple(man_keys)
+
     def __init__(self, **kwargs):
         super(ManParams, self).__init__("MANUAL INPUT", **kwargs)
 
 
 class CedarBatchParams(Params):
+    __slots__ = tuple(cedar_batch_keys)
+
     def __init__(self, **kwargs):
         super(CedarBatchParams, self).__init__("CEDAR_BATCH", **kwargs)
 
 
 class SummitBatchParams(Params):
+    __slots__ = tuple(summit_batch_keys)
+
     def __init__(self, **kwargs):
         super(SummitBatchParams, self).__init__("SUMMIT_BATCH", **kwargs)
 
 
+class LocalBatchParams(Params):
+    __slots__ = tuple(local_batch_keys)
+
+    def __init__(self, **kwargs):
+        super(LocalBatchParams, self).__init__("LOCAL_BATCH", **kwargs)
+
+
+class CedarArrayParams(Params):
+    __slots__ = tuple(cedar_array_keys)
+
+    def __init__(self, **kwargs):
+        super(CedarArrayParams, self).__init__("CEDAR_ARRAY", **kwargs)
+
+
+class SummitArrayParams(Params):
+    __slots__ = tuple(summit_array_keys)
+
+    def __init__(self, **kwargs):
+        super(SummitArrayParams, self).__init__("SUMMIT_ARRAY", **kwargs)
+
+
+class CedarFarmParams(Params):
+    __slots__ = tuple(cedar_farm_keys)
+
+    def __init__(self, **kwargs):
+        super(CedarFarmParams, self).__init__("CEDAR_FARM", **kwargs)
+
+
+class SummitFarmParams(Params):
+    __slots__ = tuple(summit_farm_keys)
+
+    def __init__(self, **kwargs):
+        super(SummitFarmParams, self).__init__("SUMMIT_FARM", **kwargs)
+
+
+class CedarStageParams(Params):
+    __slots__ = tuple(cedar_stage_keys)
+
+    def __init__(self, **kwargs):
+        super(CedarStageParams, self).__init__("CEDAR_STAGE", **kwargs)
+
+
+class SummitStageParams(Params):
+    __slots__ = tuple(summit_stage_keys)
+
+    def __init__(self, **kwargs):
+        super(SummitStageParams, self).__init__("SUMMIT_STAGE", **kwargs)
+
+
 class MFDPParams(Params):
+    __slots__ = tuple(mfdp_keys)
+
     def __init__(self, **kwargs):
         super(MFDPParams, self).__init__("MFDP", **kwargs)
 
 
 class DefaultParams(Params):
+    __slots__ = tuple(default_keys)
+
     def __init__(self, **kwargs):
         super(DefaultParams, self).__init__("DEFAULT", **kwargs)
 
+
+class PolicyParams(Params):
+    """what to do, without asking, when something needs a decision
+
+    existing_dir: when a run directory already exists, one of
+        "prompt" (ask), "overwrite", "skip" (don't make that run),
+        "suffix" (use Li8_2, Li8_3, ...) or "fail"
+    the others: when a check on the input fails, one of
+        "prompt" (ask y/n), "warn" (print a warning and carry on) or "fail"
+    """
+    __slots__ = tuple(policy_keys)
+
+    def __init__(self, **kwargs):
+        super(PolicyParams, self).__init__("POLICY", **kwargs)
+
 DefaultParamsObj = DefaultParams(
     two_body_file_type=2,
     N_min=0,
@@ -253,3 +503,15 @@ DefaultParamsObj = DefaultParams(
     mem=0,
     tasks_per_node=48
 )
+
+# asks the user, same as before policies were a thing
+DefaultPolicyObj = PolicyParams(
+    existing_dir="prompt",
+    tbme_nmax_mismatch="prompt",
+    tbme_freq_mismatch="prompt",
+    three_body_nmax_mismatch="prompt",
+    three_body_freq_mismatch="prompt",
+    kappa_points_mismatch="prompt",
+    # the checks on what's in the files can be wrong, so they only warn
+    int_file_problem="warn"
+)
@@ -1,11 +1,21 @@
 """ module for dealing with reading/writing files for NCSD code """
 
-from os.path import exists
-from .formats import mfdp_format, cedar_batch_format, summit_batch_format
+from os import walk
+from os.path import exists, join
+from string import Formatter
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .formats import mfdp_format, cedar_batch_format, summit_batch_format, \
+    local_batch_format, cedar_array_format, summit_array_format, \
+    cedar_farm_format, summit_farm_format, cedar_stage_format, \
+    summit_stage_format
 from .data_structures \
     import Params, MFDPParams, DefaultParamsObj, \
-    mfdp_keys, cedar_batch_keys, summit_batch_keys, default_keys
+    mfdp_keys, cedar_batch_keys, summit_batch_keys, default_keys, \
+    cedar_array_keys, summit_array_keys, cedar_farm_keys, summit_farm_keys, \
+    cedar_stage_keys, summit_stage_keys, local_batch_keys
 from .data_checker import manual_input_check, check_mfdp_read
+from .renderer import renderers
 
 
 class FileManager(object):
@@ -29,19 +39,216 @@ class FileManager(object):
         elif filetype == "SUMMIT_BATCH":
             self.valid_keys = summit_batch_keys
             self.format_string = summit_batch_format
+        elif filetype == "LOCAL_BATCH":
+            self.valid_keys = local_batch_keys
+            self.format_string = local_batch_format
+        elif filetype == "CEDAR_ARRAY":
+            self.valid_keys = cedar_array_keys
+            self.format_string = cedar_array_format
+        elif filetype == "SUMMIT_ARRAY":
+            self.valid_keys = summit_array_keys
+            self.format_string = summit_array_format
+        elif filetype == "CEDAR_FARM":
+            self.valid_keys = cedar_farm_keys
+            self.format_string = cedar_farm_format
+        elif filetype == "SUMMIT_FARM":
+            self.valid_keys = summit_farm_keys
+            self.format_string = summit_farm_format
+        elif filetype == "CEDAR_STAGE":
+            self.valid_keys = cedar_stage_keys
+            self.format_string = cedar_stage_format
+        elif filetype == "SUMMIT_STAGE":
+            self.valid_keys = summit_stage_keys
+            self.format_string = summit_stage_format
         elif filetype == "DEFAULT":
             self.valid_keys = default_keys
             self.format_string = ""
         elif filetype == "EMPTY":
             self.valid_keys = []
             self.format_string = ""
+        # format_string, compiled once (see renderer.py)
+        self.renderer = renderers[filetype]
 
     def param_dict(self):
         return self.params.param_dict()
 
     def write(self):
-        with open(self.filename, 'w+') as open_file:
-            open_file.write(self.format_string.format(**self.param_dict()))
+        self.renderer.write(self.filename, self.params)
+
+
+# the type of each field in mfdp.dat, for reading them back in
+# (str fields are either the whole line or the text before the "!")
+mfdp_field_types = {
+    "output_file": str,
+    "two_body_interaction": str,
+    "two_body_file_type": int,
+    "Z": int,
+    "N": int,
+    "hbar_omega": float,
+    "Nhw": int,
+    "N_min": int,
+    "N_1max": int,
+    "N_12max": int,
+    "parity": int,
+    "total_2Jz": int,
+    "iham": int,
+    "iclmb": int,
+    "strcm": float,
+    "interaction_type": int,
+    "major": int,
+    "nshll": int,
+    "occupation_string": str,
+    "nsets": int,
+    "min_nesp": int,
+    "nskip": int,
+    "iset1": int,
+    "ki": int,
+    "kf": int,
+    "n_states": int,
+    "gs_energy": float,
+    "iterations_required": int,
+    "igt": int,
+    "irest": int,
+    "nhme": int,
+    "nhw0": int,
+    "nhw_min": int,
+    "nhw_restart": int,
+    "kappa_points": int,
+    "cmin": "number",  # int or float, whichever it looks like
+    "kappa_restart": int,
+    "kappa_vals": str,
+    "convergence_delta": float,
+    "three_body_interaction": str,
+    "N_123max": int,
+    "eff_charge_p": float,
+    "eff_charge_n": float,
+    "glp": float,
+    "gln": float,
+    "gsp": float,
+    "gsn": float,
+    "saved_pivot": str,
+    "rmemavail": float}
+
+
+def make_line_table(format_string):
+    """turns a template into a list with one entry per line of the file:
+    (field names on that line, whether the line is only the one field)
+
+    Lines with no fields are just text, and {occupation_string} stands for
+    a block of lines that can be any length.
+    """
+    table = []
+    for template_line in format_string.split("\n")[:-1]:
+        parsed = list(Formatter().parse(template_line))
+        fields = [name for _, name, _, _ in parsed if name is not None]
+        whole_line = (len(parsed) == 1 and fields and
+                      template_line == "{"+fields[0]+"}")
+        table.append((fields, whole_line))
+    return table
+
+
+# one entry per line of mfdp.dat, in order, made from mfdp_format itself
+mfdp_line_table = make_line_table(mfdp_format)
+
+
+def convert(field, text):
+    """turns the text for field into the right type"""
+    field_type = mfdp_field_types[field]
+    if field_type == "number":
+        return float(text) if "." in text or "e" in text.lower() \
+            else int(text)
+    return field_type(text)
+
+
+def parse_mfdp(filename):
+    """reads an mfdp.dat file into an MFDPParams object, following the
+    layout of mfdp_format line by line (see mfdp_line_table)
+
+    Fields that appear twice (e.g. Nhw, N_1max) must agree with each other.
+    This doesn't check the values make sense, see check_mfdp_read for that.
+    """
+    with open(filename, "r") as open_file:
+        lines = open_file.read().split("\n")
+
+    values = {}
+    line_num = 0
+    for fields, whole_line in mfdp_line_table:
+        if fields == ["occupation_string"]:
+            # the shell diagram thing is of variable length
+            block = []
+            while line_num < len(lines) and "! N=" in lines[line_num]:
+                block.append(lines[line_num])
+                line_num += 1
+            values["occupation_string"] = "\n".join(block)
+            continue
+        if line_num >= len(lines):
+            raise ValueError(filename + " ends early, at line "+str(line_num))
+        line = lines[line_num]
+        line_num += 1
+        if not fields:
+            continue  # just a line of text
+        if whole_line:
+            words = [line.strip()]
+        elif mfdp_field_types[fields[0]] == str:
+            words = [line.split("!")[0].strip()]
+        else:
+            words = line.split()[:len(fields)]
+        if len(words) < len(fields):
+            raise ValueError(
+                filename + " line "+str(line_num)+" should have " +
+                ", ".join(fields) + " but has: "+line)
+        for field, word in zip(fields, words):
+            try:
+                value = convert(field, word)
+            except ValueError:
+                raise ValueError(
+                    filename + " line "+str(line_num)+": can't read " +
+                    field + " from " + repr(word))
+            if field in values and values[field] != value:
+                raise ValueError(
+                    filename + " line "+str(line_num)+": " + field + " = " +
+                    word + " doesn't match the earlier value " +
+                    str(values[field]))
+            values[field] = value
+    return MFDPParams(**values)
+
+
+def read_one_mfdp(filename):
+    """parses and checks one file, for read_mfdp_tree"""
+    params = parse_mfdp(filename)
+    check_mfdp_read(params, quiet=True)
+    return params
+
+
+def read_mfdp_tree(root, n_workers=8, filename="mfdp.dat", processes=False):
+    """finds every mfdp.dat under root, parses and checks them in parallel
+
+    A generator, giving (path, MFDPParams, None) for files that are fine
+    and (path, None, error message) for ones that aren't, in the order
+    they're found. Only a few files per worker are in flight at once, so
+    this is fine for huge trees. processes=True uses processes rather than
+    threads, which is faster if parsing rather than the filesystem is slow.
+    """
+    pool_type = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    in_flight = deque()
+    with pool_type(max_workers=n_workers) as pool:
+        for directory, _, filenames in walk(root):
+            if filename not in filenames:
+                continue
+            path = join(directory, filename)
+            in_flight.append((path, pool.submit(read_one_mfdp, path)))
+            while len(in_flight) >= 4 * n_workers:
+                yield finished(*in_flight.popleft())
+        while in_flight:
+            yield finished(*in_flight.popleft())
+
+
+def finished(path, future):
+    """waits for one read_one_mfdp, gives (path, params, error message)"""
+    try:
+        return path, future.result(), None
+    except Exception as e:
+        return path, None, repr(e)
 
 
 class MFDP(FileManager):
@@ -61,189 +268,8 @@ class MFDP(FileManager):
             raise IOError("must have either a params object or a filename")
 
     def read(self):
-        """this is old, sketchy, and deprecated! Don't use if you can avoid!"""
-        # open file, grab text
-        with open(self.filename, "r") as open_file:
-            lines = open_file.readlines()
-
-        # get parameters from each line (brace yourself, this is long...):
-        line_num = 0  # for counting lines, but in a weird way
-        occupation_string = ""  # we'll need this later too
-        for line in lines:
-            words = line.split()
-            # ignore text lines, except the line that gives saved_pivot!
-            if not any(char.isdigit() for char in line):
-                if "saved_pivot" in line:
-                    saved_pivot = words[0]
-            elif line_num == 0:
-                two_body_interaction = line
-                line_num += 1
-            elif line_num == 1:
-                two_body_file_type = int(words[0])
-                line_num += 1
-            elif line_num == 2:
-                output_file = line
-                line_num += 1
-            elif line_num == 3:
-                Z = int(words[0])
-                N = int(words[1])
-                hbar_omega = float(words[2])
-                line_num += 1
-            elif line_num == 4:
-                Nhw = int(words[0])
-                parity = int(words[1])
-                total_2Jz = int(words[2])
-                line_num += 1
-            elif line_num == 5:
-                N_min = int(words[0])
-                N_1max = int(words[1])
-                N_12max = int(words[2])
-                line_num += 1
-            elif line_num == 6:
-                iham = int(words[0])
-                iclmb = int(words[1])
-                strcm = float(words[2])
-                line_num += 1
-            elif line_num == 7:
-                interaction_type = int(words[0])
-                line_num += 1
-            elif line_num == 8:
-                major = int(words[0])
-                line_num += 1
-            elif line_num == 9:
-                nshll = int(words[0])
-                line_num += 1
-            elif line_num == 10:  # shell diagram thing is of variable length
-                if "! N=" in line:
-                    occupation_string += line
-                else:  # when we're on the next useful line
-                    nsets = int(words[0])
-                    min_nesp = int(words[1])
-                    nskip = int(words[2])
-                    iset1 = int(words[3])
-                    line_num += 1
-            elif line_num == 11:
-                ki = int(words[0])
-                kf = int(words[1])
-                nstates = int(words[2])
-                line_num += 1
-            elif line_num == 12:
-                gs_energy = float(words[0])
-                line_num += 1
-            elif line_num == 13:
-                iterations_required = int(words[0])
-                line_num += 1
-            elif line_num == 14:
-                igt = int(words[0])
-                line_num += 1
-            elif line_num == 15:
-                irest = int(words[0])
-                line_num += 1
-            elif line_num == 16:
-                nhme = int(words[0])
-                line_num += 1
-            elif line_num == 17:
-                nhw0 = int(words[0])
-                nhw_min = int(words[1])
-                nhw_max = int(words[2])
-                nhw_restart = int(words[3])
-                line_num += 1
-            elif line_num == 18:
-                kappa_points = int(words[0])
-                cmin = float(words[1])
-                kappa_restart = int(words[2])
-                line_num += 1
-            elif line_num == 19:
-                # numbers are words with digits but no letters
-                numbers = [
-                    word for word in words
-                    if (any(char.isdigit() for char in word) and not
-                        any(char.isalpha()) for char in word)]
-                kappa_vals = " ".join(numbers)
-                line_num += 1
-            elif line_num == 20:
-                convergence_delta = float(words[0])
-                line_num += 1
-            elif line_num == 21:
-                three_body_interaction = line
-                line_num += 1
-            elif line_num == 22:
-                N_1max_verif = int(words[0])
-                N_12max_verif = int(words[1])
-                N_123max = int(words[2])
-                line_num += 1
-            elif line_num == 23:
-                eff_charge_p = float(words[0])
-                eff_charge_n = float(words[1])
-                line_num += 1
-            elif line_num == 24:
-                glp = float(words[0])
-                gln = float(words[1])
-                gsp = float(words[2])
-                gsn = float(words[3])
-                line_num += 1
-            elif line_num == 25:
-                rmemavail = words[0]
-
-        # arrange parameters in a MFDPParams object
-        params = MFDPParams(
-            output_file=output_file,
-            two_body_interaction=two_body_interaction,
-            two_body_file_type=two_body_file_type,
-            Z=Z,
-            N=N,
-            hbar_omega=hbar_omega,
-            Nhw=Nhw,
-            N_min=N_min,
-            N_1max=N_1max,
-            N_12max=N_12max,
-            parity=parity,
-            total_2Jz=total_2Jz,
-            iham=iham,
-            iclmb=iclmb,
-            strcm=strcm,
-            interaction_type=interaction_type,
-            major=major,
-            nshll=nshll,
-            occupation_string=occupation_string,
-            nsets=nsets,
-            min_nesp=min_nesp,
-            nskip=nskip,
-            iset1=iset1,
-            ki=ki,
-            kf=kf,
-            n_states=nstates,
-            gs_energy=gs_energy,
-            iterations_required=iterations_required,
-            igt=igt,
-            irest=irest,
-            nhme=nhme,
-            nhw0=nhw0,
-            nhw_min=nhw_min,
-            nhw_restart=nhw_restart,
-            kappa_points=kappa_points,
-            cmin=cmin,
-            kappa_restart=kappa_restart,
-            kappa_vals=kappa_vals,
-            convergence_delta=convergence_delta,
-            three_body_interaction=three_body_interaction,
-            N_123max=N_123max,
-            eff_charge_p=eff_charge_p,
-            eff_charge_n=eff_charge_n,
-            glp=glp,
-            gln=gln,
-            gsp=gsp,
-            gsn=gsn,
-            saved_pivot=saved_pivot,
-            rmemavail=rmemavail)
-
-        # do a couple quick checks here, then use check_mfdp_read for the rest
-        if nhw_max != Nhw:
-            raise ValueError("the value of nhw_max must be equal to Nhw")
-        if N_1max != N_1max_verif:
-            raise ValueError("N_1max from under 3-body file doesn't match")
-        if N_12max != N_12max_verif:
-            raise ValueError("N_12max from under 3-body file doesn't match")
+        """reads self.filename (see parse_mfdp), then checks what it got"""
+        params = parse_mfdp(self.filename)
         check_mfdp_read(params)
         self.params = params
 
@@ -262,6 +288,55 @@ class SummitBatch(FileManager):
         self.params = params
 
 
+class LocalBatch(FileManager):
+    """ class for writing batch files that run without a scheduler """
+    def __init__(self, filename="batch_ncsd", params=None):
+        super(LocalBatch, self).__init__("LOCAL_BATCH", filename)
+        self.params = params
+
+
+class CedarArray(FileManager):
+    """ class for writing Slurm job array scripts, on Cedar machine """
+    def __init__(self, filename="array_ncsd", params=None):
+        super(CedarArray, self).__init__("CEDAR_ARRAY", filename)
+        self.params = params
+
+
+class SummitArray(FileManager):
+    """ class for writing LSF job array scripts, on Summit machine """
+    def __init__(self, filename="array_ncsd", params=None):
+        super(SummitArray, self).__init__("SUMMIT_ARRAY", filename)
+        self.params = params
+
+
+class CedarFarm(FileManager):
+    """ class for writing task farm scripts, on Cedar machine """
+    def __init__(self, filename="farm_ncsd", params=None):
+        super(CedarFarm, self).__init__("CEDAR_FARM", filename)
+        self.params = params
+
+
+class SummitFarm(FileManager):
+    """ class for writing task farm scripts, on Summit machine """
+    def __init__(self, filename="farm_ncsd", params=None):
+        super(SummitFarm, self).__init__("SUMMIT_FARM", filename)
+        self.params = params
+
+
+class CedarStage(FileManager):
+    """ class for writing one stage of a chain of jobs, on Cedar machine """
+    def __init__(self, filename="stage_ncsd", params=None):
+        super(CedarStage, self).__init__("CEDAR_STAGE", filename)
+        self.params = params
+
+
+class SummitStage(FileManager):
+    """ class for writing one stage of a chain of jobs, on Summit machine """
+    def __init__(self, filename="stage_ncsd", params=None):
+        super(SummitStage, self).__init__("SUMMIT_STAGE", filename)
+        self.params = params
+
+
 class Defaults(FileManager):
     # it's not actually a type of file but I had some code for MFDP files
     # that I wanted to use with defaults, so I made this
@@ -80,6 +80,36 @@ done
 mv mfd.log mfd.log_{output_file}
 """
 
+local_batch_format = """#!/bin/bash
+# runs straight from the shell, not through a scheduler (see backends.py),
+# with {ranks} MPI rank(s)
+
+cd {run_directory}
+
+potential="{potential}"
+
+iNu="{nucleus_name}"
+freq="{hbar_omega}"
+suf="{suffix}"
+Ngs={Ngs}
+
+
+{launcher}{ncsd_path}
+
+for Nmax in {non_IT_Nmax}
+
+do
+
+N=$[$Nmax+$Ngs]
+
+mv mfdp_${{N}}.egv mfdp_${{N}}.egv_${{iNu}}_${{potential}}_Nmax${{Nmax}}.${{freq}}${{suf}}
+
+done
+{potential_end_bit}
+
+mv mfd.log mfd.log_{output_file}
+"""
+
 summit_batch_format = """#!/bin/bash
 
 #BSUB -P {account}
@@ -141,6 +171,202 @@ done
 mv mfd.log mfd.log_{output_file}
 """
 
+cedar_array_format = """#!/bin/bash
+#SBATCH --account={account}
+#SBATCH --nodes={nodes}               # number of 48-cpu nodes
+#SBATCH --tasks-per-node={tasks_per_node}      # mpi tasks per node (max 48)
+#SBATCH --mem={mem}                 # to use full nodes, set this to zero
+#SBATCH --mem-per-cpu={mem_per_core}G     # memory per CPU
+#SBATCH --time={time}           # time (DD-HH:MM)
+#SBATCH --output={output}
+#SBATCH --array=1-{n_runs}{array_limit}
+
+# each task in the array runs the batch file on its line of the run list
+batch_path=$(sed -n "${{SLURM_ARRAY_TASK_ID}}p" {run_list})
+
+bash $batch_path
+"""
+
+summit_array_format = """#!/bin/bash
+
+#BSUB -P {account}
+#BSUB -W {time}
+#BSUB -nnodes {nnodes}
+#BSUB -J {job_name}[1-{n_runs}]{array_limit}
+#BSUB -eo {output}.%J.%I
+
+# each task in the array runs the batch file on its line of the run list
+batch_path=$(sed -n "${{LSB_JOBINDEX}}p" {run_list})
+
+bash $batch_path
+"""
+
+cedar_farm_format = """#!/bin/bash
+#SBATCH --account={account}
+#SBATCH --nodes={nodes}               # number of 48-cpu nodes
+#SBATCH --tasks-per-node={tasks_per_node}      # mpi tasks per node (max 48)
+#SBATCH --mem={mem}                 # to use full nodes, set this to zero
+#SBATCH --mem-per-cpu={mem_per_core}G     # memory per CPU
+#SBATCH --time={time}           # time (DD-HH:MM)
+#SBATCH --output={output}
+
+# this one job works through every run in the run list, {slots} at a time,
+# each on {nodes_per_run} nodes. A new run starts as soon as one finishes.
+
+# each run's batch file calls srun, so make that a job step
+# on just that run's share of the nodes, not the whole allocation
+srun() {{
+    command srun --exclusive --nodes={nodes_per_run} --ntasks={tasks_per_run} "$@"
+}}
+export -f srun
+
+while read -r batch_path
+do
+    while [ $(jobs -rp | wc -l) -ge {slots} ]
+    do
+        wait -n
+    done
+    bash $batch_path > $(dirname $batch_path)/ncsd-farm.out 2>&1 &
+done < {run_list}
+
+wait
+"""
+
+summit_farm_format = """#!/bin/bash
+
+#BSUB -P {account}
+#BSUB -W {time}
+#BSUB -nnodes {nnodes}
+#BSUB -J {job_name}
+#BSUB -eo {output}.%J
+
+# this one job works through every run in the run list, {slots} at a time,
+# each on {nodes_per_run} nodes. A new run starts as soon as one finishes.
+# jsrun only hands out resource sets that aren't in use,
+# so runs going at the same time get their own share of the nodes.
+
+while read -r batch_path
+do
+    while [ $(jobs -rp | wc -l) -ge {slots} ]
+    do
+        wait -n
+    done
+    bash $batch_path > $(dirname $batch_path)/ncsd-farm.out 2>&1 &
+done < {run_list}
+
+wait
+"""
+
+
+cedar_stage_format = """#!/bin/bash
+#SBATCH --account={account}
+#SBATCH --nodes={nodes}               # number of 48-cpu nodes
+#SBATCH --tasks-per-node={tasks_per_node}      # mpi tasks per node (max 48)
+#SBATCH --mem={mem}                 # to use full nodes, set this to zero
+#SBATCH --mem-per-cpu={mem_per_core}G     # memory per CPU
+#SBATCH --time={time}           # time (DD-HH:MM)
+#SBATCH --output={output}
+
+# stage {stage} of {n_stages} of this run, up to Nmax {Nmax}
+# each stage restarts from the pivot the stage before it saved
+cd {run_directory}
+cp {stage_mfdp} mfdp.dat
+
+bash {stage_batch}
+"""
+
+summit_stage_format = """#!/bin/bash
+
+#BSUB -P {account}
+#BSUB -W {time}
+#BSUB -nnodes {nnodes}
+#BSUB -J {job_name}
+#BSUB -eo {output}.%J
+
+# stage {stage} of {n_stages} of this run, up to Nmax {Nmax}
+# each stage restarts from the pivot the stage before it saved
+cd {run_directory}
+cp {stage_mfdp} mfdp.dat
+
+bash {stage_batch}
+"""
+
+staged_ncsd_format = """#!/bin/bash
+# started by every MPI rank instead of ncsd-it.exe, to run it from the node's
+# local disk rather than the shared filesystem (see backends.py)
+#
+# The first rank on each node to get here copies the interaction files to
+# {scratch} (once per node, however many runs there share them) and sets up
+# this run's directory there, the others wait for it. ncsd-it.exe reads and
+# writes its pivots and .egv files on rank 0 only, so only rank 0 copies the
+# saved ones over, and once ncsd-it.exe is done it copies back the files
+# written since it started (nothing older, which could be a stale copy of
+# something in the run directory), all at once, and if that worked, tidies
+# up. The first rank on each of the other nodes just tidies up.
+
+run_dir=$(pwd)
+scratch={scratch}/ncsd
+job=${{SLURM_JOB_ID:-${{LSB_JOBID:-local}}}}
+stage_run=$scratch/runs/${{job}}_$(basename $run_dir)_$(echo $run_dir | md5sum | cut -c1-8)
+rank=${{SLURM_PROCID:-${{JSM_NAMESPACE_RANK:-${{OMPI_COMM_WORLD_RANK:-0}}}}}}
+local_rank=${{SLURM_LOCALID:-${{JSM_NAMESPACE_LOCAL_RANK:-${{OMPI_COMM_WORLD_LOCAL_RANK:-0}}}}}}
+# only on rank 0's node, anything newer was written by this run
+started=$stage_run/.started
+
+mkdir -p $scratch/int $stage_run
+(
+    flock 9
+    if [ ! -e $stage_run/mfdp.dat ]
+    then
+        edits=""
+        three_body_line=$(grep -n -m 1 "{three_body_marker}" mfdp.dat | cut -d: -f1)
+        for line in {two_body_line} $((three_body_line - 1))
+        do
+            file=$(sed -n ${{line}}p mfdp.dat)
+            [ -n "$file" ] || continue
+            name=$(basename $file)
+            if [ ! -e $scratch/int/$name ]
+            then
+                cp $file $scratch/int/$name.part
+                mv $scratch/int/$name.part $scratch/int/$name
+            fi
+            edits="$edits -e ${{line}}s|.*|$scratch/int/$name|"
+        done
+        ln -sf $(readlink -f ncsd-it.exe) $stage_run/ncsd-it.exe
+        sed -e "" $edits mfdp.dat > $stage_run/mfdp.dat.part
+        mv $stage_run/mfdp.dat.part $stage_run/mfdp.dat
+    fi
+) 9> $scratch/lock
+
+if [ $rank = 0 ]
+then
+    # saved pivots and .egv files, for restarts
+    cp -p mfdp_* $stage_run/ 2>/dev/null
+    touch $started
+fi
+
+cd $stage_run
+./ncsd-it.exe
+status=$?
+
+if [ $rank = 0 ]
+then
+    for file in $(find . -maxdepth 1 -type f -newer $started)
+    do
+        cp -p $file $run_dir/ &
+    done
+    copied=0
+    for copy in $(jobs -p)
+    do
+        wait $copy || copied=1
+    done
+    [ $copied != 0 ] || rm -rf $stage_run
+elif [ $local_rank = 0 ] && [ ! -e $started ]
+then
+    rm -rf $stage_run
+fi
+exit $status
+"""
 
 potential_end_bit_format = """
 for Nmax in {IT_Nmax}
@@ -0,0 +1,257 @@
+"""collecting the energies from finished runs into one results store
+
+At the end of a run, the batch script renames mfd.log to
+mfd.log_<output_file>. harvest() walks a directory tree in parallel, reads
+every one of those logs, and pulls out each state ncsd found: the Nhw it was
+found at, the kappa (for importance truncated runs, None otherwise), its
+energy, J and T. Each state becomes one row, along with what the run was
+(Z, N, hbar_omega, Nhw, interactions... from its mfdp.dat).
+
+The rows are kept in a ResultsStore, a directory of column files:
+
+    results/index.json           log path --> mtime, size, chunk it's in
+    results/chunk_000001.json    {"n_rows": 40, "columns": {"Z": ..., ...}}
+
+Each harvest adds new chunks, and only reads logs that are new or have
+changed since they were last read (the index says which). The rows from
+the old version of a changed log are left where they are, but ignored,
+until compact() rewrites everything as one chunk.
+
+    harvest("scratch/", "scratch/results")
+    energies = ResultsStore("scratch/results").load(["nucleus", "Nmax",
+                                                     "hbar_omega", "energy"])
+
+The log format isn't written down anywhere, so what's read is set by the
+patterns below: a line like "Nhw = 8" or "kappa = 2.0" sets the Nhw /
+kappa for the states after it, and states are the rows of numbers
+(number, energy, J, T, anything else) following a header line that has
+Energy, J and T in it.
+"""
+import json
+import re
+from os import walk, stat, remove, replace, makedirs
+from os.path import join, exists, realpath
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from .file_manager import parse_mfdp
+from .parameter_calculations import Ngs_func, nucleus
+from .manifest import compress, expand
+
+nhw_pattern = re.compile(r"(?i)\bN_?hw\s*=\s*(\d+)")
+kappa_pattern = re.compile(
+    r"(?i)\bkappa\w*\s*=\s*(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)")
+header_pattern = re.compile(r"(?i)\benergy\b.*\bJ\b.*\bT\b")
+number = r"(-?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?)"
+state_pattern = re.compile(
+    r"^\s*(\d+)\s+" + number + r"\s+" + number + r"\s+" + number +
+    r"(?:\s|$)")
+
+# what's kept about the run each state comes from, from its mfdp.dat
+run_fields = ["Z", "N", "hbar_omega", "Nhw", "nhw0", "nhw_min", "N_1max",
+              "N_12max", "N_123max", "interaction_type",
+              "two_body_interaction", "three_body_interaction", "n_states",
+              "kappa_vals", "output_file"]
+# and about each state
+state_fields = ["log", "run_dir", "nucleus", "Nmax", "kappa", "state",
+                "energy", "J", "T"]
+result_fields = run_fields + state_fields
+
+# logs read before a chunk is written out
+chunk_logs = 500
+
+
+def parse_log(log_path):
+    """[(Nhw, kappa, state number, energy, J, T)] for every state in a log"""
+    states = []
+    Nhw = None
+    kappa = None
+    in_table = False
+    with open(log_path, errors="replace") as open_file:
+        for line in open_file:
+            match = state_pattern.match(line)
+            if in_table and match is not None:
+                state, energy, J, T = match.groups()
+                states.append((Nhw, kappa, int(state), float(energy),
+                               float(J), float(T)))
+                continue
+            in_table = header_pattern.search(line) is not None
+            match = nhw_pattern.search(line)
+            if match is not None:
+                Nhw = int(match.group(1))
+            match = kappa_pattern.search(line)
+            if match is not None:
+                kappa = float(match.group(1))
+    return states
+
+
+def harvest_log(log_path, run_dir):
+    """the rows (as a dict of columns) for one log, using the run's
+    mfdp.dat for what the run was"""
+    m = parse_mfdp(join(run_dir, "mfdp.dat"))
+    Ngs = Ngs_func(m.Z, m.N)
+    run_values = [getattr(m, field) for field in run_fields]
+    columns = {field: [] for field in result_fields}
+    for Nhw, kappa, state, energy, J, T in parse_log(log_path):
+        if Nhw is None:
+            Nhw = m.Nhw
+        values = run_values + [log_path, run_dir, nucleus(m.Z, m.N),
+                               Nhw - Ngs, kappa, state, energy, J, T]
+        for field, value in zip(result_fields, values):
+            columns[field].append(value)
+    return columns
+
+
+def find_logs(root):
+    """(log path, run directory) for every renamed mfd.log under root"""
+    for directory, _, filenames in walk(root):
+        if "mfdp.dat" not in filenames:
+            continue
+        for filename in filenames:
+            if filename.startswith("mfd.log_"):
+                yield join(directory, filename), directory
+
+
+class ResultsStore(object):
+    """the directory of result columns at path (empty if it isn't there)"""
+    def __init__(self, path):
+        self.path = path
+        self.index_path = join(path, "index.json")
+        if exists(self.index_path):
+            with open(self.index_path) as open_file:
+                saved = json.load(open_file)
+        else:
+            saved = {"logs": {}, "chunks": [], "next_chunk": 1}
+        self.logs = saved["logs"]
+        self.chunks = saved["chunks"]
+        self.next_chunk = saved["next_chunk"]
+
+    def save_index(self):
+        """writes the index, all at once, so a crash leaves the old one"""
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as open_file:
+            json.dump({"logs": self.logs, "chunks": self.chunks,
+                       "next_chunk": self.next_chunk}, open_file)
+        replace(temp_path, self.index_path)
+
+    def is_current(self, log_path, log_stat):
+        """True if log_path was read when it looked like it does now"""
+        entry = self.logs.get(log_path)
+        return entry is not None and entry["mtime"] == log_stat.st_mtime \
+            and entry["size"] == log_stat.st_size
+
+    def add(self, results):
+        """adds a new chunk from [(log path, os.stat of it, columns or
+        error message)], and records those logs as read"""
+        name = "chunk_{:06}.json".format(self.next_chunk)
+        columns = {field: [] for field in result_fields}
+        for log_path, log_stat, log_columns in results:
+            entry = {"mtime": log_stat.st_mtime, "size": log_stat.st_size,
+                     "chunk": None}
+            if isinstance(log_columns, str):
+                entry["error"] = log_columns
+            elif log_columns["log"]:
+                entry["chunk"] = name
+                for field in result_fields:
+                    columns[field] += log_columns[field]
+            self.logs[log_path] = entry
+        n_rows = len(columns["log"])
+        if n_rows > 0:
+            with open(join(self.path, name), "w") as open_file:
+                json.dump({"n_rows": n_rows, "columns": {
+                    field: compress(column)
+                    for field, column in columns.items()}}, open_file)
+            self.chunks.append(name)
+            self.next_chunk += 1
+        self.save_index()
+        return n_rows
+
+    def forget(self, log_paths):
+        """drops logs that aren't there anymore"""
+        for log_path in log_paths:
+            del self.logs[log_path]
+        self.save_index()
+
+    def load(self, fields=None):
+        """{field: list of values} for every current row, for the given
+        fields (all of them by default)"""
+        fields = result_fields if fields is None else fields
+        loaded = {field: [] for field in fields}
+        for name in self.chunks:
+            with open(join(self.path, name)) as open_file:
+                chunk = json.load(open_file)
+            n_rows = chunk["n_rows"]
+            columns = chunk["columns"]
+            logs = expand(columns["log"], n_rows)
+            # rows from logs that were read again later are out of date
+            keep = [i for i, log_path in enumerate(logs)
+                    if self.logs.get(log_path, {}).get("chunk") == name]
+            for field in fields:
+                column = expand(columns[field], n_rows)
+                loaded[field] += [column[i] for i in keep]
+        return loaded
+
+    def compact(self):
+        """rewrites all current rows as one chunk, deleting the rest"""
+        old_chunks = self.chunks
+        columns = self.load()
+        name = "chunk_{:06}.json".format(self.next_chunk)
+        n_rows = len(columns["log"])
+        with open(join(self.path, name), "w") as open_file:
+            json.dump({"n_rows": n_rows, "columns": {
+                field: compress(column)
+                for field, column in columns.items()}}, open_file)
+        for entry in self.logs.values():
+            if entry["chunk"] is not None:
+                entry["chunk"] = name
+        self.chunks = [name]
+        self.next_chunk += 1
+        self.save_index()
+        for old_name in old_chunks:
+            remove(join(self.path, old_name))
+
+
+def harvest(root, store_path, n_workers=8, processes=False):
+    """reads every new or changed log under root into the ResultsStore at
+    store_path, n_workers at a time (processes=True for processes rather
+    than threads). Returns (logs read, rows added, problems)."""
+    root = realpath(root)
+    if not exists(store_path):
+        makedirs(store_path)
+    store = ResultsStore(store_path)
+    pool_type = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    seen = set()
+    in_flight = deque()
+    done = []
+    counts = {"logs": 0, "rows": 0, "problems": 0}
+
+    def collect(log_path, log_stat, future):
+        try:
+            done.append((log_path, log_stat, future.result()))
+        except Exception as e:
+            print("couldn't read " + log_path + ": " + repr(e))
+            done.append((log_path, log_stat, repr(e)))
+            counts["problems"] += 1
+        counts["logs"] += 1
+        if len(done) >= chunk_logs:
+            counts["rows"] += store.add(done)
+            del done[:]
+
+    with pool_type(max_workers=n_workers) as pool:
+        for log_path, run_dir in find_logs(root):
+            seen.add(log_path)
+            log_stat = stat(log_path)
+            if store.is_current(log_path, log_stat):
+                continue
+            in_flight.append((log_path, log_stat,
+                              pool.submit(harvest_log, log_path, run_dir)))
+            while len(in_flight) >= 4 * n_workers:
+                collect(*in_flight.popleft())
+        while in_flight:
+            collect(*in_flight.popleft())
+    if done:
+        counts["rows"] += store.add(done)
+    gone = [log_path for log_path in store.logs
+            if log_path not in seen and log_path.startswith(join(root, ""))]
+    if gone:
+        store.forget(gone)
+    return counts["logs"], counts["rows"], counts["problems"]
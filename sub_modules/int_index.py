@@ -0,0 +1,237 @@
+"""an index of the interaction files in int_dir, so they aren't looked at
+one by one (every stat on GPFS is slow)
+
+int_dir is scanned in one pass, and for each file we keep its mtime, size
+and whatever can be read from its name (frequency, Nmax values, TBME type).
+The index is saved in ~/.ncsd_int_index.json (one per user, since int_dir
+is often shared and read-only), with the indexes of any other int_dirs.
+Each time it's refreshed, int_dir is only scanned again if its mtime has
+changed (a file was added, removed or renamed), and files whose mtime and
+size are the same keep their entries, so only new / changed ones are
+parsed. A file rewritten in place doesn't change int_dir's mtime, so the
+files about to be used are stat'ed on every refresh as well.
+
+    index = get_int_index(int_dir)
+    index.find("tbme", hbar_omega=20, N_1max=9)  # --> list of file names
+"""
+import json
+import os
+import time
+from os.path import realpath, expanduser, dirname, basename, join
+from tempfile import mkstemp
+from threading import Lock
+
+cache_path = expanduser("~/.ncsd_int_index.json")
+
+# int_dir's mtime isn't kept if it's newer than this (seconds), since a file
+# added in the same tick (a second, on some filesystems) wouldn't change it
+settle_time = 2
+
+# int_dir --> IntIndex, so each directory is only loaded once per session
+loaded_indexes = {}
+loaded_lock = Lock()
+
+
+def parse_tbme_name(filename):
+    """e.g. TBMEA2srg-n3lo2.0_14.20_910 --> frequency 20, N_1max 9 etc.
+
+    nmax_code is the bit after the frequency, "910" = N_1max 9, N_12max 10
+    (N_1max is assumed to be one digit there). If the name can't be read,
+    the dict has an "error" instead.
+    """
+    try:
+        last_chunk = filename.split(".")[-1]
+        [hbar_omega, nmax_code] = last_chunk.split("_")
+        metadata = {"hbar_omega": float(hbar_omega), "nmax_code": nmax_code}
+    except Exception as e:
+        return {"error": str(e)}
+    try:
+        metadata["N_1max"] = int(nmax_code[0])
+        metadata["N_12max"] = int(nmax_code[1:])
+    except ValueError:
+        pass
+    file_type = tbme_file_type(filename)
+    if file_type is not None:
+        metadata["file_type"] = file_type
+    return metadata
+
+
+def parse_three_body_name(filename):
+    """e.g. v3trans_J3T3.int_3NFlocnonloc-srg2.0_from24_220_11109.20
+    --> frequency 20, nmax_code "11109" (N_123max, N_12max, N_1max)"""
+    try:
+        [penultimate_chunk, last_chunk] = filename.split(".")[-2:]
+        hbar_omega = float(last_chunk.split("_")[0])
+        if len(last_chunk.split("_")) > 2:
+            raise ValueError("too many _ after the frequency")
+        nmax_code = penultimate_chunk.split("_")[-1]
+    except Exception as e:
+        return {"error": str(e)}
+    return {"hbar_omega": hbar_omega, "nmax_code": nmax_code}
+
+
+def tbme_file_type(filename):
+    """the TBME type from a TBME file name (the character after "TBMEA"),
+    or None if it isn't there"""
+    if len(filename) > 5 and filename[5].isdigit():
+        return int(filename[5])
+    return None
+
+
+def file_entry(filename, stat):
+    """what the index keeps for one file"""
+    return {
+        "mtime": stat.st_mtime,
+        "size": stat.st_size,
+        "tbme": parse_tbme_name(filename),
+        "three_body": parse_three_body_name(filename)}
+
+
+class IntIndex(object):
+    """all the files in int_dir, with what their names say about them
+
+    files is a dict of file name --> {"mtime", "size", "tbme", "three_body"},
+    where "tbme" / "three_body" are what the name means if it's read as that
+    kind of file (see parse_tbme_name, parse_three_body_name).
+    dir_mtime is int_dir's mtime (in ns) when it was last scanned, or None
+    if it has to be scanned next time.
+    save=False keeps the index in memory only, nothing is written.
+    """
+    def __init__(self, int_dir, save=True, check=()):
+        self.int_dir = realpath(int_dir)
+        self.files = {}
+        self.dir_mtime = None
+        self.load()
+        self.refresh(save, check)
+
+    def load(self):
+        """reads this int_dir's saved index, if there is one"""
+        try:
+            with open(cache_path) as open_file:
+                saved = json.load(open_file)[self.int_dir]
+            self.files = saved["files"]
+            self.dir_mtime = saved["dir_mtime"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.files = {}
+            self.dir_mtime = None
+
+    def refresh(self, save=True, check=()):
+        """brings the index up to date and saves it if anything changed
+
+        int_dir is scanned (in one pass, reusing entries for files with the
+        same mtime and size) only if its mtime isn't the one we scanned,
+        the files named in check are stat'ed either way.
+        """
+        files = dict(self.files)
+        dir_mtime = os.stat(self.int_dir).st_mtime_ns
+        if dir_mtime != self.dir_mtime:
+            files = {}
+            with os.scandir(self.int_dir) as entries:
+                for entry in entries:
+                    if entry.is_file():
+                        files[entry.name] = self.entry(entry.name,
+                                                       entry.stat())
+            if time.time() - dir_mtime / 1e9 < settle_time:
+                dir_mtime = None
+        for filename in check:
+            try:
+                stat = os.stat(join(self.int_dir, filename))
+            except FileNotFoundError:
+                files.pop(filename, None)
+                continue
+            files[filename] = self.entry(filename, stat)
+        changed = files != self.files or dir_mtime != self.dir_mtime
+        self.files = files
+        self.dir_mtime = dir_mtime
+        if changed and save:
+            self.save()
+
+    def entry(self, filename, stat):
+        """the entry we have for filename if it's unchanged (same mtime and
+        size), otherwise a new one"""
+        old = self.files.get(filename)
+        if old is not None and old["mtime"] == stat.st_mtime \
+                and old["size"] == stat.st_size:
+            return old
+        return file_entry(filename, stat)
+
+    def save(self):
+        """writes the index into the cache file (all at once, so a reader
+        never sees half of it), with the ones for other int_dirs, or
+        doesn't, if we're not allowed to"""
+        try:
+            with open(cache_path) as open_file:
+                saved = json.load(open_file)
+            if not isinstance(saved, dict):
+                saved = {}
+        except (OSError, ValueError):
+            saved = {}
+        saved[self.int_dir] = {"dir_mtime": self.dir_mtime,
+                               "files": self.files}
+        # a temporary file of our own, other processes may be saving too
+        try:
+            handle, temp_path = mkstemp(dir=dirname(cache_path),
+                                        prefix=basename(cache_path) + ".")
+        except OSError:
+            return
+        try:
+            with os.fdopen(handle, "w") as open_file:
+                json.dump(saved, open_file)
+            os.replace(temp_path, cache_path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def __contains__(self, filename):
+        return filename in self.files
+
+    def metadata(self, filename, kind):
+        """what the name of filename says, if it's a kind ("tbme" or
+        "three_body") of file. Raises IOError if the file isn't there."""
+        if filename not in self.files:
+            raise IOError(filename + " is not in " + self.int_dir)
+        return self.files[filename][kind]
+
+    def find(self, kind, **conditions):
+        """file names of the given kind whose metadata match all conditions
+
+        kind is "tbme" (files starting with TBME) or "three_body" (any
+        others that look like 3-body files). For example:
+
+            find("tbme", hbar_omega=20, N_1max=9)
+            find("three_body", hbar_omega=20, nmax_code="11109")
+        """
+        if kind not in ["tbme", "three_body"]:
+            raise ValueError("kind must be tbme or three_body, not "+kind)
+        found = []
+        for filename, entry in self.files.items():
+            if filename.startswith("TBME") != (kind == "tbme"):
+                continue
+            metadata = entry[kind]
+            if "error" in metadata:
+                continue
+            if all(metadata.get(key) == value
+                   for key, value in conditions.items()):
+                found.append(filename)
+        return sorted(found)
+
+
+def get_int_index(int_dir, refresh=False, save=True, check=()):
+    """the index for int_dir, loaded (or made) the first time it's asked for
+
+    After that, the same index is handed out without looking at int_dir
+    again, unless refresh=True (see IntIndex.refresh). check is the files
+    about to be used, whose entries are made sure to be up to date.
+    save=False never writes the index (it's only kept in memory).
+    """
+    int_dir = realpath(int_dir)
+    with loaded_lock:
+        index = loaded_indexes.get(int_dir)
+        if index is None:
+            index = IntIndex(int_dir, save, check)
+            loaded_indexes[int_dir] = index
+        elif refresh:
+            index.refresh(save, check)
+    return index
@@ -0,0 +1,311 @@
+"""checking what's in the interaction files, not just what they're called
+
+manual_input_check compares the file names with the parameters, but a 3-body
+file that was cut short while being copied has the right name too, and
+that's only found out when ncsd crashes reading it, hours into a big job.
+So each file is memory-mapped, and its start and end are looked at (a few
+pages, however big the file is):
+
+    text files      the first line has numbers in it, the file ends with a
+                    newline and its last line has as many numbers as the
+                    one before (a cut-off copy almost never does)
+    binary files    if they're Fortran sequential files, the first record's
+                    length markers match, and so do the last record's (its
+                    trailing marker is the last 4 bytes, and the same number
+                    has to be that many bytes before it), otherwise the size
+                    has to be a whole number of 4-byte values
+    any file        it isn't empty, and it isn't smaller than another file
+                    in int_dir that's the same but for lower truncations
+
+A fingerprint (blake2b of the size, start and end) is kept for each file.
+With full=True, the whole file is read instead: every record of a Fortran
+file is walked, and a checksum (blake2b) of all of it is worked out, to
+compare with the copy on another machine. That's slow for a multi-GB
+3-body file, so it isn't done unless asked for.
+
+What was found is saved in ~/.ncsd_int_verified.json with the file's path,
+size and mtime, and the file is only looked at again if they change.
+
+    problems = check_int_file(get_int_index(int_dir), filename, "tbme")
+"""
+import json
+import mmap
+import os
+import struct
+import hashlib
+from os.path import join, realpath, expanduser
+
+cache_path = expanduser("~/.ncsd_int_verified.json")
+# how much is given to the checksum at a time
+chunk_bytes = 64 * 1024 * 1024
+# how much of the start and end of a file is looked at
+header_bytes = 4096
+
+
+def load_cache(path=None):
+    """{file path: what verify_file found}, from the cache file (by default
+    cache_path)"""
+    try:
+        with open(path or cache_path) as open_file:
+            return json.load(open_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path=None):
+    """writes the cache file (all at once, so a reader never sees half of
+    it), or doesn't, if we're not allowed to. Files that have gone are
+    dropped from it."""
+    for file_path in [file_path for file_path in cache
+                      if not os.path.exists(file_path)]:
+        del cache[file_path]
+    path = path or cache_path
+    try:
+        with open(path + ".tmp", "w") as open_file:
+            json.dump(cache, open_file)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        pass
+
+
+def fingerprint(mapped):
+    """blake2b of the size, the first and the last header_bytes of a file"""
+    digest = hashlib.blake2b()
+    digest.update(str(len(mapped)).encode())
+    digest.update(mapped[:header_bytes])
+    digest.update(mapped[max(0, len(mapped) - header_bytes):])
+    return digest.hexdigest()
+
+
+def checksum(mapped):
+    """blake2b of a whole memory-mapped file, chunk_bytes at a time"""
+    if hasattr(mmap, "MADV_SEQUENTIAL"):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    digest = hashlib.blake2b()
+    view = memoryview(mapped)
+    try:
+        for start in range(0, len(mapped), chunk_bytes):
+            digest.update(view[start:start+chunk_bytes])
+    finally:
+        view.release()
+    return digest.hexdigest()
+
+
+def is_text(header):
+    """True if the start of a file looks like text"""
+    if b"\0" in header:
+        return False
+    try:
+        header.decode("ascii")
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def numbers(line):
+    """how many of the whitespace-separated fields of line are numbers"""
+    count = 0
+    for field in line.split():
+        try:
+            float(field.replace(b"D", b"E").replace(b"d", b"e"))
+        except ValueError:
+            continue
+        count += 1
+    return count
+
+
+def text_problems(mapped):
+    """what's wrong with a text interaction file, if anything"""
+    problems = []
+    first_line = mapped[:header_bytes].lstrip().split(b"\n", 1)[0]
+    if numbers(first_line) == 0:
+        problems.append("there are no numbers in the first line")
+    if mapped[-1:] != b"\n":
+        problems.append("it doesn't end with a newline, "
+                        "so it's probably cut short")
+    # the last two lines, without reading more than the end of the file
+    end = mapped[max(0, len(mapped) - header_bytes):].rstrip(b"\n")
+    last_lines = end.split(b"\n")[-2:]
+    if len(last_lines) == 2 and last_lines[0].strip() and \
+            numbers(last_lines[1]) != numbers(last_lines[0]):
+        problems.append("the last line has {} numbers, the one before {}, "
+                        "so it's probably cut short".format(
+                            numbers(last_lines[1]), numbers(last_lines[0])))
+    return problems
+
+
+def record_at(mapped, position):
+    """the length of the Fortran record starting at position, or None if
+    its two length markers don't match (or it runs past the end). A
+    negative length marker is gfortran's way of saying the record carries
+    on in the next one."""
+    if position + 4 > len(mapped):
+        return None
+    length = abs(struct.unpack_from("<i", mapped, position)[0])
+    end = position + 4 + length
+    if end + 4 > len(mapped) or \
+            abs(struct.unpack_from("<i", mapped, end)[0]) != length:
+        return None
+    return length
+
+
+def fortran_records(mapped):
+    """walks every record of a Fortran sequential file
+
+    Returns (number of records, problem or None), or None if the file
+    doesn't start like one.
+    """
+    size = len(mapped)
+    position = 0
+    n_records = 0
+    while position < size:
+        length = record_at(mapped, position)
+        if length is None:
+            if n_records == 0:
+                return None
+            return n_records, ("record {} (at byte {}) is cut short or its "
+                               "markers don't match".format(n_records + 1,
+                                                            position))
+        position += length + 8
+        n_records += 1
+    return n_records, None
+
+
+def binary_problems(mapped, full=False):
+    """(layout, what's wrong) for a binary interaction file, from its first
+    and last records, or every record if full"""
+    if record_at(mapped, 0) is None:
+        if len(mapped) % 4:
+            return "binary", ["its size isn't a whole number of "
+                              "4-byte values"]
+        return "binary", []
+    if full:
+        n_records, problem = fortran_records(mapped)
+        layout = "fortran, {} records".format(n_records)
+        return layout, [] if problem is None else [problem]
+    # the last record ends the file, so its trailing marker is the last 4
+    # bytes, and its leading marker is that many bytes before
+    size = len(mapped)
+    last = None
+    if size >= 8:
+        length = abs(struct.unpack_from("<i", mapped, size - 4)[0])
+        if length <= size - 8:
+            last = record_at(mapped, size - 8 - length)
+    if last is None:
+        return "fortran", ["the last record's markers don't match, "
+                           "so it's probably cut short"]
+    return "fortran", []
+
+
+def verify_file(path, cache=None, full=False):
+    """{"size", "mtime", "layout", "fingerprint", "problems"} for a file,
+    and "checksum" too if full (see the top of this file)
+
+    cache is a dict from load_cache, the result is taken from it if the file
+    hasn't changed (same size and mtime, and it was checked fully if that's
+    what's wanted) and put in it if it's worked out.
+    """
+    path = realpath(path)
+    stat = os.stat(path)
+    if cache is not None:
+        entry = cache.get(path)
+        if entry is not None and entry["size"] == stat.st_size and \
+                entry["mtime"] == stat.st_mtime and \
+                (not full or "checksum" in entry):
+            return entry
+    if full:
+        print("reading all of " + path + " to check it, this is only done "
+              "once")
+    entry = {"size": stat.st_size, "mtime": stat.st_mtime}
+    if stat.st_size == 0:
+        entry.update(layout="empty", problems=["it's empty"],
+                     fingerprint=hashlib.blake2b(b"0").hexdigest())
+        if full:
+            entry["checksum"] = hashlib.blake2b().hexdigest()
+    else:
+        with open(path, "rb") as open_file:
+            mapped = mmap.mmap(open_file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                if is_text(mapped[:header_bytes]):
+                    layout, problems = "text", text_problems(mapped)
+                else:
+                    layout, problems = binary_problems(mapped, full)
+                entry.update(layout=layout, problems=problems,
+                             fingerprint=fingerprint(mapped))
+                if full:
+                    entry["checksum"] = checksum(mapped)
+            finally:
+                mapped.close()
+    if cache is not None:
+        cache[path] = entry
+    return entry
+
+
+def three_body_nmaxes(nmax_code):
+    """(N_123max, N_12max, N_1max) from e.g. "11109", or None if it can't be
+    read in exactly one way (N_1max is taken to be the last digit)"""
+    if len(nmax_code) < 3 or not nmax_code.isdigit():
+        return None
+    N_1max = int(nmax_code[-1])
+    rest = nmax_code[:-1]
+    splits = [(int(rest[:i]), int(rest[i:]), N_1max)
+              for i in range(1, len(rest))
+              if rest[i] != "0" or i == len(rest) - 1]
+    splits = [split for split in splits if split[0] >= split[1] >= N_1max]
+    return splits[0] if len(splits) == 1 else None
+
+
+def truncations(filename, kind, metadata):
+    """(name without its truncations, truncations) of a file, or None"""
+    nmax_code = metadata.get("nmax_code")
+    if nmax_code is None:
+        return None
+    if kind == "tbme":
+        if "N_12max" not in metadata:
+            return None
+        return (filename[:-len(nmax_code)],
+                (metadata["N_12max"], metadata["N_1max"]))
+    nmaxes = three_body_nmaxes(nmax_code)
+    if nmaxes is None or "_" + nmax_code + "." not in filename:
+        return None
+    return filename.replace("_" + nmax_code + ".", "_."), nmaxes
+
+
+def smaller_than_lower(int_index, filename, kind):
+    """files in int_dir that are the same as filename but for lower
+    truncations, and are bigger than it (which they shouldn't be)"""
+    mine = truncations(filename, kind, int_index.files[filename][kind])
+    if mine is None:
+        return []
+    stem, nmaxes = mine
+    size = int_index.files[filename]["size"]
+    bigger = []
+    for other, entry in int_index.files.items():
+        if other == filename or other.startswith("TBME") != (kind == "tbme"):
+            continue
+        theirs = truncations(other, kind, entry[kind])
+        if theirs is None or theirs[0] != stem or theirs[1] == nmaxes:
+            continue
+        if all(a <= b for a, b in zip(theirs[1], nmaxes)) and \
+                entry["size"] > size:
+            bigger.append(other)
+    return sorted(bigger)
+
+
+def check_int_file(int_index, filename, kind, save=True, full=False):
+    """everything that looks wrong with an interaction file in int_index,
+    kind is "tbme" or "three_body". An empty list means it looks fine.
+    save=False only reads the cache, it doesn't add to it, full=True reads
+    the whole file (see the top of this file)."""
+    cache = load_cache()
+    path = realpath(join(int_index.int_dir, filename))
+    before = cache.get(path)
+    entry = verify_file(path, cache, full)
+    if entry is not before and save:
+        save_cache(cache)
+    problems = list(entry["problems"])
+    for other in smaller_than_lower(int_index, filename, kind):
+        problems.append(
+            "it's smaller than " + other + ", which has lower truncations, "
+            "so it's probably cut short")
+    return problems
@@ -0,0 +1,255 @@
+"""planning runs without writing them, and writing them later from the plan
+
+plan_runs (in ncsd_multi_run.py) works out everything about every run
+(directories, ManParams, MFDPParams, batch params, output file names, Nhw,
+Ngs) in memory, and the Manifest it gives back is saved as one JSON file,
+column by column:
+
+    {"machine": "cedar", "paths": [...], "n_runs": 3,
+     "columns": {"mfdp": {"Z": [3, 3, 3], ...}, "batch": {...}, ...}}
+
+Columns where every run has the same value are stored once, as
+{"all": value}, so even big sweeps give small manifests.
+
+generate_from_manifest then makes the directories and files (and submits
+them) straight from the manifest, without checking the input again.
+"""
+import json
+from os import mkdir, symlink
+from os.path import join, exists
+from shutil import rmtree
+from concurrent.futures import ThreadPoolExecutor
+from .data_structures import ManParams, MFDPParams, man_keys, mfdp_keys, \
+    key_map
+from .parameter_calculations import nucleus
+from .basis_dimension import dimensions
+from .renderer import renderers
+from .submitters import Submitter, JobArrays, TaskFarm
+from .catalog import Catalog, write_stamp, run_key
+from .backends import get_backend
+
+# the column groups (besides man, mfdp and the backend's batch params)
+run_keys = ["run_dir", "nucleus", "output_file", "Nhw", "Ngs", "dimensions"]
+
+
+def compress(column):
+    """a column that's the same all the way down --> {"all": value}"""
+    if len(column) > 0:
+        first = column[0]
+        if all(type(value) is type(first) and value == first
+               for value in column):
+            return {"all": first}
+    return column
+
+
+def expand(column, n_runs):
+    """the reverse of compress"""
+    if isinstance(column, dict):
+        return [column["all"]] * n_runs
+    return column
+
+
+class Manifest(object):
+    """every run in a set, stored as columns
+
+    columns["man"], ["mfdp"] and ["batch"] hold one list per Params field,
+    columns["run"] has run_dir, nucleus, output_file, Nhw, Ngs and the
+    M-scheme basis dimension at each Nmax, as [[Nmax, dimension], ...]
+    """
+    def __init__(self, machine, paths, existing_dir="fail"):
+        self.backend = get_backend(machine)
+        self.machine = machine
+        self.paths = list(paths)
+        self.existing_dir = existing_dir
+        self.n_runs = 0
+        self.keys = {
+            "man": man_keys,
+            "mfdp": mfdp_keys,
+            "batch": key_map[self.backend.filetype],
+            "run": run_keys}
+        self.columns = {group: {key: [] for key in keys}
+                        for group, keys in self.keys.items()}
+
+    def add(self, man_params, run_dir, mfdp_params, batch_params):
+        """adds one run to the end of every column"""
+        for group, params in [("man", man_params), ("mfdp", mfdp_params),
+                              ("batch", batch_params)]:
+            columns = self.columns[group]
+            for key, value in zip(params.valid_keys, params.values()):
+                columns[key].append(value)
+        Nmax_dimensions = dimensions(mfdp_params, man_params.Nmax_min)
+        run_values = [run_dir, nucleus(man_params.Z, man_params.N),
+                      mfdp_params.output_file, mfdp_params.Nhw,
+                      batch_params.Ngs,
+                      [[Nmax, Nmax_dimensions[Nmax]]
+                       for Nmax in sorted(Nmax_dimensions)]]
+        for key, value in zip(run_keys, run_values):
+            self.columns["run"][key].append(value)
+        self.n_runs += 1
+
+    def params(self, i):
+        """[man_params, mfdp_params, batch_params] for run number i"""
+        return [
+            ManParams(**self.row("man", i)),
+            MFDPParams(**self.row("mfdp", i)),
+            self.backend.params_class(**self.row("batch", i))]
+
+    def row(self, group, i):
+        return {key: column[i] for key, column in self.columns[group].items()}
+
+    def save(self, filename):
+        with open(filename, "w") as open_file:
+            json.dump({
+                "machine": self.machine,
+                "paths": self.paths,
+                "existing_dir": self.existing_dir,
+                "n_runs": self.n_runs,
+                "columns": {
+                    group: {key: compress(column)
+                            for key, column in columns.items()}
+                    for group, columns in self.columns.items()}},
+                open_file)
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as open_file:
+            saved = json.load(open_file)
+        manifest = cls(saved["machine"], saved["paths"],
+                       saved["existing_dir"])
+        manifest.n_runs = saved["n_runs"]
+        for group, columns in saved["columns"].items():
+            manifest.columns[group] = {
+                key: expand(column, manifest.n_runs)
+                for key, column in columns.items()}
+        return manifest
+
+    def summary(self):
+        """a few lines saying what's in the plan and how big it is"""
+        run = self.columns["run"]
+        batch = self.columns["batch"]
+        nodes_key = self.backend.nodes_key
+        nuclei = sorted(set(run["nucleus"]))
+        frequencies = sorted(set(self.columns["mfdp"]["hbar_omega"]))
+        Nmaxes = self.columns["man"]["Nmax_max"]
+        lines = [
+            str(self.n_runs) + " runs on " + self.machine,
+            "nuclei: " + " ".join(nuclei),
+            "hbar_omega: " + " ".join(map(str, frequencies))]
+        if self.n_runs > 0:
+            lines.append("Nmax_max: " + str(min(Nmaxes)) + " to " +
+                         str(max(Nmaxes)))
+            # the biggest basis of each run is at its highest Nmax
+            dimension, Nmax, name = max(
+                (dims[-1][1], dims[-1][0], name) for dims, name
+                in zip(run["dimensions"], run["nucleus"]) if dims)
+            lines.append("largest basis: {:.3e} ({} at Nmax {})".format(
+                dimension, name, Nmax))
+        if nodes_key is not None:
+            node_hours = sum(
+                n * self.backend.parse_time(t) / 60
+                for n, t in zip(batch[nodes_key], batch["time"]))
+            lines.append("node-hours requested: {:.1f}".format(node_hours))
+        return "\n".join(lines)
+
+
+def write_chunk(manifest, indices, overwrite):
+    """makes the run directories for some of the runs, then writes all
+    their files in one go. Returns a list of error messages."""
+    _, ncsd_path, _ = manifest.paths
+    run_dirs = manifest.columns["run"]["run_dir"]
+    made = []
+    errors = []
+    for i in indices:
+        run_dir = run_dirs[i]
+        try:
+            if overwrite and exists(run_dir):
+                rmtree(run_dir)
+            mkdir(run_dir)
+            symlink(ncsd_path, join(run_dir, "ncsd-it.exe"))
+        except Exception as e:
+            errors.append(run_dir + ": " + repr(e))
+            continue
+        made.append(i)
+
+    n_errors = len(errors)
+    for group, renderer_name, filename in [
+            ("mfdp", "MFDP", "mfdp.dat"),
+            ("batch", manifest.backend.filetype, "batch_ncsd")]:
+        columns = {key: [column[i] for i in made]
+                   for key, column in manifest.columns[group].items()}
+        try:
+            renderers[renderer_name].write_many(
+                [join(run_dirs[i], filename) for i in made], columns)
+        except Exception as e:
+            errors.append(filename + " files: " + repr(e))
+    if manifest.backend.scratch is not None:
+        for i in made:
+            manifest.backend.write_staging(run_dirs[i])
+    if len(errors) == n_errors:
+        # only runs with all their files get stamped
+        for i in made:
+            man_params, mfdp_params, batch_params = manifest.params(i)
+            write_stamp(run_dirs[i], mfdp_params, batch_params,
+                        run_key(man_params))
+    return errors
+
+
+def generate_from_manifest(manifest, run=True, n_workers=1, job_array=False,
+                           max_running=0, task_farm=False, farm_slots=4,
+                           catalog_path=None):
+    """makes (and submits, if run=True) every run in a Manifest, or in the
+    manifest file with that name, without checking the input again
+
+    Directories that exist by now are only replaced if the plan was made
+    with existing_dir="overwrite", otherwise those runs fail.
+    The other options are the same as for ncsd_multi_run.
+    Returns the number of runs written.
+    """
+    if not isinstance(manifest, Manifest):
+        manifest = Manifest.load(manifest)
+    if job_array and task_farm:
+        raise ValueError("pick one of job_array and task_farm, not both")
+    print("writing " + str(manifest.n_runs) + " runs from the manifest")
+    machine = manifest.machine
+    _, _, working_dir = manifest.paths
+    overwrite = manifest.existing_dir == "overwrite"
+
+    # each thread gets every n_workers-th run
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        futures = [
+            pool.submit(write_chunk, manifest,
+                        range(start, manifest.n_runs, n_workers), overwrite)
+            for start in range(n_workers)]
+    errors = []
+    for future in futures:
+        errors += future.result()
+    if errors:
+        raise RuntimeError(
+            str(len(errors)) + " problems writing runs:\n" +
+            "\n".join(errors))
+
+    catalog = None if catalog_path is None else Catalog(catalog_path)
+    try:
+        if job_array:
+            submitter = JobArrays(machine, working_dir, run=run,
+                                  max_running=max_running, catalog=catalog)
+        elif task_farm:
+            submitter = TaskFarm(machine, working_dir, run=run,
+                                 slots=farm_slots, catalog=catalog)
+        else:
+            submitter = Submitter(machine, run=run, catalog=catalog)
+        if run:
+            print("running all batch files")
+        run_dirs = manifest.columns["run"]["run_dir"]
+        for i in range(manifest.n_runs):
+            man_params, mfdp_params, batch_params = manifest.params(i)
+            if catalog is not None:
+                catalog.add_run(run_dirs[i], man_params, mfdp_params,
+                                batch_params, machine)
+            submitter.add(join(run_dirs[i], "batch_ncsd"), batch_params)
+        submitter.finish()
+    finally:
+        if catalog is not None:
+            catalog.close()
+    print("done!")
+    return manifest.n_runs
@@ -0,0 +1,216 @@
+"""keeping an eye on submitted jobs, and feeding runs into the queue
+
+Cedar only lets each user have so many jobs queued, so a sweep bigger than
+that can't just be submitted all at once. A Monitor submits runs until
+queue_cap of the user's jobs are queued, then every poll_interval seconds
+asks the scheduler (one squeue / bjobs call for all of the user's jobs)
+what's still there, records the state of each of its runs (in the catalog,
+if there is one), and submits more runs as space frees up.
+
+    # write the runs with run=False and a catalog, then
+    monitor_runs("cedar", catalog_path="ncsd_runs.db", queue_cap=1000)
+
+The submit and status commands can be swapped out, e.g. for a stand-in
+scheduler to try it on a laptop (see benchmarks/fake_scheduler.py):
+
+    monitor_runs("cedar", batch_paths, poll_interval=1,
+                 submit_command=["python", "fake_scheduler.py", "submit"],
+                 status_command=["python", "fake_scheduler.py", "status"])
+
+The status command has to print one "job_id STATE" line per queued job.
+"""
+import asyncio
+from collections import deque
+from os.path import dirname, join
+from .catalog import Catalog
+from .backends import get_backend
+
+# jobs in these states take up a place in the queue
+queued_states = ["submitted", "running"]
+# times to try submitting a run before giving up on it
+max_tries = 3
+
+
+class Monitor(object):
+    """submits runs up to queue_cap queued jobs, and follows them
+
+    jobs is a dict of job ID --> [run directory, state], for every job this
+    monitor knows about (submitted by it, or found in the catalog).
+    """
+    def __init__(self, machine, queue_cap=1000, poll_interval=60,
+                 catalog=None, submit_command=None, status_command=None,
+                 submit_parallel=4):
+        self.backend = get_backend(machine)
+        if not self.backend.scheduler:
+            raise ValueError(machine + " runs jobs itself, there's no queue "
+                             "to feed")
+        self.machine = machine
+        self.queue_cap = queue_cap
+        self.poll_interval = poll_interval
+        self.catalog = catalog
+        self.submit_command = submit_command or \
+            self.backend.submit_command()
+        self.status_command = status_command or \
+            self.backend.status_command()
+        self.submit_parallel = submit_parallel
+        self.jobs = {}
+        self.n_queued = 0
+        self.tries = {}  # batch path --> failed submissions
+        self.not_submitted = []
+        if catalog is not None:
+            # pick up where an earlier monitor (or ncsd_multi) left off
+            for row in catalog.find(state=queued_states):
+                if row["job_id"] is not None:
+                    self.jobs[row["job_id"]] = [row["run_dir"], row["state"]]
+
+    async def command(self, command):
+        """runs a command, returns what it printed, RuntimeError if it fails"""
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT)
+        except OSError as e:
+            raise RuntimeError(command[0] + " couldn't be run: " + repr(e))
+        output, _ = await process.communicate()
+        output = output.decode(errors="replace")
+        if process.returncode != 0:
+            raise RuntimeError(" ".join(command) + " failed:\n" + output)
+        return output
+
+    def set_state(self, job_id, state):
+        run_dir, old_state = self.jobs[job_id]
+        if state != old_state:
+            self.jobs[job_id][1] = state
+            if self.catalog is not None:
+                self.catalog.set_state(run_dir, state)
+
+    async def submit(self, batch_path):
+        """submits one run, returns its job ID"""
+        output = await self.command(self.submit_command + [batch_path])
+        match = self.backend.job_id_pattern.search(output)
+        if match is None:
+            raise RuntimeError("no job ID in what " + self.submit_command[0]
+                               + " said:\n" + output)
+        job_id = match.group(1)
+        run_dir = dirname(batch_path)
+        self.jobs[job_id] = [run_dir, "submitted"]
+        self.n_queued += 1
+        if self.catalog is not None:
+            self.catalog.set_job(run_dir, job_id)
+        return job_id
+
+    async def poll(self):
+        """asks the scheduler about all the user's jobs at once, updates the
+        state of ours, and returns how many of the user's jobs are queued
+
+        Jobs of ours the scheduler doesn't list anymore have left the queue,
+        and are recorded as left_queue (squeue forgets jobs once they're
+        done, so whether they worked is for restarts.py to find out).
+        """
+        listed = self.backend.parse_status(
+            await self.command(self.status_command))
+        self.n_queued = sum(state in queued_states
+                            for state in listed.values())
+        for job_id, (_, state) in list(self.jobs.items()):
+            if state not in queued_states:
+                continue
+            self.set_state(job_id, listed.get(job_id, "left_queue"))
+        if self.catalog is not None:
+            self.catalog.commit()
+        return self.n_queued
+
+    def active(self):
+        """how many of our jobs are still queued"""
+        return sum(state in queued_states for _, state in self.jobs.values())
+
+    async def fill(self, waiting):
+        """submits runs from the waiting deque until the queue is full,
+        submit_parallel at a time. Runs that couldn't be submitted go back
+        on the front of the deque, to try again after the next poll (up to
+        max_tries times)."""
+        batch = []
+        while waiting and len(batch) < self.queue_cap - self.n_queued:
+            batch.append(waiting.popleft())
+        for start in range(0, len(batch), self.submit_parallel):
+            chunk = batch[start:start+self.submit_parallel]
+            results = await asyncio.gather(
+                *[self.submit(batch_path) for batch_path in chunk],
+                return_exceptions=True)
+            failed = []
+            for batch_path, result in zip(chunk, results):
+                if not isinstance(result, Exception):
+                    continue
+                print("couldn't submit " + batch_path + ": " + str(result))
+                self.tries[batch_path] = self.tries.get(batch_path, 0) + 1
+                if self.tries[batch_path] < max_tries:
+                    failed.append(batch_path)
+                else:
+                    print("giving up on " + batch_path)
+                    self.not_submitted.append(batch_path)
+            if failed:
+                # e.g. the queue is fuller than we thought, wait a poll
+                waiting.extendleft(reversed(failed + batch[start+len(chunk):]))
+                break
+
+    async def feed(self, batch_paths):
+        """submits all of batch_paths as the queue allows, and keeps polling
+        until every job has left the queue. Returns {state: number of jobs}"""
+        waiting = deque(batch_paths)
+        print(str(len(waiting)) + " runs to submit, at most " +
+              str(self.queue_cap) + " queued at once")
+        while True:
+            try:
+                await self.poll()
+            except RuntimeError as e:
+                # squeue / bjobs fail now and then, try again next time
+                # (without submitting, we don't know how full the queue is)
+                print("couldn't check the queue: " + str(e))
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self.fill(waiting)
+            counts = self.counts()
+            print(", ".join(state + ": " + str(counts.get(state, 0))
+                            for state in queued_states + ["left_queue",
+                                                          "finished",
+                                                          "failed"]) +
+                  ", waiting: " + str(len(waiting)))
+            if not waiting and self.active() == 0:
+                if self.not_submitted:
+                    print(str(len(self.not_submitted)) +
+                          " runs couldn't be submitted:\n" +
+                          "\n".join(self.not_submitted))
+                return counts
+            await asyncio.sleep(self.poll_interval)
+
+    def counts(self):
+        counts = {}
+        for _, state in self.jobs.values():
+            counts[state] = counts.get(state, 0) + 1
+        return counts
+
+
+def monitor_runs(machine, batch_paths=None, catalog_path=None,
+                 queue_cap=1000, poll_interval=60, submit_command=None,
+                 status_command=None):
+    """submits and follows runs until they've all left the queue
+
+    batch_paths are the batch files to submit, if None, every run in the
+    catalog that's been written but not submitted is (in the order they were
+    made). Jobs the catalog says are queued are followed too.
+    Returns {state: number of jobs}.
+    """
+    catalog = None if catalog_path is None else Catalog(catalog_path)
+    try:
+        if batch_paths is None:
+            if catalog is None:
+                raise ValueError("give batch_paths or a catalog_path")
+            batch_paths = [join(row["run_dir"], "batch_ncsd")
+                           for row in catalog.find(state="generated")]
+        monitor = Monitor(
+            machine, queue_cap=queue_cap, poll_interval=poll_interval,
+            catalog=catalog, submit_command=submit_command,
+            status_command=status_command)
+        return asyncio.run(monitor.feed(batch_paths))
+    finally:
+        if catalog is not None:
+            catalog.close()
@@ -3,158 +3,857 @@ the module that calls everything once we have the input. This just makes the
 ncsd_multi.py file look cleaner.
 """
 # built-in modules
-from os import system, chdir, mkdir, symlink
-from os.path import realpath, join, exists, relpath
+from os import mkdir, symlink, rename, readlink, scandir, remove
+from os.path import realpath, join, exists, relpath, islink
 from shutil import rmtree
+from tempfile import mkdtemp
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Thread
 
 # our modules
-from .data_structures import ManParams
 from .parameter_calculations import calc_params, nucleus
-from .data_checker import manual_input_check
-from .file_manager import MFDP, CedarBatch, SummitBatch, Defaults
+from .data_structures import DefaultPolicyObj
+from .data_checker import manual_input_check, check_policy, \
+    without_prompts
+from .file_manager import MFDP, Defaults
+from .sweep import make_sweep
+from .submitters import Submitter, JobArrays, TaskFarm, ChainSubmitter
+from .catalog import Catalog, write_stamp, read_stamps, run_hash, \
+    run_key, stamp_filename
+from .manifest import Manifest
+from .resource_model import SizedRuns
+from .backends import get_backend
+from .renderer import renderers
 
 
-def prepare_input(m_params):  # m_params for manual params
-    print("preparing input to be written to files")
-    m_dict = m_params.param_dict()
-    # make one set of inputs for each run
+def prepare_input(m_params, sweep=None):  # m_params for manual params
+    """returns a Sweep, which gives one ManParams per run when iterated over
 
-    # make all parameters into lists
-    for key, value in m_dict.items():
-        if type(value) != list:
-            m_dict[key] = [value]
+    Parameters given as lists are stepped through together, with shorter
+    lists extended by duplicates of their last element.
+    For example, if there are 4 runs and I've specified some parameter as...
+        1 --> [1,1,1,1]
+        [1,2] --> [1,2,2,2]
 
-    #  now length of longest list = number of unique runs
-    num_runs = len(max(list(m_dict.values()), key=len))
+    This may be counterintuitive if you wanted [1,2] --> [1,1,2,2],
+    in which case you want a sweep, e.g. Product(Zip(...), hbar_omega=[...]),
+    see sweep.py. Those runs are combined with the list runs as a product.
 
+    Nothing is expanded here, runs are made one at a time when needed.
     """
-        Now for all other parameters make a list of length num_runs with
-        duplicates of the last element if there aren't enough.
+    print("preparing input to be written to files")
+    return make_sweep(m_params, sweep)
 
-        For example, if num_runs is 4 and I've specified some parameter as...
-        1 --> [1,1,1,1]
-        [1,2] --> [1,2,2,2]
 
-        This may be counterintuitive if you wanted [1,2] --> [1,1,2,2]
+def choose_run_dir(run_name, working_dir, claimed, existing="prompt",
+                   remove_existing=True):
+    """picks the directory for a run, deciding what to do if it's taken
+
+    claimed holds the run directories already handed out in this set of
+    runs, since those might not exist on disk yet when writing in parallel.
+    It's a dict of run directory --> next number to try for Li8_2, Li8_3...
+    so numbering a long frequency scan of one nucleus doesn't start from 2
+    every time.
+
+    existing is the existing_dir policy (see PolicyParams): "prompt" asks
+    the user. Otherwise, runs in this set that want the same directory get
+    numbered (Li8, Li8_2, Li8_3, ...), and if that directory is already on
+    disk, "overwrite" deletes it, "skip" returns None (so the run isn't
+    made), "fail" raises and "suffix" moves on to the next free number.
+    remove_existing=False leaves directories to be overwritten where they
+    are, for stage_runs to replace when it publishes.
     """
+    run_dir = realpath(join(working_dir, run_name))
+    if existing != "prompt":
+        first_dir = run_dir
+        number = claimed.get(first_dir, 2)
+        while run_dir in claimed or (existing == "suffix" and exists(run_dir)):
+            run_dir = realpath(join(working_dir, run_name+"_"+str(number)))
+            number += 1
+        if first_dir in claimed:
+            claimed[first_dir] = number
+        claimed[run_dir] = 2
+        if exists(run_dir):
+            if existing == "skip":
+                print("Run directory "+run_dir+" already exists, skipping it")
+                return None
+            if existing == "fail":
+                raise IOError("Run directory "+run_dir+" already exists")
+            if remove_existing:
+                rmtree(run_dir)  # overwrite
+        return run_dir
 
-    for key, value in m_dict.items():
-        if len(value) != num_runs:  # it's also guaranteed < num_runs
-            # append the last element until it's the right length
-            for i in range(len(value), num_runs):
-                m_dict[key].append(value[-1])
+    # ensure we don't overwrite
+    while run_dir in claimed:
+        new_name = input(
+            "Run '"+run_name+"' is already used by another run. \n"
+            "Enter new name: ")
+        if new_name:
+            run_name = new_name
+            run_dir = realpath(join(working_dir, run_name))
+    if exists(run_dir):
+        new_name = input(
+            "Run '"+run_name+"' already exists. \n"
+            "Enter new name, or hit enter to overwrite: ")
+        if new_name:
+            # the new name might be taken too, so check it the same way
+            return choose_run_dir(new_name, working_dir, claimed,
+                                  remove_existing=remove_existing)
+        #  remove it and start from scratch
+        if remove_existing:
+            rmtree(run_dir)
+    claimed[run_dir] = 2
+    return run_dir
 
-    # now make one dict for each mfdp file:
-    dict_list = []
-    for i in range(num_runs):
-        new_dict = {}
-        for key, value in m_dict.items():
-            new_dict[key] = value[i]
-        dict_list.append(new_dict)
-    return dict_list
 
+def calc_run(defaults, man_params, run_dir, machine, paths):
+    """works out everything that gets written for one run, without writing
 
-def create_dirs(defaults, dict_list, paths, machine):
-    print("creating directories to store run files")
+    returns [mfdp_params, batch_params] with paths relative to run_dir,
+    ready to be written by write_run
+    """
+    # now actually calculate the parameters to write out
+    [mfdp_params, batch_params] = calc_params(
+        run_dir, paths, man_params, defaults.params, machine)
 
-    # the creation of this function was mostly to get intellisense to chill
-    def populate_dir(defaults, man_params, paths, machine):
-        """
-            Each folder will need:
-            - mfdp.dat
-            - batch_ncsd
-            we'll create these from defaults + manual input
-        """
-        _, ncsd_path, working_dir = paths
+    # convert interaction files to relative paths
+    mfdp_params = mfdp_params.replace(
+        two_body_interaction=relpath(
+            mfdp_params.two_body_interaction, run_dir),
+        three_body_interaction=relpath(
+            mfdp_params.three_body_interaction, run_dir))
 
-        chdir(working_dir)
+    # the batch files run the ncsd-it.exe link in the run directory (not
+    # where it points, which realpath gave once the link was there, so a
+    # run worked out again, e.g. for a restart, came out different)
+    ncsd_path = "./ncsd-it.exe"
+    # (or the script that runs it from node-local disk, see backends.py)
+    batch_params = batch_params.replace(
+        ncsd_path=get_backend(machine).ncsd_command(ncsd_path))
+    return [mfdp_params, batch_params]
 
+
+def write_run(run_dir, mfdp_params, batch_params, machine, paths, key=None,
+              in_place=False):
+    """makes run_dir and writes the files from calc_run into it
+
+    Only absolute paths are used here (no chdir), so this is safe to call
+    from several threads at once. key is the run_key for the stamp.
+    in_place=True writes the files into a run_dir that's already there,
+    leaving everything else in it (the results) alone.
+    """
+    _, ncsd_path, _ = paths
+    exe_path = join(run_dir, "ncsd-it.exe")
+
+    if in_place:
+        print("rewriting the input files in "+run_dir)
+        # the old stamp goes first, so a half rewritten run doesn't look
+        # finished either
+        remove_if_there(join(run_dir, stamp_filename))
+        if not islink(exe_path) or readlink(exe_path) != ncsd_path:
+            remove_if_there(exe_path)
+            symlink(ncsd_path, exe_path)
+    else:
         # make a directory for run
-        run_name = nucleus(man_params.Z, man_params.N)
-        run_dir = realpath(join(working_dir, run_name))
-        # ensure we don't overwrite
-        if exists(run_dir):
-            new_name = input(
-                "Run '"+run_name+"' already exists. \n"
-                "Enter new name, or hit enter to overwrite: ")
-            if new_name:
-                run_dir = realpath(join(working_dir, new_name))
-            else:
-                #  remove it and start from scratch
-                rmtree(run_dir)
         print("making run directory "+run_dir)
         mkdir(run_dir)
-
-        # now actually calculate the parameters to write out
-        [mfdp_params, batch_params] = calc_params(
-            run_dir, paths, man_params, defaults.params, machine)
-
-        # be sure that all the batch files actually know where their exe is
-        batch_params.ncsd_path = realpath(join(run_dir, "ncsd-it.exe"))
-        
         print("writing files")
         # copy ncsd-it.exe
-        symlink(ncsd_path, batch_params.ncsd_path)
-
-        # convert interaction files to relative paths too
-        mfdp_params.two_body_interaction = relpath(
-            mfdp_params.two_body_interaction, run_dir)
-        mfdp_params.three_body_interaction = relpath(
-            mfdp_params.three_body_interaction, run_dir)
-
-        # write mfdp.dat file
-        mfdp_path = realpath(join(run_dir, "mfdp.dat"))
-        MFDP(filename=mfdp_path, params=mfdp_params).write()
-
-        # before writing bacth file, convert ncsd_path to relative path
-        batch_params.ncsd_path = relpath(batch_params.ncsd_path, run_dir)
-        # ensure ncsd path has a ./ if needed
-        if "/" not in batch_params.ncsd_path:
-            batch_params.ncsd_path = "./" + batch_params.ncsd_path
-
-        # write batch file
-        batch_path = realpath(join(run_dir, "batch_ncsd"))
-        if machine == "cedar":
-            CedarBatch(filename=batch_path, params=batch_params).write()
-        elif machine == "summit":
-            SummitBatch(filename=batch_path, params=batch_params).write()
-
-        # then tell the program where it is so we can run it later
-        return batch_path
-
-    # for each set of inputs
+        symlink(ncsd_path, exe_path)
+
+    # write mfdp.dat file
+    mfdp_path = realpath(join(run_dir, "mfdp.dat"))
+    MFDP(filename=mfdp_path, params=mfdp_params).write()
+
+    # write batch file
+    batch_path = realpath(join(run_dir, "batch_ncsd"))
+    get_backend(machine).write_batch(batch_path, batch_params)
+
+    # last, so a run that was only half written doesn't look finished
+    write_stamp(run_dir, mfdp_params, batch_params, key)
+
+    # then tell the program where it is so we can run it later
+    return batch_path
+
+
+def remove_if_there(path):
+    """deletes a file (or link), if there is one"""
+    try:
+        remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def populate_dir(defaults, man_params, run_dir, paths, machine):
+    """
+        Each folder will need:
+        - mfdp.dat
+        - batch_ncsd
+        we'll create these from defaults + manual input
+    """
+    [mfdp_params, batch_params] = calc_run(
+        defaults, man_params, run_dir, machine, paths)
+    return write_run(run_dir, mfdp_params, batch_params, machine, paths,
+                     key=run_key(man_params))
+
+
+def create_dirs(defaults, run_list, paths, machine, n_workers=1,
+                policy=DefaultPolicyObj, catalog=None):
+    """creates one directory per run, returns the batch paths in run order
+
+    Run directories are picked one at a time (that part may ask questions,
+    depending on policy.existing_dir, skipped runs aren't in the output),
+    then n_workers threads make the directories and write the files.
+    If some runs fail, the others are still written, and all the errors
+    are reported together at the end. Written runs go in catalog, if given.
+    """
+    print("creating directories to store run files")
+    _, _, working_dir = paths
+
+    # for each set of inputs, decide where it goes
+    runs = []
+    claimed = {}
+    for man_params in run_list:
+        run_name = nucleus(man_params.Z, man_params.N)
+        run_dir = choose_run_dir(
+            run_name, working_dir, claimed, policy.existing_dir)
+        if run_dir is not None:
+            runs.append((man_params, run_dir))
+
+    def make_run(man_params, run_dir):
+        [mfdp_params, batch_params] = calc_run(
+            defaults, man_params, run_dir, machine, paths)
+        batch_path = write_run(
+            run_dir, mfdp_params, batch_params, machine, paths,
+            key=run_key(man_params))
+        return batch_path, mfdp_params, batch_params
+
+    # then do all the slow filesystem work in parallel
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(make_run, man_params, run_dir)
+                   for man_params, run_dir in runs]
+
+    # collect results in the same order the runs were given
     batch_paths = []
-    for man_params_dict in dict_list:
-        man_params = ManParams(**man_params_dict)
-        batch_paths.append(
-            populate_dir(defaults, man_params, paths, machine)
-        )
+    errors = []
+    for (man_params, run_dir), future in zip(runs, futures):
+        try:
+            batch_path, mfdp_params, batch_params = future.result()
+        except Exception as e:
+            errors.append(run_dir + ": " + repr(e))
+            continue
+        batch_paths.append(batch_path)
+        if catalog is not None:
+            catalog.add_run(
+                run_dir, man_params, mfdp_params, batch_params, machine)
+    if errors:
+        raise RuntimeError(
+            str(len(errors)) + " of " + str(len(runs)) +
+            " runs could not be created:\n" + "\n".join(errors))
+
     # return list of paths to be run
     return batch_paths
 
 
-def ncsd_multi_run(man_params, paths, machine, run=True):
-    """run ncsd multiple times with given parameters"""
+def scan_runs(working_dir):
+    """what update_runs needs to know about the runs in working_dir:
+    ({run_key: run_dir}, {run_dir: run_hash}, [run dirs without a run_key])
+
+    Each run directory's stamp is read once. Runs without a run_key were
+    made before there were keys (or stamps), if they have an mfdp.dat.
+    """
+    by_key = {}
+    hashes = {}
+    unkeyed = []
+    with scandir(working_dir) as entries:
+        for entry in entries:
+            # hidden ones are stage_runs' staging directories
+            if not entry.is_dir() or entry.name.startswith("."):
+                continue
+            stamp, key = read_stamps(entry.path)
+            if stamp is not None:
+                hashes[entry.path] = stamp
+            if key is not None:
+                by_key[key] = entry.path
+            elif exists(join(entry.path, "mfdp.dat")):
+                unkeyed.append(entry.path)
+    return by_key, hashes, sorted(unkeyed)
+
+
+def read_text(path):
+    """what's in a file, or None if it can't be read"""
+    try:
+        with open(path) as open_file:
+            return open_file.read()
+    except OSError:
+        return None
+
+
+def changed_run_action(run_dir, existing):
+    """what update_runs does with a run whose inputs changed, following the
+    existing_dir policy: "rewrite" (its input files, its results are kept),
+    "skip", "suffix" (write it into a new directory) or "fail"
+    """
+    if existing == "overwrite":
+        return "rewrite"
+    if existing != "prompt":
+        return existing
+    answer = ""
+    while answer not in ["y", "n"]:
+        answer = input(
+            "The inputs of run " + run_dir + " changed. Rewrite its input "
+            "files (its results are kept)? (y/n): ")
+    return "rewrite" if answer == "y" else "skip"
+
+
+def update_runs(defaults, run_list, paths, machine, n_workers=1,
+                policy=DefaultPolicyObj, catalog=None):
+    """like create_dirs, but only (re)writes the runs that changed, like make
+
+    Each run is found by its run_key (see catalog.py), which is kept in the
+    stamp of its directory, so it's the same directory whatever else is in
+    the sweep and whatever it's called. Runs made before there were keys
+    are found by their mfdp.dat (if it's what would be written now), and
+    get the key. Then each run is compared with what would be written:
+
+        added       there's no directory for it, one is made (Li8, Li8_2,
+                    ... whichever is free)
+        unchanged   the hash in its stamp is the same (and so is its
+                    ncsd-it.exe), so it's left alone (not resubmitted, and
+                    its catalog row is left as it is)
+        changed     something else, e.g. its walltime or the templates
+
+    Nothing is ever deleted. What happens to a changed run follows
+    policy.existing_dir: "overwrite" rewrites only its input files
+    (mfdp.dat, batch_ncsd, the link and the stamp), so its results stay,
+    "suffix" writes it into a new directory and leaves the old one as it
+    is, "skip" leaves it alone, "fail" raises before anything is written,
+    and "prompt" asks (y = overwrite, n = skip).
+    Restarts (see restarts.py) don't change the stamp, so a restarted run
+    still counts as unchanged. Directories in working_dir with a stamp that
+    no run in this sweep wants are orphans: they're reported, not deleted.
+
+    Returns ([(batch_path, batch_params)] for the runs written, in order,
+    {"added" / "changed" / "unchanged" / "skipped" / "orphaned": list of
+    run dirs}).
+    """
+    print("checking which runs changed")
+    _, ncsd_path, working_dir = paths
+    working_dir = realpath(working_dir)
+    by_key, hashes, unkeyed = scan_runs(working_dir)
+    # what would be written into mfdp.dat doesn't depend on which directory
+    # in working_dir it's in, so runs without a key are looked up by it
+    by_mfdp = {}
+    for run_dir in unkeyed:
+        by_mfdp.setdefault(read_text(join(run_dir, "mfdp.dat")), run_dir)
+    backend = get_backend(machine)
+
+    # decide what happens to each run (this may ask questions)
+    runs = []  # (man_params, key, run_dir, status, action, params)
+    claimed = {}
+    used = set()
+    for man_params in run_list:
+        key = run_key(man_params)
+        run_name = nucleus(man_params.Z, man_params.N)
+        status = None
+        run_dir = by_key.get(key)
+        if run_dir in used:
+            run_dir = None  # the same run twice, the second one is new
+        adopted = False
+        if run_dir is None and by_mfdp:
+            [mfdp_params, _] = calc_run(defaults, man_params,
+                                        join(working_dir, run_name),
+                                        machine, paths)
+            run_dir = by_mfdp.pop(
+                renderers["MFDP"].render_params(mfdp_params), None)
+            adopted = run_dir is not None
+        if run_dir is None:
+            run_dir = choose_run_dir(run_name, working_dir, claimed,
+                                     "suffix", remove_existing=False)
+            status = "added"
+        used.add(run_dir)
+        params = calc_run(defaults, man_params, run_dir, machine, paths)
+        if status is None:
+            exe_path = join(run_dir, "ncsd-it.exe")
+            same_exe = islink(exe_path) and readlink(exe_path) == ncsd_path
+            if adopted:
+                same = read_text(join(run_dir, "batch_ncsd")) == \
+                    renderers[backend.filetype].render_params(params[1])
+            else:
+                same = hashes.get(run_dir) == run_hash(*params)
+            status = "unchanged" if same and same_exe else "changed"
+        action = "adopt" if adopted else "none"
+        if status == "added":
+            action = "write"
+        elif status == "changed":
+            action = changed_run_action(run_dir, policy.existing_dir)
+            if action == "skip":
+                status = "skipped"
+            elif action == "suffix":
+                old_dir = run_dir
+                run_dir = choose_run_dir(run_name, working_dir, claimed,
+                                         "suffix", remove_existing=False)
+                params = calc_run(defaults, man_params, run_dir, machine,
+                                  paths)
+                action = ("suffix", old_dir)
+        runs.append((man_params, key, run_dir, status, action, params))
+
+    failed = [run_dir for _, _, run_dir, _, action, _ in runs
+              if action == "fail"]
+    if failed:
+        raise IOError(str(len(failed)) + " runs changed, and existing_dir "
+                      "is fail:\n" + "\n".join(failed))
+
+    def update_run(key, run_dir, action, params):
+        mfdp_params, batch_params = params
+        if action in ["none", "skip"]:
+            return
+        if action == "adopt":
+            # it's what would be written, so it only needs the stamp
+            write_stamp(run_dir, mfdp_params, batch_params, key)
+        elif action == "rewrite":
+            write_run(run_dir, mfdp_params, batch_params, machine, paths,
+                      key=key, in_place=True)
+        else:
+            write_run(run_dir, mfdp_params, batch_params, machine, paths,
+                      key=key)
+            if action != "write":
+                # the old directory isn't this run anymore
+                with open(join(action[1], stamp_filename), "w") as \
+                        open_file:
+                    open_file.write(hashes.get(action[1], "") + "\n")
+
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        futures = [pool.submit(update_run, key, run_dir, action, params)
+                   for _, key, run_dir, _, action, params in runs]
+
+    report = {"added": [], "changed": [], "unchanged": [], "skipped": [],
+              "orphaned": []}
+    written = []
+    errors = []
+    for (man_params, _, run_dir, status, _, params), future in \
+            zip(runs, futures):
+        try:
+            future.result()
+        except Exception as e:
+            errors.append(run_dir + ": " + repr(e))
+            continue
+        report[status].append(run_dir)
+        if status not in ["added", "changed"]:
+            continue
+        mfdp_params, batch_params = params
+        written.append((join(run_dir, "batch_ncsd"), batch_params))
+        if catalog is not None:
+            catalog.add_run(
+                run_dir, man_params, mfdp_params, batch_params, machine)
+    if errors:
+        raise RuntimeError(
+            str(len(errors)) + " of " + str(len(runs)) +
+            " runs could not be updated:\n" + "\n".join(errors))
+
+    report["orphaned"] = sorted(run_dir for run_dir in hashes
+                                if run_dir not in used)
+    print(", ".join(status + ": " + str(len(run_dirs))
+                    for status, run_dirs in report.items()))
+    if report["orphaned"]:
+        print("runs no longer in the sweep (left where they are):\n" +
+              "\n".join(report["orphaned"]))
+    return written, report
+
+
+def stage_runs(defaults, run_list, paths, machine, n_workers=1,
+               policy=DefaultPolicyObj, catalog=None):
+    """like create_dirs, but all or nothing
+
+    Every run is written into a staging directory inside working_dir first
+    (so nothing half-written ever shows up next to the real runs), and only
+    if they all worked are they moved into place, one rename each. If any
+    run fails, or a rename does, nothing is left in working_dir and any
+    runs being overwritten are put back.
+
+    That's all it's for: the runs are written on the same filesystem as
+    working_dir, so it's as much metadata work as create_dirs (plus the
+    renames), not less.
+
+    Returns [(batch_path, batch_params)] for the published runs, in order.
+    Written runs go in catalog, if given, once they're published.
+    """
+    print("writing runs into a staging directory")
+    _, _, working_dir = paths
+
+    # for each set of inputs, decide where it goes, but don't delete
+    # anything yet, that happens when the new runs are published
+    runs = []
+    claimed = {}
+    for man_params in run_list:
+        run_name = nucleus(man_params.Z, man_params.N)
+        run_dir = choose_run_dir(run_name, working_dir, claimed,
+                                 policy.existing_dir, remove_existing=False)
+        if run_dir is not None:
+            runs.append((man_params, run_dir))
+
+    staging_dir = mkdtemp(prefix=".ncsd_staging_", dir=working_dir)
+    try:
+        def make_run(number, man_params, run_dir):
+            # the files point at run_dir, they just get written elsewhere
+            [mfdp_params, batch_params] = calc_run(
+                defaults, man_params, run_dir, machine, paths)
+            write_run(join(staging_dir, str(number)), mfdp_params,
+                      batch_params, machine, paths, key=run_key(man_params))
+            return mfdp_params, batch_params
+
+        with ThreadPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(make_run, number, man_params, run_dir)
+                       for number, (man_params, run_dir) in enumerate(runs)]
+
+        results = []
+        errors = []
+        for (_, run_dir), future in zip(runs, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(run_dir + ": " + repr(e))
+        if errors:
+            raise RuntimeError(
+                str(len(errors)) + " of " + str(len(runs)) +
+                " runs could not be created, so none were:\n" +
+                "\n".join(errors))
+
+        print("moving " + str(len(runs)) + " runs into " + working_dir)
+        publish(staging_dir, [run_dir for _, run_dir in runs])
+    finally:
+        rmtree(staging_dir, ignore_errors=True)
+
+    written = []
+    for (man_params, run_dir), (mfdp_params, batch_params) in \
+            zip(runs, results):
+        if catalog is not None:
+            catalog.add_run(
+                run_dir, man_params, mfdp_params, batch_params, machine)
+        written.append((join(run_dir, "batch_ncsd"), batch_params))
+    return written
+
+
+def publish(staging_dir, run_dirs):
+    """renames staging_dir/0, staging_dir/1... to run_dirs[0], run_dirs[1]...
+
+    Runs being overwritten are moved into staging_dir/replaced (and deleted
+    along with it). If anything goes wrong, it's all undone.
+    """
+    replaced_dir = join(staging_dir, "replaced")
+    mkdir(replaced_dir)
+    done = []  # (staged, run_dir, where the old run_dir went, or None)
+    try:
+        for number, run_dir in enumerate(run_dirs):
+            staged = join(staging_dir, str(number))
+            try:
+                rename(staged, run_dir)
+                done.append((staged, run_dir, None))
+            except OSError:
+                # something's there, and we've been told to overwrite it
+                old = join(replaced_dir, str(number))
+                rename(run_dir, old)
+                try:
+                    rename(staged, run_dir)
+                except OSError:
+                    rename(old, run_dir)
+                    raise
+                done.append((staged, run_dir, old))
+    except Exception:
+        for staged, run_dir, old in reversed(done):
+            rename(run_dir, staged)
+            if old is not None:
+                rename(old, run_dir)
+        raise
+
+
+def plan_runs(defaults, run_list, paths, machine, policy=DefaultPolicyObj):
+    """works out every run in run_list without writing anything
+
+    Run directories are picked like create_dirs does (so skipped runs
+    aren't in the plan), except nothing on disk is deleted.
+    Returns a Manifest.
+    """
+    print("planning runs")
+    _, _, working_dir = paths
+    manifest = Manifest(machine, paths, policy.existing_dir)
+    claimed = {}
+    for man_params in run_list:
+        run_name = nucleus(man_params.Z, man_params.N)
+        run_dir = choose_run_dir(run_name, working_dir, claimed,
+                                 policy.existing_dir, remove_existing=False)
+        if run_dir is None:
+            continue
+        [mfdp_params, batch_params] = calc_run(
+            defaults, man_params, run_dir, machine, paths)
+        manifest.add(man_params, run_dir, mfdp_params, batch_params)
+    return manifest
+
+
+def stream_runs(defaults, run_list, paths, machine, submitter, n_workers=1,
+                queue_size=16, policy=DefaultPolicyObj, catalog=None):
+    """like create_dirs followed by submitting, but as a pipeline
+
+    plan -> calc_params -> write -> submit, each stage has its own thread(s)
+    and they're connected by queues holding at most queue_size runs, so the
+    first jobs get submitted while later runs are still being planned.
+    Memory use doesn't grow with the number of runs, apart from the list of
+    run directory names used to catch two runs wanting the same directory.
+
+    submitter decides what happens to each written run (see submitters.py),
+    its finish() is called once everything is written without errors, and
+    its close() whatever happens.
+    Written runs go in catalog (if given) just before they're submitted.
+    Errors are collected and reported together at the end, like create_dirs.
+    Returns the number of runs written.
+    """
+    print("creating and submitting runs as we go")
+    _, _, working_dir = paths
+    planned = Queue(maxsize=queue_size)
+    calculated = Queue(maxsize=queue_size)
+    written = Queue(maxsize=queue_size)
+    done = object()  # tells the next stage there's nothing more coming
+    errors = []
+    # anything that isn't an Exception (e.g. sys.exit from a question about
+    # a run directory) stops everything: every stage then only passes done
+    # along, so no thread is left waiting on a queue, and it's raised again
+    stopped = []
+
+    def failed(where, e):
+        if isinstance(e, Exception):
+            errors.append(where + ": " + repr(e))
+        else:
+            stopped.append(e)
+
+    def plan():
+        try:
+            for man_params in run_list:
+                if stopped:
+                    break
+                planned.put(man_params)
+        except BaseException as e:
+            failed("planning", e)
+        finally:
+            planned.put(done)
+
+    def calc():
+        # one thread only, since picking directories might ask questions
+        claimed = {}
+        try:
+            while True:
+                man_params = planned.get()
+                if man_params is done:
+                    break
+                if stopped:
+                    continue
+                where = "Z=" + str(man_params.Z) + ", N=" + str(man_params.N)
+                try:
+                    run_dir = choose_run_dir(
+                        nucleus(man_params.Z, man_params.N), working_dir,
+                        claimed, policy.existing_dir)
+                    if run_dir is None:
+                        continue
+                    where = run_dir
+                    [mfdp_params, batch_params] = calc_run(
+                        defaults, man_params, run_dir, machine, paths)
+                    calculated.put(
+                        (man_params, run_dir, mfdp_params, batch_params))
+                except BaseException as e:
+                    failed(where, e)
+        finally:
+            for _ in range(n_workers):
+                calculated.put(done)
+
+    def write():
+        try:
+            while True:
+                item = calculated.get()
+                if item is done:
+                    break
+                if stopped:
+                    continue
+                man_params, run_dir, mfdp_params, batch_params = item
+                try:
+                    batch_path = write_run(
+                        run_dir, mfdp_params, batch_params, machine, paths,
+                        key=run_key(man_params))
+                    written.put((man_params, run_dir, mfdp_params,
+                                 batch_params, batch_path))
+                except BaseException as e:
+                    failed(run_dir, e)
+        finally:
+            written.put(done)
+
+    threads = [Thread(target=plan), Thread(target=calc)]
+    threads += [Thread(target=write) for _ in range(n_workers)]
+    for thread in threads:
+        thread.start()
+
+    # submit from this thread, as runs come out of the write stage
+    n_written = 0
+    writers_left = n_workers
+    try:
+        while writers_left > 0:
+            item = written.get()
+            if item is done:
+                writers_left -= 1
+                continue
+            if stopped:
+                continue
+            man_params, run_dir, mfdp_params, batch_params, batch_path = item
+            n_written += 1
+            try:
+                if catalog is not None:
+                    catalog.add_run(run_dir, man_params, mfdp_params,
+                                    batch_params, machine)
+                submitter.add(batch_path, batch_params)
+            except BaseException as e:
+                failed(batch_path, e)
+
+        for thread in threads:
+            thread.join()
+        if stopped:
+            raise stopped[0]
+        if errors:
+            raise RuntimeError(
+                str(len(errors)) + " runs had problems:\n" +
+                "\n".join(errors))
+        submitter.finish()
+    finally:
+        submitter.close()
+    return n_written
+
+
+def ncsd_multi_run(man_params, paths, machine, run=True, n_workers=1,
+                   sweep=None, stream=False, queue_size=16, job_array=False,
+                   max_running=0, task_farm=False, farm_slots=4,
+                   policy=DefaultPolicyObj, catalog_path=None, staged=False,
+                   plan_path=None, sizing=None, chain=None,
+                   incremental=False, full_int_check=False):
+    """run ncsd multiple times with given parameters
+
+    n_workers is the number of threads used to write run directories,
+    sweep is an optional Product / Zip of parameters (see sweep.py),
+    stream=True submits runs as soon as they're written (see stream_runs),
+    job_array=True submits all runs as one job array (see submitters.py),
+    with at most max_running of them running at once (0 = no limit),
+    task_farm=True packs runs into one job, farm_slots at a time,
+    policy (a PolicyParams) says what to do instead of asking questions,
+    catalog_path is an SQLite file to record the runs in (see catalog.py),
+    staged=True writes all runs somewhere else first, and only puts them in
+    working_dir if every one of them worked (see stage_runs),
+    plan_path: if given, nothing is written except a manifest of the runs
+    in that file, to be made later with generate_from_manifest (nothing is
+    asked either, "prompt" policies count as "fail"),
+    sizing is a ResourceModel (see resource_model.py) that picks time, mem
+    and n_nodes for each run from past runs, instead of the ones given,
+    chain=True splits each run into one job per Nmax step, each waiting for
+    the one before it and sized for its own step, or chain can be a list of
+    the Nmax values stages should end at (see ChainSubmitter),
+    incremental=True only writes (and submits) runs that are new or whose
+    parameters changed since they were written, and policy.existing_dir
+    says what to do with the changed ones (see update_runs),
+    full_int_check=True reads all of each interaction file to check it,
+    not just its start and end (see int_verify.py)"""
     # check manual input
-    manual_input_check(man_params, machine, paths)
+    check_policy(policy)
+    if plan_path is not None:
+        if chain or incremental:
+            raise ValueError("chained and incremental runs can't be made "
+                             "from a plan, make them without plan_path")
+        # planning doesn't write anything but the plan, or ask anything
+        policy = without_prompts(policy)
+    manual_input_check(man_params, machine, paths, policy,
+                       read_only=plan_path is not None,
+                       full_int_check=full_int_check)
 
     # get default parameters
     defaults = Defaults()
 
-    # list of dicts which contain parameters for each run
-    list_of_dicts = prepare_input(man_params)
-    # creates directories with runnable batch files
-    batch_paths = create_dirs(defaults, list_of_dicts, paths, machine)
-
-    # run all batch paths if wanted
-    if run:
-        print("running all batch files")
-        for batch_path in batch_paths:
-            if machine == "cedar":
-                system("sbatch "+batch_path)
-            elif machine == "summit":
-                system("bsub "+batch_path)
-            else:
-                raise ValueError("Invalid machine!")
+    # gives the parameters for each run, one at a time
+    run_list = prepare_input(man_params, sweep)
+    if sizing is not None:
+        run_list = SizedRuns(run_list, sizing, machine)
+    print(str(len(run_list)) + " runs to create")
+
+    if job_array and task_farm:
+        raise ValueError("pick one of job_array and task_farm, not both")
+    if chain and (job_array or task_farm):
+        raise ValueError("chained runs are their own jobs, so they can't "
+                         "go in a job array or task farm")
+    if staged and stream:
+        raise ValueError("staged runs only appear once they're all written, "
+                         "so they can't be streamed")
+    if incremental and (staged or stream):
+        raise ValueError("incremental runs are checked before anything is "
+                         "written, so they can't be staged or streamed")
+
+    if plan_path is not None:
+        manifest = plan_runs(defaults, run_list, paths, machine, policy)
+        manifest.save(plan_path)
+        print(manifest.summary())
+        print("plan saved to " + plan_path)
+        return
+
+    _, _, working_dir = paths
+    catalog = None if catalog_path is None else Catalog(catalog_path)
+    if job_array:
+        submitter = JobArrays(machine, working_dir, run=run,
+                              max_running=max_running, catalog=catalog)
+    elif task_farm:
+        submitter = TaskFarm(machine, working_dir, run=run, slots=farm_slots,
+                             catalog=catalog)
+    elif chain:
+        submitter = ChainSubmitter(
+            machine, run=run, catalog=catalog,
+            stage_ends=None if chain is True else chain, sizing=sizing)
+    else:
+        submitter = Submitter(machine, run=run, catalog=catalog)
+
+    try:
+        # arrays, farms and chains are filled in as runs are written (and
+        # chains need the batch params), so use the pipeline, unless runs
+        # are being staged or updated
+        if stream or ((job_array or task_farm or chain) and not staged
+                      and not incremental):
+            stream_runs(defaults, run_list, paths, machine, submitter,
+                        n_workers=n_workers, queue_size=queue_size,
+                        policy=policy, catalog=catalog)
+            print("done!")
+            return
+
+        # creates directories with runnable batch files
+        if incremental:
+            written, _ = update_runs(
+                defaults, run_list, paths, machine, n_workers=n_workers,
+                policy=policy, catalog=catalog)
+        elif staged:
+            written = stage_runs(
+                defaults, run_list, paths, machine, n_workers=n_workers,
+                policy=policy, catalog=catalog)
+        else:
+            written = [(batch_path, None) for batch_path in create_dirs(
+                defaults, run_list, paths, machine, n_workers=n_workers,
+                policy=policy, catalog=catalog)]
+
+        # run all batch paths if wanted (arrays and farms are written anyway)
+        if run:
+            print("running all batch files")
+        errors = []
+        for batch_path, batch_params in written:
+            try:
+                submitter.add(batch_path, batch_params)
+            except Exception as e:
+                errors.append(batch_path + ": " + repr(e))
+        if errors:
+            raise RuntimeError(
+                str(len(errors)) + " of " + str(len(written)) +
+                " runs could not be submitted:\n" + "\n".join(errors))
+        submitter.finish()
+    finally:
+        submitter.close()
+        if catalog is not None:
+            catalog.close()
 
     print("done!")
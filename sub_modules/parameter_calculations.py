@@ -1,9 +1,22 @@
 """Module for calculating parameters for files from user input
-as well as the mfdp template file"""
+as well as the mfdp template file
+
+In a sweep, most runs share the inputs of the fiddly bits (the occupation
+restrictions, Nmax lists, kappa lines...), so those are worked out by the
+functions below, which remember their last cache_size answers.
+cache_stats() says how often that helped.
+"""
 
 import os
-from .data_structures import MFDPParams, CedarBatchParams, SummitBatchParams
+from functools import lru_cache
+from .data_structures import MFDPParams
 from .formats import kappa_rename_format, potential_end_bit_format
+from .int_index import tbme_file_type
+from .backends import get_backend
+
+
+# how many different inputs each of the cached functions remembers
+cache_size = 1024
 
 
 def Nmin_HO(Z):
@@ -18,6 +31,7 @@ def Nmin_HO(Z):
     return Nmin
 
 
+@lru_cache(maxsize=cache_size)
 def Ngs_func(Z, N):
     """calculates Ngs: number of excitations in ground state
 
@@ -64,6 +78,107 @@ def nucleus(Z, N):
     return element_name[Z] + str(Z+N)
 
 
+@lru_cache(maxsize=cache_size)
+def occupation_restrictions(Z, N, N_1max, Nhw):
+    """string that sets limits on how many nuclei can occupy certain shells"""
+    occupation_string = ""
+    for shell in range(N_1max + 1):
+        if shell == 0:
+            line = " 0 2  0 2  0 4  "
+        elif shell == 1:
+            line = " 0 6  0 6  0 12  "
+        else:
+            # shell index starting from 0, N = number of neutrons
+            p = Z if Z * shell <= Nhw else int(Nhw / shell)
+            n = N if N * shell <= Nhw else int(Nhw / shell)
+            p_plus_n = (Z + N) if (Z + N) * shell <= Nhw \
+                else int(Nhw / shell)
+            line = " 0 {p}  0 {n}  0 {p_plus_n}  ".format(
+                p=p, n=n, p_plus_n=p_plus_n)
+        line += "! N={N}".format(N=shell)
+        if shell != N_1max:
+            line += "\n"
+        occupation_string += line
+    return occupation_string
+
+
+@lru_cache(maxsize=cache_size)
+def Nmax_lists(Nmax_min, Nmax_max, nhw_min):
+    """the Nmax values without and with importance truncation, as strings
+    like "0 2 4 " for the batch file"""
+    non_IT_Nmax = ""
+    for i in range(Nmax_min, nhw_min, 2):
+        if i <= Nmax_max:
+            non_IT_Nmax += str(i)+" "
+    IT_Nmax = ""
+    for i in range(nhw_min, Nmax_max + 1, 2):
+        if i <= Nmax_max:
+            IT_Nmax += str(i)+" "
+    return non_IT_Nmax, IT_Nmax
+
+
+# a few functions for converting kappa values to the formats we want
+def kappa_D(kappa_given):
+    """2.0 --> 0.200D-04"""
+    kappa_e4 = kappa_given * pow(10, -4)
+    kappa_scientific = "%.2E" % (kappa_e4)
+    kappa_D = kappa_scientific.replace("E", "D")
+    [front, back] = kappa_D.split("D")
+    converted_front = '0.' + str(int(float(front) * 100))
+    kappa = converted_front + "D" + back
+    return kappa
+
+
+def kappa_em(kappa_given):
+    """2.0 --> 2em5"""
+    return str(int(kappa_given)) + "em" + "5"
+
+
+@lru_cache(maxsize=cache_size)
+def kappa_rename_lines(kappa_vals, kappa_points):
+    """one mv line per kappa value, for renaming the IT output files"""
+    kappa_rename = ""
+    for i, kappa in enumerate(map(float, kappa_vals.split())):
+        if i >= kappa_points:  # just in case we have more values than needed
+            break
+        # add each mv line
+        kappa_rename += kappa_rename_format.format(
+            kappa_D=kappa_D(kappa), kappa_em=kappa_em(kappa)) + "\n"
+    return kappa_rename
+
+
+@lru_cache(maxsize=cache_size)
+def potential_end_bit(IT_Nmax, kappa_vals, kappa_points):
+    """the end of the batch file, only there if there are IT runs"""
+    if IT_Nmax == "":
+        return ""
+    return potential_end_bit_format.format(
+        IT_Nmax=IT_Nmax,
+        kappa_rename=kappa_rename_lines(kappa_vals, kappa_points))
+
+
+@lru_cache(maxsize=cache_size)
+def time_minutes(time):
+    """ "days hours minutes" --> number of minutes"""
+    days, hours, minutes = map(int, time.split())
+    return 24*60*days + 60*hours + minutes
+
+
+cached_functions = [Ngs_func, occupation_restrictions, Nmax_lists,
+                    kappa_rename_lines, potential_end_bit, time_minutes]
+
+
+def cache_stats():
+    """{function name: (hits, misses, maxsize, currsize)} for the caches"""
+    return {function.__name__: function.cache_info()
+            for function in cached_functions}
+
+
+def clear_caches():
+    for function in cached_functions:
+        function.cache_clear()
+
+
 def calc_params(run_dir, paths, man_params, default_params, machine):
     """
         calc_params(MinParams instance, MFDPParams instance)
@@ -95,23 +210,7 @@ def calc_params(run_dir, paths, man_params, default_params, machine):
         output_file += "_IT"
 
     # string that sets limits on how many nuclei can occupy certain shells
-    occupation_string = ""
-    for N in range(m.N_1max + 1):
-        if N == 0:
-            line = " 0 2  0 2  0 4  "
-        elif N == 1:
-            line = " 0 6  0 6  0 12  "
-        else:
-            # N = shell index starting from 0, m.N = number of neutrons
-            p = m.Z if m.Z * N <= Nhw else int(Nhw / N)
-            n = m.N if m.N * N <= Nhw else int(Nhw / N)
-            p_plus_n = (m.Z + m.N) if (m.Z + m.N) * N <= Nhw else int(Nhw / N)
-            line = " 0 {p}  0 {n}  0 {p_plus_n}  ".format(
-                p=p, n=n, p_plus_n=p_plus_n)
-        line += "! N={N}".format(N=N)
-        if N != m.N_1max:
-            line += "\n"
-        occupation_string += line
+    occupation_string = occupation_restrictions(m.Z, m.N, m.N_1max, Nhw)
 
     # make paths for interaction filess, we'll make these relative paths later
     two_path = os.path.join(int_dir, m.two_body_interaction)
@@ -120,11 +219,17 @@ def calc_params(run_dir, paths, man_params, default_params, machine):
     if three_path[-5:] == "_comp":
         three_path = three_path[:-5]
 
+    # the TBME type is in the file name (manual_input_check says if it
+    # isn't, and the default is used)
+    two_body_file_type = tbme_file_type(m.two_body_interaction)
+    if two_body_file_type is None:
+        two_body_file_type = d.two_body_file_type
+
     # now put all these parameters in a convenient container
     mfdp_parameters = MFDPParams(
         # can calculate easily from min_params:
         two_body_interaction=two_path,
-        two_body_file_type=m.two_body_interaction[5],
+        two_body_file_type=two_body_file_type,
         Z=m.Z,
         N=m.N,
         hbar_omega=m.hbar_omega,
@@ -177,90 +282,21 @@ def calc_params(run_dir, paths, man_params, default_params, machine):
     )
 
     # Now do the batch file's bottom section to do with renaming files.
-    non_IT_Nmax = ""
-    for i in range(m.Nmax_min, nhw_min, 2):
-        if i <= m.Nmax_max:
-            non_IT_Nmax += str(i)+" "
-    IT_Nmax = ""
-    for i in range(nhw_min, m.Nmax_max + 1, 2):
-        if i <= m.Nmax_max:
-            IT_Nmax += str(i)+" "
-
-    # a few functions for converting kappa values to the formats we want
-    def kappa_D(kappa_given):
-        """2.0 --> 0.200D-04"""
-        kappa_e4 = kappa_given * pow(10, -4)
-        kappa_scientific = "%.2E" % (kappa_e4)
-        kappa_D = kappa_scientific.replace("E", "D")
-        [front, back] = kappa_D.split("D")
-        converted_front = '0.' + str(int(float(front) * 100))
-        kappa = converted_front + "D" + back
-        return kappa
-
-    def kappa_em(kappa_given):
-        """2.0 --> 2em5"""
-        return str(int(kappa_given)) + "em" + "5"
-
-    # get numerical kappa values and create mv lines from those
-    kappa_vals = map(float, m.kappa_vals.split())
+    non_IT_Nmax, IT_Nmax = Nmax_lists(m.Nmax_min, m.Nmax_max, nhw_min)
+    potential_end = potential_end_bit(IT_Nmax, m.kappa_vals, m.kappa_points)
 
-    kappa_rename = ""
-    for i, kappa in enumerate(kappa_vals):
-        if i >= m.kappa_points:  # just in case we have more values than needed
-            break
-        # add each mv line
-        kappa_rename += kappa_rename_format.format(
-            kappa_D=kappa_D(kappa), kappa_em=kappa_em(kappa)) + "\n"
-
-    potential_end = ""
-    if IT_Nmax != "":
-        potential_end = potential_end_bit_format.format(
-            IT_Nmax=IT_Nmax, kappa_rename=kappa_rename)
-
-    # calculate time
-    days, hours, minutes = map(int, m.time.split())
-    cedar_time = "{}-{:02}:{:02}".format(days, hours, minutes)
-    summit_time = "{}:{:02}".format(days*24 + hours, minutes)
-
-    # organize parameters
-    if machine == "cedar":
-        batch_parameters = CedarBatchParams(
-            run_directory=run_dir,
-            account="rrg-navratil",
-            nodes=m.n_nodes,
-            tasks_per_node=d.tasks_per_node,
-            mem_per_core=int(m.mem),
-            mem=d.mem,
-            time=cedar_time,
-            output="ncsd-%J.out",
-            potential=m.potential_name,
-            nucleus_name=nucleus_name,
-            hbar_omega=int(m.hbar_omega),
-            suffix="_"+str(m.n_states)+"st",
-            Ngs=Ngs,
-            ncsd_path=ncsd_path,
-            non_IT_Nmax=non_IT_Nmax,
-            potential_end_bit=potential_end,
-            output_file=output_file
-        )
-    elif machine == "summit":
-        batch_parameters = SummitBatchParams(
-            run_directory=run_dir,
-            account="nph123",
-            nnodes=m.n_nodes,
-            time=summit_time,
-            resource_sets=6 * m.n_nodes,
-            output="ncsd-run_"+nucleus_name+".out",
-            potential=m.potential_name,
-            nucleus_name=nucleus_name,
-            hbar_omega=int(m.hbar_omega),
-            suffix="_"+str(m.n_states)+"st",
-            Ngs=Ngs,
-            ncsd_path=ncsd_path,
-            non_IT_Nmax=non_IT_Nmax,
-            potential_end_bit=potential_end,
-            output_file=output_file
-        )
-    else:
-        raise ValueError("What machine are you using?")
+    # the rest of the batch file depends on the machine (see backends.py)
+    batch_parameters = get_backend(machine).batch_params(
+        m, d, time_minutes(m.time),
+        run_directory=run_dir,
+        potential=m.potential_name,
+        nucleus_name=nucleus_name,
+        hbar_omega=int(m.hbar_omega),
+        suffix="_"+str(m.n_states)+"st",
+        Ngs=Ngs,
+        ncsd_path=ncsd_path,
+        non_IT_Nmax=non_IT_Nmax,
+        potential_end_bit=potential_end,
+        output_file=output_file
+    )
     return mfdp_parameters, batch_parameters
@@ -0,0 +1,94 @@
+"""compiles the templates in formats.py once, so writing files is quick
+
+str.format(**params.param_dict()) builds a dict and looks up every field by
+name on every write. A Renderer turns the template into one that takes its
+values by position instead, and knows which attributes to grab from a Params
+object, in which order. The output is exactly what str.format would give.
+"""
+from string import Formatter
+from operator import attrgetter
+from .formats import mfdp_format, cedar_batch_format, summit_batch_format, \
+    local_batch_format, cedar_array_format, summit_array_format, \
+    cedar_farm_format, summit_farm_format, cedar_stage_format, \
+    summit_stage_format
+
+
+class Renderer(object):
+    """a template compiled for positional values
+
+    fields is the tuple of field names, in the order render() wants them
+    (a field used more than once in the template only appears once here)
+    """
+    def __init__(self, format_string):
+        fields = []
+        pieces = []
+        for literal, name, spec, conversion in \
+                Formatter().parse(format_string):
+            # literal braces have to be doubled again
+            pieces.append(literal.replace("{", "{{").replace("}", "}}"))
+            if name is None:
+                continue
+            if spec and "{" in spec:
+                raise ValueError("nested fields aren't supported: "+name)
+            if name not in fields:
+                fields.append(name)
+            piece = "{" + str(fields.index(name))
+            if conversion:
+                piece += "!" + conversion
+            if spec:
+                piece += ":" + spec
+            pieces.append(piece + "}")
+        self.format_string = format_string
+        self.positional = "".join(pieces)
+        self.fields = tuple(fields)
+        if len(fields) > 1:
+            self.get_values = attrgetter(*fields)
+        elif len(fields) == 1:
+            get_one = attrgetter(fields[0])
+            self.get_values = lambda params: (get_one(params),)
+        else:
+            self.get_values = lambda params: ()
+
+    def render(self, *values):
+        """fills in the template, values in the same order as self.fields"""
+        return self.positional.format(*values)
+
+    def render_params(self, params):
+        """fills in the template from a Params object"""
+        return self.positional.format(*self.get_values(params))
+
+    def write(self, filename, params):
+        with open(filename, 'w+') as open_file:
+            open_file.write(self.render_params(params))
+
+    def write_many(self, filenames, columns):
+        """writes one file per filename, from column-oriented values
+
+        columns maps each field name to a sequence of values, one per file,
+        e.g. {"Z": [3, 3], "N": [5, 6], ...}. Extra columns are ignored.
+        """
+        missing = [field for field in self.fields if field not in columns]
+        if missing:
+            raise ValueError(
+                "columns are missing fields:\n" + "\n".join(missing))
+        rows = zip(*[columns[field] for field in self.fields])
+        for filename, values in zip(filenames, rows):
+            with open(filename, 'w+') as open_file:
+                open_file.write(self.positional.format(*values))
+
+
+# compiled once, when this module is imported
+renderers = {
+    "MFDP": Renderer(mfdp_format),
+    "CEDAR_BATCH": Renderer(cedar_batch_format),
+    "SUMMIT_BATCH": Renderer(summit_batch_format),
+    "LOCAL_BATCH": Renderer(local_batch_format),
+    "CEDAR_ARRAY": Renderer(cedar_array_format),
+    "SUMMIT_ARRAY": Renderer(summit_array_format),
+    "CEDAR_FARM": Renderer(cedar_farm_format),
+    "SUMMIT_FARM": Renderer(summit_farm_format),
+    "CEDAR_STAGE": Renderer(cedar_stage_format),
+    "SUMMIT_STAGE": Renderer(summit_stage_format),
+    "DEFAULT": Renderer(""),
+    "EMPTY": Renderer("")
+}
@@ -0,0 +1,482 @@
+"""picking time, mem and n_nodes for runs from how past runs went
+
+Past runs are kept as a history file, one JSON record per line, each with
+what the run was (machine, Z, N, Nmax_max, 3-body or not, M-scheme basis
+dimension, nodes, MPI ranks) and what it took (minutes of walltime, peak
+memory per rank in GB). The records come from the scheduler's accounting
+(sacct on cedar, bjobs on summit) and, if that's gone, from the timings in
+the run's mfd.log. import_catalog gets them for runs in a catalog, and
+import_run_dirs for old runs under a directory (see import_history.py).
+
+ResourceModel fits
+
+    log(minutes) = a + b log(dimension) + c log(ranks)
+
+and the same for memory per rank, for each machine and interaction type
+(2-body / 3-body), then picks the fewest nodes whose predicted memory per
+rank fits on the machine, and the time for that many nodes. Both are
+multiplied by a safety margin. If there aren't enough runs to fit, the most
+similar past run is scaled by dimension / ranks instead.
+
+    model = ResourceModel.from_history("resource_history.jsonl")
+    man_params = model.size(man_params, "cedar")
+"""
+import json
+import re
+from math import log, exp, ceil
+from os import listdir
+from os.path import join, dirname, exists
+from subprocess import run, PIPE, DEVNULL
+from concurrent.futures import ThreadPoolExecutor
+from .parameter_calculations import Ngs_func, occupation_restrictions
+from .basis_dimension import basis_dimension
+from .file_manager import read_mfdp_tree
+from .catalog import Catalog
+from .backends import get_backend
+
+# node counts to choose from, the fewest that fits is used
+node_choices = [2**i for i in range(13)]
+
+# fewer runs than this (of one machine and interaction type) aren't fit
+min_runs_to_fit = 5
+
+# walltime lines in mfd.log, e.g. "Total time:  1234.5 s"
+mfd_time_pattern = re.compile(
+    r"(?i)\b(?:total|elapsed|wall)\w*\s+(?:cpu\s+)?time\D*?"
+    r"(\d+(?:\.\d+)?)\s*(s|sec|seconds|m|min|minutes|h|hours)?\b")
+time_units = {None: 1/60, "s": 1/60, "sec": 1/60, "seconds": 1/60,
+              "m": 1, "min": 1, "minutes": 1, "h": 60, "hours": 60}
+
+memory_units = {"": 1/1024**3, "K": 1/1024**2, "M": 1/1024, "G": 1,
+                "T": 1024}
+
+# jobs asked about per sacct / bjobs call
+accounting_chunk = 100
+
+
+def run_dimension(man_params):
+    """the M-scheme basis dimension at Nmax_max for a run's ManParams"""
+    m = man_params
+    Nhw = m.Nmax_max + Ngs_func(m.Z, m.N)
+    return basis_dimension(
+        m.Z, m.N, Nhw, Nhw % 2, (m.Z + m.N) % 2, m.N_1max,
+        occupation_restrictions(m.Z, m.N, m.N_1max, Nhw))
+
+
+def mfdp_dimension(mfdp_params):
+    """the same, from a run's MFDPParams"""
+    m = mfdp_params
+    return basis_dimension(m.Z, m.N, m.Nhw, m.parity, m.total_2Jz,
+                           m.N_1max, m.occupation_string)
+
+
+def elapsed_minutes(elapsed):
+    """sacct's [D-]HH:MM:SS (or MM:SS) --> minutes"""
+    days = 0
+    if "-" in elapsed:
+        days, elapsed = elapsed.split("-")
+    seconds = 0.0
+    for part in elapsed.split(":"):
+        seconds = 60 * seconds + float(part)
+    return 24 * 60 * int(days) + seconds / 60
+
+
+def memory_gb(memory):
+    """e.g. "1234K" (sacct) or "1.2 Gbytes" (bjobs) --> GB"""
+    match = re.match(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)", memory)
+    if match is None:
+        return None
+    number, unit = match.groups()
+    return float(number) * memory_units[unit]
+
+
+def slurm_accounting(job_ids):
+    """{job_id: usage} for the finished cedar jobs in job_ids"""
+    output = run(
+        ["sacct", "-n", "-P", "-j", ",".join(job_ids),
+         "-o", "JobID,State,Elapsed,NNodes,NTasks,MaxRSS"],
+        stdout=PIPE, stderr=DEVNULL, universal_newlines=True).stdout
+    usage = {}
+    for line in output.splitlines():
+        fields = line.split("|")
+        if len(fields) != 6:
+            continue
+        step_id, state, elapsed, nodes, tasks, max_rss = fields
+        # the job itself, then its steps (123.batch, 123.0, ...)
+        job_id = step_id.split(".")[0]
+        if step_id == job_id:
+            if state == "COMPLETED":
+                usage[job_id] = {"minutes": elapsed_minutes(elapsed),
+                                 "n_nodes": int(nodes), "ranks": 0,
+                                 "mem_per_rank": None}
+            continue
+        if job_id not in usage:
+            continue
+        job = usage[job_id]
+        if tasks:
+            job["ranks"] = max(job["ranks"], int(tasks))
+        rss = memory_gb(max_rss) if max_rss else None
+        if rss is not None:
+            job["mem_per_rank"] = max(job["mem_per_rank"] or 0, rss)
+    return usage
+
+
+def lsf_accounting(job_ids):
+    """{job_id: usage} for the finished summit jobs in job_ids
+
+    LSF only gives the peak memory of the whole job, so memory per rank is
+    that over the number of ranks (6 per node), which is about right since
+    ranks are all the same size.
+    """
+    output = run(
+        ["bjobs", "-a", "-noheader", "-o",
+         "jobid jobindex stat run_time max_mem nexec_host delimiter=';'"]
+        + list(job_ids),
+        stdout=PIPE, stderr=DEVNULL, universal_newlines=True).stdout
+    usage = {}
+    for line in output.splitlines():
+        fields = line.split(";")
+        if len(fields) != 6:
+            continue
+        job_id, index, state, run_time, max_mem, hosts = fields
+        if state.strip() != "DONE":
+            continue
+        if index.strip() not in ["", "0"]:
+            job_id += "[" + index.strip() + "]"
+        try:
+            n_nodes = int(hosts)
+            minutes = float(run_time.split()[0]) / 60
+        except (ValueError, IndexError):
+            continue
+        mem = memory_gb(max_mem)
+        ranks = get_backend("summit").ranks_per_node * n_nodes
+        usage[job_id] = {
+            "minutes": minutes, "n_nodes": n_nodes, "ranks": ranks,
+            "mem_per_rank": None if mem is None else mem / ranks}
+    return usage
+
+
+def accounting(job_ids, machine):
+    """{job_id: {"minutes", "n_nodes", "ranks", "mem_per_rank"}} for the
+    jobs that the scheduler remembers and that finished properly"""
+    job_ids = sorted(set(job_ids))
+    query = slurm_accounting if machine == "cedar" else lsf_accounting
+    usage = {}
+    for start in range(0, len(job_ids), accounting_chunk):
+        try:
+            usage.update(query(job_ids[start:start+accounting_chunk]))
+        except OSError:
+            # no sacct / bjobs here, e.g. importing on another machine
+            break
+    return usage
+
+
+def mfd_log_minutes(run_dir):
+    """the walltime in a run's mfd.log (or mfd.log_<output file>), in
+    minutes, or None if there's no log or no time in it
+
+    If there are a few times, the longest is taken (it's the total).
+    """
+    logs = [name for name in listdir(run_dir) if name.startswith("mfd.log")]
+    longest = None
+    for name in logs:
+        with open(join(run_dir, name), errors="replace") as open_file:
+            for line in open_file:
+                match = mfd_time_pattern.search(line)
+                if match is not None:
+                    value, unit = match.groups()
+                    minutes = float(value) * time_units[
+                        unit.lower() if unit else None]
+                    longest = minutes if longest is None \
+                        else max(longest, minutes)
+    return longest
+
+
+def batch_resources(run_dir, machine):
+    """(n_nodes, ranks) from a run's batch_ncsd, or (None, None)"""
+    batch_path = join(run_dir, "batch_ncsd")
+    if not exists(batch_path):
+        return None, None
+    with open(batch_path) as open_file:
+        text = open_file.read()
+    if machine == "cedar":
+        nodes = re.search(r"--nodes=(\d+)", text)
+        tasks = re.search(r"--tasks-per-node=(\d+)", text)
+        if nodes is None:
+            return None, None
+        per_node = int(tasks.group(1)) if tasks \
+            else get_backend("cedar").ranks_per_node
+        return int(nodes.group(1)), int(nodes.group(1)) * per_node
+    nodes = re.search(r"#BSUB -nnodes (\d+)", text)
+    if nodes is None:
+        return None, None
+    n_nodes = int(nodes.group(1))
+    return n_nodes, get_backend("summit").ranks_per_node * n_nodes
+
+
+def output_job_id(run_dir):
+    """the job ID in a cedar output file name (ncsd-<job ID>.out), or None
+    if there isn't exactly one"""
+    ids = [match.group(1) for match in
+           (re.match(r"ncsd-(\d+)\.out$", name) for name in listdir(run_dir))
+           if match is not None]
+    return ids[0] if len(ids) == 1 else None
+
+
+def observation(run_dir, mfdp_params, machine, job_id, usage):
+    """the history record for one run, or None if we don't know how long
+    it took. usage is what accounting() says about job_id, if anything."""
+    m = mfdp_params
+    n_nodes, ranks = batch_resources(run_dir, machine)
+    record = {
+        "run_dir": run_dir,
+        "machine": machine,
+        "job_id": job_id,
+        "Z": m.Z,
+        "N": m.N,
+        "Nmax_max": m.Nhw - Ngs_func(m.Z, m.N),
+        "three_body": abs(m.interaction_type) == 3,
+        "dimension": mfdp_dimension(m),
+        "n_nodes": n_nodes,
+        "ranks": ranks,
+        "minutes": None,
+        "mem_per_rank": None,
+        "source": None}
+    if usage is not None:
+        record["minutes"] = usage["minutes"]
+        record["mem_per_rank"] = usage["mem_per_rank"]
+        record["n_nodes"] = usage["n_nodes"] or n_nodes
+        record["ranks"] = usage["ranks"] or ranks
+        record["source"] = "sacct" if machine == "cedar" else "bjobs"
+    else:
+        try:
+            record["minutes"] = mfd_log_minutes(run_dir)
+        except OSError:
+            pass
+        record["source"] = "mfd.log"
+    if record["minutes"] is None or not record["ranks"]:
+        return None
+    return record
+
+
+def load_history(history_path):
+    """the records in a history file (none if it isn't there yet)"""
+    if not exists(history_path):
+        return []
+    with open(history_path) as open_file:
+        return [json.loads(line) for line in open_file if line.strip()]
+
+
+def add_to_history(history_path, records):
+    """appends records for runs that aren't in the history yet (the same
+    run_dir and job_id), returns how many were added"""
+    known = set((r["run_dir"], r["job_id"])
+                for r in load_history(history_path))
+    added = 0
+    with open(history_path, "a") as open_file:
+        for record in records:
+            key = (record["run_dir"], record["job_id"])
+            if key in known:
+                continue
+            known.add(key)
+            open_file.write(json.dumps(record) + "\n")
+            added += 1
+    return added
+
+
+def import_catalog(catalog_path, history_path):
+    """adds the submitted runs in a catalog (see catalog.py) to the history
+
+    Task farm runs share one job, so the job's usage says nothing about
+    any one run, and those are left out. Returns the number of runs added.
+    """
+    with Catalog(catalog_path) as catalog:
+        rows = [row for row in catalog.find(
+            state=["submitted", "running", "left_queue", "finished"])
+            if row["job_id"] is not None]
+        params = {row["run_dir"]: catalog.params(row)[1] for row in rows}
+    runs_per_job = {}
+    for row in rows:
+        runs_per_job[row["job_id"]] = runs_per_job.get(row["job_id"], 0) + 1
+    records = []
+    for machine in ["cedar", "summit"]:
+        machine_rows = [row for row in rows if row["machine"] == machine
+                        and runs_per_job[row["job_id"]] == 1]
+        usage = accounting([row["job_id"] for row in machine_rows], machine)
+        for row in machine_rows:
+            if not exists(row["run_dir"]):
+                continue
+            record = observation(row["run_dir"], params[row["run_dir"]],
+                                 machine, row["job_id"],
+                                 usage.get(row["job_id"]))
+            if record is not None:
+                records.append(record)
+    return add_to_history(history_path, records)
+
+
+def import_run_dirs(root, machine, history_path, n_workers=8):
+    """adds every run under root (anything with an mfdp.dat) to the
+    history, for runs made before there was a catalog
+
+    On cedar, the job ID is read from the ncsd-<job ID>.out file, so the
+    accounting can be used if slurm still has it. Otherwise, and on summit,
+    the time comes from mfd.log. Returns the number of runs added.
+    """
+    runs = []
+    for path, mfdp_params, error in read_mfdp_tree(root, n_workers=n_workers):
+        if error is not None:
+            print("skipping " + path + ": " + error)
+            continue
+        run_dir = dirname(path)
+        job_id = output_job_id(run_dir) if machine == "cedar" else None
+        runs.append((run_dir, mfdp_params, job_id))
+    usage = accounting([job_id for _, _, job_id in runs if job_id], machine)
+
+    def observe(run):
+        run_dir, mfdp_params, job_id = run
+        try:
+            return observation(run_dir, mfdp_params, machine, job_id,
+                               usage.get(job_id))
+        except OSError as e:
+            print("skipping " + run_dir + ": " + repr(e))
+            return None
+
+    # the dimension is the slow part, and mostly cached across a scan
+    with ThreadPoolExecutor(max_workers=n_workers) as pool:
+        records = [r for r in pool.map(observe, runs) if r is not None]
+    return add_to_history(history_path, records)
+
+
+def solve(matrix, vector):
+    """solves a small linear system, or returns None if it's singular"""
+    n = len(vector)
+    rows = [list(matrix[i]) + [vector[i]] for i in range(n)]
+    for column in range(n):
+        pivot = max(range(column, n), key=lambda r: abs(rows[r][column]))
+        if abs(rows[pivot][column]) < 1e-9:
+            return None
+        rows[column], rows[pivot] = rows[pivot], rows[column]
+        for r in range(n):
+            if r != column:
+                factor = rows[r][column] / rows[column][column]
+                rows[r] = [a - factor * b
+                           for a, b in zip(rows[r], rows[column])]
+    return [rows[i][n] / rows[i][i] for i in range(n)]
+
+
+def fit(points):
+    """least squares coefficients for log y = a + b log x1 + c log x2,
+    from points [(x1, x2, y)], or None if they can't pin them down"""
+    if len(points) < min_runs_to_fit:
+        return None
+    features = [(1.0, log(x1), log(x2)) for x1, x2, _ in points]
+    targets = [log(y) for _, _, y in points]
+    matrix = [[sum(f[i] * f[j] for f in features) for j in range(3)]
+              for i in range(3)]
+    vector = [sum(f[i] * t for f, t in zip(features, targets))
+              for i in range(3)]
+    return solve(matrix, vector)
+
+
+class ResourceModel(object):
+    """predicts walltime and memory per rank from a list of history records
+
+    time_margin / mem_margin multiply the predictions, max_mem is the most
+    memory per rank (GB) to ask for on each machine (by default, the
+    backend's max_mem_per_rank), node_choices the node counts to pick from.
+    """
+    def __init__(self, records, time_margin=1.5, mem_margin=1.3,
+                 max_mem=None, node_choices=node_choices):
+        self.records = [r for r in records
+                        if r["minutes"] and r["ranks"] and r["dimension"]]
+        self.time_margin = time_margin
+        self.mem_margin = mem_margin
+        self.max_mem = dict(max_mem or {})
+        self.node_choices = sorted(node_choices)
+        self.fits = {}
+
+    @classmethod
+    def from_history(cls, history_path, **options):
+        records = load_history(history_path)
+        print("sizing runs from " + str(len(records)) + " past runs")
+        return cls(records, **options)
+
+    def similar(self, machine, three_body, quantity):
+        """the records a prediction is based on: the same machine and
+        interaction type if there are enough, otherwise the same machine"""
+        usable = [r for r in self.records
+                  if r["machine"] == machine and r[quantity]]
+        same_type = [r for r in usable if r["three_body"] == three_body]
+        if len(same_type) >= min_runs_to_fit or \
+                len(usable) < min_runs_to_fit:
+            return same_type or usable
+        return usable
+
+    def predict(self, quantity, machine, three_body, dimension, ranks):
+        """the predicted minutes or mem_per_rank (quantity), no margin"""
+        records = self.similar(machine, three_body, quantity)
+        if not records:
+            raise ValueError("no past runs on " + machine + " with a " +
+                             quantity + ", import some (import_history.py)")
+        key = (quantity, machine, three_body)
+        if key not in self.fits:
+            self.fits[key] = fit([(r["dimension"], r["ranks"], r[quantity])
+                                  for r in records])
+        coefficients = self.fits[key]
+        if coefficients is not None:
+            a, b, c = coefficients
+            return exp(a + b * log(dimension) + c * log(ranks))
+        # too few to fit: scale the closest past run, assuming the work is
+        # proportional to the dimension and shared evenly between ranks
+        closest = min(records, key=lambda r: (
+            abs(log(r["dimension"] / dimension)),
+            abs(log(r["ranks"] / ranks))))
+        return closest[quantity] * (dimension / closest["dimension"]) * \
+            (closest["ranks"] / ranks)
+
+    def size_for(self, machine, three_body, dimension):
+        """(n_nodes, mem per rank in GB, minutes) for a run of that size
+
+        The fewest nodes for which memory per rank (with the margin) is
+        under max_mem are used, or the most nodes if none of them are.
+        """
+        backend = get_backend(machine)
+        max_mem = self.max_mem.get(machine, backend.max_mem_per_rank)
+        for n_nodes in self.node_choices:
+            ranks = backend.ranks_per_node * n_nodes
+            mem = ceil(self.mem_margin * self.predict(
+                "mem_per_rank", machine, three_body, dimension, ranks))
+            if max_mem is None or mem <= max_mem:
+                break
+        minutes = ceil(self.time_margin * self.predict(
+            "minutes", machine, three_body, dimension, ranks))
+        # round up to the next quarter hour
+        minutes = 15 * max(1, -(-minutes // 15))
+        return n_nodes, mem, minutes
+
+    def size(self, man_params, machine):
+        """man_params with time, mem and n_nodes filled in from the model"""
+        n_nodes, mem, minutes = self.size_for(
+            machine, abs(man_params.interaction_type) == 3,
+            run_dimension(man_params))
+        hours, minutes = divmod(minutes, 60)
+        days, hours = divmod(hours, 24)
+        return man_params.replace(
+            time="{} {} {}".format(days, hours, minutes),
+            mem=float(mem), n_nodes=n_nodes)
+
+
+class SizedRuns(object):
+    """a run list (e.g. a Sweep) whose runs are sized by a ResourceModel
+    as they're handed out"""
+    def __init__(self, run_list, model, machine):
+        self.run_list = run_list
+        self.model = model
+        self.machine = machine
+
+    def __len__(self):
+        return len(self.run_list)
+
+    def __iter__(self):
+        for man_params in self.run_list:
+            yield self.model.size(man_params, self.machine)
@@ -0,0 +1,269 @@
+"""working out why runs failed, and restarting them where they stopped
+
+A run that left the queue without its mfd.log being renamed (the last thing
+the batch script does) didn't finish. classify() says why, from what the
+scheduler says about the job (sacct / bjobs) and from the ends of the
+scheduler output file and mfd.log:
+
+    walltime      out of time            --> restart with more time
+    oom           out of memory          --> restart with more memory per
+                                             rank, or more nodes if that's
+                                             more than a node has
+    node_failure  a node died            --> restart as it was
+    input_error   a file was missing...  --> needs a person, not restarted
+    unknown       none of the above      --> needs a person, not restarted
+
+Every Nmax (and kappa, for importance truncated steps) that finished left
+its mfdp_<Nhw>.egv file behind, so the restart is written into the same
+directory with irest, nhw_restart, kappa_restart and saved_pivot set to
+carry on from the first step that didn't finish, using the saved pivot.
+The old mfdp.dat and batch_ncsd are kept as mfdp.dat.attempt_<n> etc.
+
+    restart_failed(catalog_path, paths, "cedar")
+"""
+import re
+from os import listdir, rename
+from os.path import join, exists, getmtime, getsize
+from subprocess import run, PIPE, DEVNULL
+from .catalog import Catalog
+from .file_manager import Defaults, MFDP
+from .parameter_calculations import kappa_D
+from .ncsd_multi_run import calc_run
+from .submitters import Submitter, restart_irest
+from .backends import get_backend
+
+# (kind, pattern) in the order they're looked for, the first match wins
+failure_patterns = [
+    ("walltime", re.compile(
+        r"DUE TO TIME LIMIT|\bTIMEOUT\b|TERM_RUNLIMIT|run ?time limit")),
+    ("oom", re.compile(
+        r"(?i)out[ _-]of[ _-]memory|oom[ _-]kill|TERM_MEMLIMIT|"
+        r"cannot allocate memory|bad_alloc|allocation fail|"
+        r"insufficient (virtual )?memory")),
+    ("node_failure", re.compile(
+        r"(?i)DUE TO NODE FAILURE|NODE_FAIL|TERM_HOST|node failure|"
+        r"lost connection to")),
+    ("input_error", re.compile(
+        r"(?i)no such file or directory|file not found|error opening|"
+        r"forrtl: severe \((?:24|29|43|59|64)\)|end-of-file during read|"
+        r"input conversion error"))]
+restartable = ["walltime", "oom", "node_failure"]
+
+# how much of the end of each output file is read
+tail_bytes = 64 * 1024
+
+
+def tail(path):
+    """the last tail_bytes of a file, as text"""
+    with open(path, "rb") as open_file:
+        open_file.seek(max(0, getsize(path) - tail_bytes))
+        return open_file.read().decode(errors="replace")
+
+
+def scheduler_states(job_ids, machine):
+    """{job_id: what the scheduler says about how the job ended}, for the
+    jobs it still remembers"""
+    job_ids = sorted(set(job_ids))
+    if not job_ids or not get_backend(machine).scheduler:
+        return {}
+    if machine == "cedar":
+        command = ["sacct", "-n", "-P", "-X", "-o", "JobID,State",
+                   "-j", ",".join(job_ids)]
+    else:
+        command = ["bjobs", "-a", "-noheader", "-o",
+                   "jobid stat exit_reason delimiter='|'"] + job_ids
+    try:
+        output = run(command, stdout=PIPE, stderr=DEVNULL,
+                     universal_newlines=True).stdout
+    except OSError:
+        return {}
+    states = {}
+    for line in output.splitlines():
+        fields = line.split("|")
+        if len(fields) >= 2:
+            states[fields[0].strip()] = " ".join(fields[1:])
+    return states
+
+
+def output_files(run_dir, job_id):
+    """the scheduler output files for a job: the ones with its ID in the
+    name, or if there aren't any, the newest ncsd-* output file"""
+    names = [name for name in listdir(run_dir) if name.startswith("ncsd-")
+             and ".out" in name]
+    if job_id is not None:
+        named = [name for name in names if job_id in name]
+        if named:
+            return [join(run_dir, name) for name in named]
+    if not names:
+        return []
+    return [max((join(run_dir, name) for name in names), key=getmtime)]
+
+
+def finished(run_dir, mfdp_params):
+    """True if the batch script got to the end and renamed mfd.log"""
+    return exists(join(run_dir, "mfd.log_" + mfdp_params.output_file))
+
+
+def classify(run_dir, job_id=None, scheduler_state=""):
+    """(kind, evidence) for a run that didn't finish, kind is one of
+    walltime, oom, node_failure, input_error or unknown, evidence is the
+    line that gave it away"""
+    texts = [scheduler_state or ""]
+    for path in output_files(run_dir, job_id) + [join(run_dir, "mfd.log")]:
+        if exists(path):
+            texts.append(tail(path))
+    for kind, pattern in failure_patterns:
+        for text in texts:
+            match = pattern.search(text)
+            if match is not None:
+                start = text.rfind("\n", 0, match.start()) + 1
+                end = text.find("\n", match.end())
+                return kind, text[start:end if end >= 0 else None].strip()
+    return "unknown", ""
+
+
+def steps(mfdp_params, kappa_points):
+    """[(Nhw, kappa number from 1 or None)] for every step of a run, in the
+    order ncsd does them"""
+    m = mfdp_params
+    run_steps = []
+    for Nhw in range(m.nhw0, m.Nhw + 1, 2):
+        if Nhw < m.nhw_min:
+            run_steps.append((Nhw, None))
+        else:
+            run_steps += [(Nhw, k + 1) for k in range(kappa_points)]
+    return run_steps
+
+
+def step_done(step, names, kappas):
+    """True if the .egv file of a step is there (renamed or not)"""
+    Nhw, k = step
+    if k is None:
+        prefixes = ["mfdp_{}.egv".format(Nhw)]
+    else:
+        kD = kappa_D(kappas[k - 1])
+        prefixes = ["mfdp_{}{}.egv".format(Nhw, kD),
+                    "mfdp_{}_{}.egv".format(Nhw, kD)]
+    return any(name.startswith(prefix)
+               for name in names for prefix in prefixes)
+
+
+def restart_params(man_params, mfdp_params, run_dir, kind, machine,
+                   time_factor=1.5, mem_factor=1.5):
+    """the ManParams to restart a failed run with, or None if every step
+    finished already (so there's nothing to restart)"""
+    m = man_params
+    kappas = list(map(float, m.kappa_vals.split()))
+    names = listdir(run_dir)
+    run_steps = steps(mfdp_params, m.kappa_points)
+    not_done = [step for step in run_steps
+                if not step_done(step, names, kappas)]
+    if not not_done:
+        return None
+    changes = {}
+    Nhw, k = not_done[0]
+    if not_done[0] == run_steps[0]:
+        # nothing finished, so just start again
+        changes.update(irest=m.irest, nhw_restart=m.nhw_restart,
+                       kappa_restart=m.kappa_restart,
+                       saved_pivot=m.saved_pivot)
+    else:
+        changes.update(irest=restart_irest, nhw_restart=Nhw,
+                       kappa_restart=-1 if k is None or k == 1 else k,
+                       saved_pivot="T")
+    if kind == "walltime":
+        days, hours, minutes = map(int, m.time.split())
+        total = int(time_factor * (24*60*days + 60*hours + minutes)) + 1
+        hours, minutes = divmod(total, 60)
+        days, hours = divmod(hours, 24)
+        changes["time"] = "{} {} {}".format(days, hours, minutes)
+    elif kind == "oom":
+        max_mem = get_backend(machine).max_mem_per_rank
+        if max_mem is None or m.mem * mem_factor <= max_mem:
+            changes["mem"] = float(m.mem * mem_factor)
+        else:
+            # spread the basis over more ranks instead
+            changes["n_nodes"] = 2 * m.n_nodes
+    return m.replace(**changes)
+
+
+def keep_old_files(run_dir):
+    """renames mfdp.dat, batch_ncsd and mfd.log out of the way, with the
+    next free attempt number, so the restart can be written"""
+    attempt = 1
+    while exists(join(run_dir, "mfdp.dat.attempt_" + str(attempt))):
+        attempt += 1
+    for filename in ["mfdp.dat", "batch_ncsd", "mfd.log"]:
+        path = join(run_dir, filename)
+        if exists(path):
+            rename(path, path + ".attempt_" + str(attempt))
+
+
+def write_restart(run_dir, man_params, machine, paths, defaults):
+    """writes a restart into run_dir, returns (mfdp_params, batch_params)"""
+    mfdp_params, batch_params = calc_run(
+        defaults, man_params, run_dir, machine, paths)
+    keep_old_files(run_dir)
+    MFDP(filename=join(run_dir, "mfdp.dat"), params=mfdp_params).write()
+    get_backend(machine).write_batch(join(run_dir, "batch_ncsd"),
+                                     batch_params)
+    return mfdp_params, batch_params
+
+
+def restart_failed(catalog_path, paths, machine, run=False, time_factor=1.5,
+                   mem_factor=1.5, max_restarts=3):
+    """checks every run in the catalog that has left the queue, and
+    restarts the ones that failed for a reason that more time, memory or
+    just another go will fix (up to max_restarts times per run)
+
+    Runs that really finished are left alone. With run=False, restarts are
+    written (and are "generated" in the catalog, for feed_queue.py) but not
+    submitted. Returns a list of (run_dir, kind, what was done), kind being
+    None for finished runs.
+    """
+    defaults = Defaults()
+    report = []
+    with Catalog(catalog_path) as catalog:
+        rows = [row for row in catalog.find(
+            state=["left_queue", "finished", "failed"], machine=machine)]
+        states = scheduler_states(
+            [row["job_id"] for row in rows if row["job_id"]], machine)
+        submitter = Submitter(machine, run=run, catalog=catalog)
+        for row in rows:
+            run_dir = row["run_dir"]
+            man_params, mfdp_params, _ = catalog.params(row)
+            if finished(run_dir, mfdp_params):
+                if row["state"] != "finished":
+                    catalog.set_state(run_dir, "finished")
+                report.append((run_dir, None, "finished"))
+                continue
+            kind, evidence = classify(run_dir, row["job_id"],
+                                      states.get(row["job_id"], ""))
+            restarts = row["restarts"] or 0
+            catalog.set_failure(run_dir, kind, restarts)
+            catalog.set_state(run_dir, "failed")
+            if kind not in restartable:
+                action = "left for you to look at: " + evidence
+            elif restarts >= max_restarts:
+                action = "already restarted " + str(restarts) + " times"
+            else:
+                new_params = restart_params(
+                    man_params, mfdp_params, run_dir, kind, machine,
+                    time_factor=time_factor, mem_factor=mem_factor)
+                if new_params is None:
+                    action = "every step finished, only the renaming didn't"
+                else:
+                    new_mfdp, new_batch = write_restart(
+                        run_dir, new_params, machine, paths, defaults)
+                    catalog.add_run(run_dir, new_params, new_mfdp,
+                                    new_batch, machine)
+                    catalog.set_failure(run_dir, kind, restarts + 1)
+                    submitter.add(join(run_dir, "batch_ncsd"), new_batch)
+                    action = "{} from Nhw {}".format(
+                        "restarted" if run else "restart written",
+                        new_mfdp.nhw_restart if new_mfdp.irest else
+                        new_mfdp.nhw0)
+            report.append((run_dir, kind, action))
+            print(run_dir + ": " + kind + ", " + action)
+        submitter.finish()
+    return report
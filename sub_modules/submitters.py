@@ -0,0 +1,399 @@
+"""ways of handing written runs over to the machine's queue
+
+A submitter is told about each run as soon as its files are written (add),
+then finish is called once every run has been written.
+If a submitter has a catalog (see catalog.py), it records the job IDs.
+ChainSubmitter needs the run's batch params, the others can do without.
+"""
+from math import ceil
+from os.path import join, realpath, dirname
+from .data_structures import CedarArrayParams, SummitArrayParams, \
+    CedarFarmParams, SummitFarmParams, CedarStageParams, SummitStageParams
+from .file_manager import CedarArray, SummitArray, CedarFarm, SummitFarm, \
+    CedarStage, SummitStage, MFDP, parse_mfdp
+from .parameter_calculations import occupation_restrictions
+from .basis_dimension import dimensions
+from .backends import get_backend
+
+# irest for a run that carries on from a saved pivot (the mfdp.dat comment
+# says 4, but ncsd_multi.py has always used 1)
+restart_irest = 1
+
+# the least walltime (minutes) a chain stage is given when it's scaled down
+# from the run's, a small stage still has to start up and read its files
+min_stage_minutes = 30
+
+
+class Submitter(object):
+    """submits every run as its own job, as soon as it's written
+
+    jobs is job ID --> run directory, for the jobs submitted so far
+    """
+    def __init__(self, machine, run=True, catalog=None):
+        self.machine = machine
+        self.backend = get_backend(machine)
+        self.run = run
+        self.catalog = catalog
+        self.jobs = {}
+
+    def submitted(self, run_dir, job_id):
+        """records a run's job ID"""
+        self.jobs[job_id] = run_dir
+        if self.catalog is not None:
+            self.catalog.set_job(run_dir, job_id)
+
+    def add(self, batch_path, batch_params):
+        if self.run:
+            self.submitted(dirname(batch_path),
+                           self.backend.submit(batch_path))
+
+    def close(self):
+        """lets go of anything the submitter has open, called after finish,
+        or instead of it if writing runs went wrong"""
+
+    def finish(self):
+        """with a scheduler there's nothing left to do, a backend that runs
+        jobs itself is waited for, and how each run went is recorded"""
+        if self.backend.scheduler or not self.jobs:
+            return
+        print("waiting for " + str(len(self.jobs)) + " runs to finish")
+        states = self.backend.wait()
+        for job_id, run_dir in self.jobs.items():
+            state = states.get(job_id, "finished")
+            if state == "failed":
+                print(run_dir + " failed")
+            if self.catalog is not None:
+                self.catalog.set_state(run_dir, state)
+
+
+class JobArrays(Submitter):
+    """submits all runs as a job array, instead of one job per run
+
+    A job array asks for one set of resources for all its tasks, so runs
+    are grouped by what their batch files ask for (nodes, time, memory).
+    Usually that's one group, and so one submission for the whole sweep.
+
+    Each group gets a run list, with one batch file path per line, and an
+    array script whose i-th task runs the batch file on line i. Run lists
+    are written as runs come in, so nothing is kept in memory per run.
+    max_running limits how many tasks of an array run at once (0 = no limit)
+    """
+    name = "array"  # used for naming the scripts and run lists
+
+    def __init__(self, machine, working_dir, run=True, max_running=0,
+                 catalog=None):
+        super(JobArrays, self).__init__(machine, run=run, catalog=catalog)
+        if machine not in ["cedar", "summit"]:
+            raise ValueError(
+                "job arrays and task farms are only written for cedar and "
+                "summit, not " + machine)
+        self.working_dir = working_dir
+        self.max_running = max_running
+        # resources --> [run list path, open run list, n_runs, batch_params]
+        self.groups = {}
+
+    def resources(self, batch_params):
+        """the part of the batch params that has to match within an array"""
+        b = batch_params
+        if self.machine == "cedar":
+            return (b.account, b.nodes, b.tasks_per_node, b.mem,
+                    b.mem_per_core, b.time)
+        return (b.account, b.nnodes, b.time)
+
+    def add(self, batch_path, batch_params):
+        key = self.resources(batch_params)
+        if key not in self.groups:
+            number = len(self.groups)
+            run_list = realpath(join(
+                self.working_dir, self.name+"_runs_"+str(number)+".txt"))
+            self.groups[key] = [run_list, open(run_list, "w"), 0, batch_params]
+        group = self.groups[key]
+        group[1].write(batch_path + "\n")
+        group[2] += 1
+
+    def close(self):
+        """closes the run lists (finish does too, before using them)"""
+        for group in self.groups.values():
+            group[1].close()
+
+    def finish(self):
+        """writes a script per group, submits them if run=True
+
+        returns the paths to the scripts"""
+        script_paths = []
+        for number, group in enumerate(self.groups.values()):
+            run_list, open_file, n_runs, batch_params = group
+            open_file.close()
+            script_path = realpath(join(
+                self.working_dir, self.name+"_ncsd_"+str(number)))
+            self.write_script(
+                script_path, number, run_list, n_runs, batch_params)
+            print("wrote "+self.name+" of "+str(n_runs)+" runs: "+script_path)
+            script_paths.append(script_path)
+            if self.run:
+                job_id = self.backend.submit(script_path)
+                if self.catalog is not None:
+                    self.record_tasks(run_list, job_id)
+        return script_paths
+
+    def task_job_id(self, job_id, task):
+        """the ID the queue gives task number `task` (from 1) of an array"""
+        if self.machine == "cedar":
+            return job_id + "_" + str(task)
+        return job_id + "[" + str(task) + "]"
+
+    def record_tasks(self, run_list, job_id):
+        """puts each run's job ID in the catalog, using the run list"""
+        with open(run_list) as open_file:
+            for task, batch_path in enumerate(open_file, start=1):
+                task_id = None if job_id is None \
+                    else self.task_job_id(job_id, task)
+                self.catalog.set_job(dirname(batch_path.rstrip("\n")), task_id)
+
+    def write_script(self, script_path, number, run_list, n_runs, b):
+        """writes the array script for one group, b = a run's batch params"""
+        array_limit = "%"+str(self.max_running) if self.max_running else ""
+        if self.machine == "cedar":
+            params = CedarArrayParams(
+                account=b.account,
+                nodes=b.nodes,
+                tasks_per_node=b.tasks_per_node,
+                mem_per_core=b.mem_per_core,
+                mem=b.mem,
+                time=b.time,
+                output="ncsd-%A_%a.out",
+                n_runs=n_runs,
+                array_limit=array_limit,
+                run_list=run_list)
+            CedarArray(filename=script_path, params=params).write()
+        else:
+            params = SummitArrayParams(
+                account=b.account,
+                nnodes=b.nnodes,
+                time=b.time,
+                job_name="ncsd-array_"+str(number),
+                n_runs=n_runs,
+                array_limit=array_limit,
+                output="ncsd-array_"+str(number)+".out",
+                run_list=run_list)
+            SummitArray(filename=script_path, params=params).write()
+
+
+class TaskFarm(JobArrays):
+    """packs many runs into one job, running several at a time inside it
+
+    Runs are grouped like JobArrays. Each group becomes one job big enough
+    for `slots` runs side by side, which works through the run list and
+    starts the next run as soon as one finishes. On cedar each run is an
+    srun job step on its share of the nodes, on summit jsrun hands each
+    run its own resource sets.
+
+    The walltime is a run's walltime times the number of rounds needed,
+    so short runs cost compute time rather than time waiting in the queue.
+    """
+    name = "farm"
+
+    def __init__(self, machine, working_dir, run=True, slots=4, catalog=None):
+        super(TaskFarm, self).__init__(
+            machine, working_dir, run=run, catalog=catalog)
+        self.slots = slots
+
+    def task_job_id(self, job_id, task):
+        """every run in a farm is part of the one job"""
+        return job_id
+
+    def write_script(self, script_path, number, run_list, n_runs, b):
+        """writes the task farm script for one group"""
+        # no point asking for nodes that would never get used
+        slots = min(self.slots, n_runs)
+        rounds = -(-n_runs // slots)  # rounded up
+        time = self.backend.format_time(
+            rounds * self.backend.parse_time(b.time))
+        if self.machine == "cedar":
+            params = CedarFarmParams(
+                account=b.account,
+                nodes=slots * b.nodes,
+                tasks_per_node=b.tasks_per_node,
+                mem_per_core=b.mem_per_core,
+                mem=b.mem,
+                time=time,
+                output="ncsd-farm_"+str(number)+"-%J.out",
+                slots=slots,
+                nodes_per_run=b.nodes,
+                tasks_per_run=b.nodes * b.tasks_per_node,
+                run_list=run_list)
+            CedarFarm(filename=script_path, params=params).write()
+        else:
+            params = SummitFarmParams(
+                account=b.account,
+                nnodes=slots * b.nnodes,
+                time=time,
+                job_name="ncsd-farm_"+str(number),
+                output="ncsd-farm_"+str(number)+".out",
+                slots=slots,
+                nodes_per_run=b.nnodes,
+                run_list=run_list)
+            SummitFarm(filename=script_path, params=params).write()
+
+
+def stage_output_file(output_file, Nmax_min, Nmax, IT):
+    """the output file name for a run that stops at Nmax, e.g.
+    Li8_pot_Nmax0-8.20_IT --> Li8_pot_Nmax0-4.20 (see calc_params)"""
+    front, back = output_file.rsplit("_Nmax", 1)
+    frequency = back.split(".", 1)[1]
+    if frequency.endswith("_IT"):
+        frequency = frequency[:-3]
+    return front + "_Nmax" + str(Nmax_min) + "-" + str(Nmax) + "." + \
+        frequency + ("_IT" if IT else "")
+
+
+class ChainSubmitter(Submitter):
+    """splits each run into a chain of jobs, one per group of Nmax steps
+
+    Small Nmax steps need a fraction of the nodes the biggest one does, so
+    each stage gets its own nodes, time and memory. With a sizing model
+    (a ResourceModel, see resource_model.py) those come from past runs,
+    otherwise the nodes and time are scaled down by the basis dimension at
+    the end of the stage (the time to no less than min_stage_minutes), and
+    the last stage is exactly what the run asked for.
+
+    stage_ends are the Nmax values stages end at (None = every Nmax step
+    is a stage), the run's Nmax_max always ends the last one.
+    Each stage after the first restarts from the pivot the one before it
+    saved (irest, nhw_restart, saved_pivot), and only starts once that one
+    has finished properly. Only the last stage renames the output files.
+
+    Each stage k gets mfdp.dat.stage_k, batch_ncsd.stage_k and the script
+    that's submitted, stage_ncsd_k, which puts its mfdp.dat in place and
+    runs its batch file. The catalog gets the job ID of the last stage.
+    """
+    def __init__(self, machine, run=True, catalog=None, stage_ends=None,
+                 sizing=None):
+        super(ChainSubmitter, self).__init__(machine, run=run,
+                                             catalog=catalog)
+        if machine not in ["cedar", "summit"]:
+            raise ValueError("chains are only written for cedar and summit, "
+                             "not " + machine)
+        self.stage_ends = stage_ends
+        self.sizing = sizing
+
+    def stages(self, mfdp_params, batch_params):
+        """[(Nmax, mfdp_params, batch_params)] for each stage of a run"""
+        m = mfdp_params
+        b = batch_params
+        Ngs = b.Ngs
+        Nmax_min = m.nhw0 - Ngs
+        Nmax_max = m.Nhw - Ngs
+        if self.stage_ends is None:
+            ends = list(range(Nmax_min, Nmax_max, 2))
+        else:
+            ends = sorted(set(Nmax for Nmax in self.stage_ends
+                              if Nmax_min <= Nmax < Nmax_max and
+                              (Nmax - Nmax_min) % 2 == 0))
+        ends.append(Nmax_max)
+        dims = dimensions(m, Nmax_min)
+        three_body = abs(m.interaction_type) == 3
+        n_nodes = b.nodes if self.machine == "cedar" else b.nnodes
+        mem = m.rmemavail
+        stages = []
+        for number, Nmax in enumerate(ends):
+            last = (number == len(ends) - 1)
+            Nhw = Nmax + Ngs
+            output_file = stage_output_file(
+                m.output_file, Nmax_min, Nmax, m.nhw_min <= Nhw)
+            mfdp_changes = {
+                "Nhw": Nhw, "output_file": output_file,
+                "occupation_string": occupation_restrictions(
+                    m.Z, m.N, m.N_1max, Nhw)}
+            if number > 0:
+                mfdp_changes.update(
+                    irest=restart_irest, nhw_restart=ends[number-1]+2+Ngs,
+                    kappa_restart=-1, saved_pivot="T")
+            batch_changes = {"output_file": output_file}
+            if not last:
+                # the egv files are renamed once everything's done
+                batch_changes.update(non_IT_Nmax="", potential_end_bit="")
+            if self.sizing is not None:
+                stage_nodes, stage_mem, minutes = self.sizing.size_for(
+                    self.machine, three_body, dims[Nmax])
+                batch_changes["time"] = self.backend.format_time(minutes)
+            elif last:
+                stage_nodes, stage_mem = n_nodes, mem
+            else:
+                ratio = dims[Nmax] / dims[Nmax_max]
+                stage_nodes = max(1, ceil(n_nodes * ratio))
+                stage_mem = mem
+                minutes = self.backend.parse_time(b.time)
+                batch_changes["time"] = self.backend.format_time(min(
+                    minutes, max(min_stage_minutes, ceil(minutes * ratio))))
+            mfdp_changes["rmemavail"] = float(stage_mem)
+            if self.machine == "cedar":
+                batch_changes.update(nodes=stage_nodes,
+                                     mem_per_core=int(stage_mem))
+            else:
+                batch_changes.update(nnodes=stage_nodes,
+                                     resource_sets=6 * stage_nodes)
+            stages.append((Nmax, m.replace(**mfdp_changes),
+                           b.replace(**batch_changes)))
+        return stages
+
+    def write_stages(self, run_dir, stages):
+        """writes the files for every stage, returns the scripts to submit"""
+        script_paths = []
+        n_stages = len(stages)
+        for number, (Nmax, mfdp_params, batch_params) in \
+                enumerate(stages, start=1):
+            suffix = ".stage_" + str(number)
+            MFDP(filename=join(run_dir, "mfdp.dat" + suffix),
+                 params=mfdp_params).write()
+            script_path = join(run_dir, "stage_ncsd_" + str(number))
+            b = batch_params
+            self.backend.write_batch(join(run_dir, "batch_ncsd" + suffix), b)
+            if self.machine == "cedar":
+                params = CedarStageParams(
+                    account=b.account,
+                    nodes=b.nodes,
+                    tasks_per_node=b.tasks_per_node,
+                    mem_per_core=b.mem_per_core,
+                    mem=b.mem,
+                    time=b.time,
+                    output="ncsd-stage" + str(number) + "-%J.out",
+                    stage=number,
+                    n_stages=n_stages,
+                    Nmax=Nmax,
+                    run_directory=run_dir,
+                    stage_mfdp="mfdp.dat" + suffix,
+                    stage_batch="batch_ncsd" + suffix)
+                CedarStage(filename=script_path, params=params).write()
+            else:
+                name = "ncsd-stage" + str(number) + "_" + b.nucleus_name
+                params = SummitStageParams(
+                    account=b.account,
+                    nnodes=b.nnodes,
+                    time=b.time,
+                    job_name=name,
+                    output=name + ".out",
+                    stage=number,
+                    n_stages=n_stages,
+                    Nmax=Nmax,
+                    run_directory=run_dir,
+                    stage_mfdp="mfdp.dat" + suffix,
+                    stage_batch="batch_ncsd" + suffix)
+                SummitStage(filename=script_path, params=params).write()
+            script_paths.append(script_path)
+        return script_paths
+
+    def add(self, batch_path, batch_params):
+        run_dir = dirname(batch_path)
+        mfdp_params = parse_mfdp(join(run_dir, "mfdp.dat"))
+        script_paths = self.write_stages(
+            run_dir, self.stages(mfdp_params, batch_params))
+        if self.run:
+            job_id = None
+            for script_path in script_paths:
+                job_id = self.backend.submit(script_path, after=job_id)
+                if job_id is None:
+                    raise RuntimeError(
+                        "couldn't tell the job ID of " + script_path +
+                        ", so the rest of the chain can't wait for it")
+            self.submitted(run_dir, job_id)
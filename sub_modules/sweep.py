@@ -0,0 +1,158 @@
+"""describes which combinations of parameters to run, without listing them all
+
+A sweep is built out of groups:
+
+- Zip(Z=[3, 3], N=[5, 6]) steps through its axes together, like the
+  old list behaviour (shorter lists are extended by copying their last entry)
+- Product(hbar_omega=[16, 20], Nmax_max=[6, 8]) makes every combination
+
+Groups can be nested, e.g.
+
+    Product(Zip(Z=[3, 3], N=[5, 6]), hbar_omega=[16, 20, 24])
+
+makes 6 runs: Li8 and Li9, each at 3 frequencies.
+
+Nothing gets expanded up front. Each group knows how many runs it has and
+can work out the parameters for run number i directly, so len() is cheap
+and a Sweep hands out one ManParams at a time.
+"""
+from abc import ABC, abstractmethod
+from .data_structures import ManParams, key_sets
+
+
+def as_values(value):
+    """single values become one-element lists, lists/tuples/ranges are kept"""
+    if isinstance(value, (list, tuple, range)):
+        return value
+    return [value]
+
+
+class Axis(object):
+    """one parameter and the values it takes"""
+    def __init__(self, name, values):
+        if name not in key_sets["MANUAL INPUT"]:
+            raise ValueError(name + " is not a valid manual parameter")
+        self.name = name
+        self.values = as_values(values)
+        if len(self.values) == 0:
+            raise ValueError("no values given for " + name)
+        self.names = [name]
+
+    def __len__(self):
+        return len(self.values)
+
+    def point(self, i):
+        return {self.name: self.values[i]}
+
+
+class Group(ABC):
+    """base class for Zip and Product, holds the child groups / axes"""
+    def __init__(self, *groups, **axes):
+        self.children = list(groups)
+        for name, values in axes.items():
+            self.children.append(Axis(name, values))
+        # the same parameter can't be set in two places
+        self.names = []
+        for child in self.children:
+            for name in child.names:
+                if name in self.names:
+                    raise ValueError(
+                        name + " appears more than once in the sweep")
+                self.names.append(name)
+
+    @abstractmethod
+    def __len__(self):
+        pass
+
+    @abstractmethod
+    def point(self, i):
+        pass
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.point(i)
+
+
+class Zip(Group):
+    """steps through all children together, e.g. Zip(Z=[3,4], N=[5,6])
+    gives (3,5) then (4,6). Shorter children repeat their last entry."""
+    def __len__(self):
+        return max([len(child) for child in self.children] + [1])
+
+    def point(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError("sweep index out of range")
+        values = {}
+        for child in self.children:
+            values.update(child.point(min(i, len(child) - 1)))
+        return values
+
+
+class Product(Group):
+    """every combination of the children, the last child changes fastest"""
+    def __len__(self):
+        length = 1
+        for child in self.children:
+            length *= len(child)
+        return length
+
+    def point(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError("sweep index out of range")
+        values = {}
+        for child in reversed(self.children):
+            i, child_index = divmod(i, len(child))
+            values.update(child.point(child_index))
+        return values
+
+
+class Sweep(object):
+    """the runs to make: base parameters with the sweep's values filled in
+
+    len(sweep) is the number of runs, sweep[i] is the ManParams for run i,
+    and iterating over it gives each run's ManParams in order.
+    """
+    def __init__(self, base_dict, spec):
+        self.base_dict = base_dict
+        self.spec = spec
+
+    def __len__(self):
+        return len(self.spec)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        run_dict = dict(self.base_dict)
+        run_dict.update(self.spec.point(i))
+        return ManParams(**run_dict)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def make_sweep(man_params, spec=None):
+    """combine ManParams (which may contain lists) with an optional spec
+
+    Any parameter given as a list in man_params, and not set by spec, is
+    zipped together the old way. That zip is then combined with spec as a
+    product, so lists and a spec can be used at the same time.
+    """
+    m_dict = man_params.param_dict()
+    spec_names = spec.names if spec is not None else []
+
+    base_dict = {}
+    old_style = {}
+    for key, value in m_dict.items():
+        if key in spec_names:
+            continue
+        if type(value) == list:
+            old_style[key] = value
+        else:
+            base_dict[key] = value
+
+    if spec is None:
+        full_spec = Zip(**old_style)
+    else:
+        full_spec = Product(Zip(**old_style), spec)
+    return Sweep(base_dict, full_spec)
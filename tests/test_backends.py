@@ -0,0 +1,115 @@
+import os
+from subprocess import Popen
+import pytest
+from sub_modules import backends
+from sub_modules.backends import SchedulerBackend, CedarBackend, \
+    SummitBackend, LocalBackend, get_backend, register
+from sub_modules.file_manager import Defaults
+from sub_modules.ncsd_multi_run import populate_dir
+
+
+class HalfBackend(SchedulerBackend):
+    """has batch params and times, but no way to submit anything"""
+    name = "half"
+
+    def batch_params(self, man_params, default_params, minutes, **fields):
+        return fields
+
+    def format_time(self, minutes):
+        return str(minutes)
+
+    def parse_time(self, batch_time):
+        return int(batch_time)
+
+
+def test_partial_backend_fails_when_made():
+    with pytest.raises(TypeError):
+        HalfBackend()
+
+
+def test_local_backend_is_made_when_asked_for(monkeypatch):
+    monkeypatch.setattr(backends, "backends", {})
+    assert "local" not in backends.backends
+    local = get_backend("local")
+    assert isinstance(local, LocalBackend)
+    assert get_backend("local") is local
+
+
+def test_registered_local_backend_is_kept(monkeypatch):
+    monkeypatch.setattr(backends, "backends", {})
+    local = LocalBackend(max_workers=1)
+    register(local)
+    assert get_backend("local") is local
+    with pytest.raises(ValueError):
+        get_backend("nowhere")
+
+
+@pytest.mark.parametrize("backend", [CedarBackend(), SummitBackend()])
+def test_times_round_trip(backend):
+    for minutes in [1, 59, 60, 61, 24 * 60 + 5]:
+        assert backend.parse_time(backend.format_time(minutes)) == minutes
+
+
+def test_summit_status_names_array_tasks():
+    output = ("JOBID JOBINDEX STAT\n"
+              "101;0;RUN\n"
+              "102;3;PEND\n"
+              "102;4;DONE\n")
+    assert SummitBackend().parse_status(output) == {
+        "101": "running", "102[3]": "submitted", "102[4]": "finished"}
+
+
+fake_ncsd = """#!/bin/bash
+# like ncsd-it.exe, rank 0 restarts from the saved pivot and writes a new
+# one, the others take longer and shouldn't see it unless they're with it
+if [ $SLURM_PROCID = 0 ]
+then
+    [ "$(cat mfdp_pivot)" = v1 ] || exit 3
+    echo v2 > mfdp_pivot
+    echo new > mfdp_12.egv
+else
+    [ $FAKE_NODE = $PIVOT_NODE ] || [ ! -e mfdp_pivot ] || exit 4
+    sleep 0.5
+fi
+"""
+
+
+def test_staged_run_with_fake_ranks(man_params, paths, tmp_path,
+                                    monkeypatch):
+    monkeypatch.setitem(backends.backends, "cedar",
+                        CedarBackend(scratch="$FAKE_NODE"))
+    _, ncsd_path, working_dir = paths
+    with open(ncsd_path, "w") as open_file:
+        open_file.write(fake_ncsd)
+    os.chmod(ncsd_path, 0o755)
+    run_dir = os.path.join(working_dir, "Li8")
+    populate_dir(Defaults(), man_params, run_dir, paths, "cedar")
+    for name, text in [("mfdp_pivot", "v1\n"), ("mfdp_10.egv", "old\n")]:
+        with open(os.path.join(run_dir, name), "w") as open_file:
+            open_file.write(text)
+    with open(os.path.join(run_dir, "mfdp.dat")) as open_file:
+        mfdp = open_file.read()
+
+    # two nodes with two ranks each, all started at once
+    nodes = [str(tmp_path / "node_a"), str(tmp_path / "node_b")]
+    ranks = []
+    for rank in range(4):
+        env = dict(os.environ, SLURM_JOB_ID="7", SLURM_PROCID=str(rank),
+                   SLURM_LOCALID=str(rank % 2), FAKE_NODE=nodes[rank // 2],
+                   PIVOT_NODE=nodes[0])
+        ranks.append(Popen(["bash", backends.staging_script], cwd=run_dir,
+                           env=env))
+    assert [process.wait(timeout=20) for process in ranks] == [0] * 4
+
+    def read(name):
+        with open(os.path.join(run_dir, name)) as open_file:
+            return open_file.read()
+    # what rank 0 wrote came back, and nothing else did
+    assert read("mfdp_pivot") == "v2\n"
+    assert read("mfdp_12.egv") == "new\n"
+    assert read("mfdp_10.egv") == "old\n"
+    assert read("mfdp.dat") == mfdp
+    assert not os.path.exists(os.path.join(run_dir, ".started"))
+    for node in nodes:
+        assert os.listdir(os.path.join(node, "ncsd", "runs")) == []
+        assert len(os.listdir(os.path.join(node, "ncsd", "int"))) == 2
@@ -0,0 +1,76 @@
+from itertools import combinations
+import pytest
+from sub_modules.basis_dimension import basis_dimension, dimensions, \
+    shell_m_values, parse_occupation
+from sub_modules.ncsd_multi_run import calc_run
+from sub_modules.file_manager import Defaults
+
+
+def brute_force(Z, N, Nhw, parity, total_2Jz, N_1max, restrictions=()):
+    """counts determinants one by one, restrictions are what
+    parse_occupation gives"""
+    states = [(shell, two_m) for shell in range(N_1max + 1)
+              for two_m in shell_m_values(shell)]
+
+    def allowed(protons, neutrons):
+        for shell, limits in enumerate(restrictions):
+            p_min, p_max, n_min, n_max, pn_min, pn_max = limits
+            k_p = sum(1 for state in protons if state[0] == shell)
+            k_n = sum(1 for state in neutrons if state[0] == shell)
+            if not (p_min <= k_p <= p_max and n_min <= k_n <= n_max and
+                    pn_min <= k_p + k_n <= pn_max):
+                return False
+        return True
+
+    count = 0
+    for protons in combinations(states, Z):
+        for neutrons in combinations(states, N):
+            nucleons = protons + neutrons
+            E = sum(shell for shell, _ in nucleons)
+            if E <= Nhw and E % 2 == parity % 2 and \
+                    sum(two_m for _, two_m in nucleons) == total_2Jz and \
+                    allowed(protons, neutrons):
+                count += 1
+    return count
+
+
+def test_shell_m_values():
+    assert sorted(shell_m_values(0)) == [-1, 1]
+    # 0p: p1/2 and p3/2
+    assert sorted(shell_m_values(1)) == [-3, -1, -1, 1, 1, 3]
+    assert len(shell_m_values(2)) == 12
+
+
+@pytest.mark.parametrize("Z, N, Nhw, parity, total_2Jz, N_1max", [
+    (2, 2, 0, 0, 0, 0),
+    (2, 1, 3, 1, 1, 2),
+    (3, 2, 4, 1, 1, 2),
+    (3, 3, 4, 0, 0, 2),
+    (2, 2, 6, 0, 0, 3),
+    (3, 3, 2, 0, 1, 2),  # odd 2M with an even number of nucleons: none
+])
+def test_matches_brute_force(Z, N, Nhw, parity, total_2Jz, N_1max):
+    assert basis_dimension(Z, N, Nhw, parity, total_2Jz, N_1max, "") == \
+        brute_force(Z, N, Nhw, parity, total_2Jz, N_1max)
+
+
+def test_occupation_restrictions():
+    # at most one proton and one nucleon in 0s, mfdp.dat style
+    occupation = "0 1 0 2 0 1 ! N=0\n"
+    restrictions = parse_occupation(occupation)
+    assert restrictions == ((0, 1, 0, 2, 0, 1),)
+    assert basis_dimension(2, 1, 5, 1, 1, 2, occupation) == \
+        brute_force(2, 1, 5, 1, 1, 2, restrictions)
+
+
+def test_dimensions_of_a_run(man_params, paths):
+    mfdp_params, _ = calc_run(Defaults(), man_params, paths[2] + "/Li8",
+                              "cedar", paths)
+    by_Nmax = dimensions(mfdp_params, man_params.Nmax_min)
+    assert sorted(by_Nmax) == [0, 2, 4, 6, 8]
+    sizes = [by_Nmax[Nmax] for Nmax in sorted(by_Nmax)]
+    assert sizes == sorted(sizes) and sizes[0] < sizes[-1]
+    m = mfdp_params
+    assert by_Nmax[8] == basis_dimension(
+        m.Z, m.N, m.Nhw, m.parity, m.total_2Jz, m.N_1max,
+        m.occupation_string)
@@ -0,0 +1,96 @@
+import sqlite3
+import pytest
+from sub_modules.catalog import Catalog, run_hash, write_stamp, \
+    read_stamp, schema
+from sub_modules.ncsd_multi_run import calc_run
+from sub_modules.file_manager import Defaults
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    with Catalog(str(tmp_path / "runs.db")) as catalog:
+        yield catalog
+
+
+def add(catalog, man_params, paths, run_name="Li8", **changes):
+    run_dir = paths[2] + "/" + run_name
+    man_params = man_params.replace(**changes)
+    mfdp_params, batch_params = calc_run(
+        Defaults(), man_params, run_dir, "cedar", paths)
+    catalog.add_run(run_dir, man_params, mfdp_params, batch_params, "cedar")
+    return run_dir, mfdp_params, batch_params
+
+
+def test_add_and_get(catalog, man_params, paths):
+    run_dir, mfdp_params, batch_params = add(catalog, man_params, paths)
+    row = catalog.get(run_dir)
+    assert row["state"] == "generated"
+    assert row["job_id"] is None
+    assert row["params_hash"] == run_hash(mfdp_params, batch_params)
+    assert row["dimension"] > 0
+    assert catalog.params(row) == [man_params, mfdp_params, batch_params]
+    assert catalog.get(paths[2] + "/nothing") is None
+
+
+def test_find(catalog, man_params, paths):
+    li8, _, _ = add(catalog, man_params, paths)
+    li8_hw16, _, _ = add(catalog, man_params, paths, "Li8_2",
+                         hbar_omega=16)
+    li9, _, _ = add(catalog, man_params, paths, "Li9", N=6)
+    catalog.set_job(li9, "123")
+    catalog.set_state(li8_hw16, "failed")
+
+    def run_dirs(**conditions):
+        return [row["run_dir"] for row in catalog.find(**conditions)]
+    assert run_dirs(Z=3, N=5) == [li8, li8_hw16]
+    assert run_dirs(hbar_omega=16) == [li8_hw16]
+    assert run_dirs(Nmax_range=(8, 8)) == [li8, li8_hw16, li9]
+    assert run_dirs(Nmax_range=(0, 6)) == []
+    assert run_dirs(interaction=man_params.three_body_interaction) == \
+        [li8, li8_hw16, li9]
+    assert run_dirs(state=["submitted", "failed"]) == [li8_hw16, li9]
+    assert run_dirs(job_id="123") == [li9]
+
+
+def test_bad_state(catalog, man_params, paths):
+    run_dir, _, _ = add(catalog, man_params, paths)
+    with pytest.raises(ValueError):
+        catalog.set_state(run_dir, "lost")
+
+
+def test_rewritten_run_replaces_its_row(catalog, man_params, paths):
+    run_dir, _, _ = add(catalog, man_params, paths)
+    catalog.set_job(run_dir, "123")
+    add(catalog, man_params, paths, hbar_omega=16)
+    assert len(catalog.find()) == 1
+    row = catalog.get(run_dir)
+    assert row["hbar_omega"] == 16
+    assert row["job_id"] is None
+
+
+def test_older_catalog_gets_new_columns(tmp_path):
+    db_path = str(tmp_path / "old.db")
+    # the first version didn't have the columns after updated
+    old_schema = schema.replace(
+        "updated REAL NOT NULL,\n    dimension INTEGER,\n"
+        "    dimensions TEXT,\n    failure TEXT,\n    restarts INTEGER);",
+        "updated REAL NOT NULL);")
+    assert old_schema != schema
+    connection = sqlite3.connect(db_path)
+    connection.executescript(old_schema)
+    connection.commit()
+    connection.close()
+    with Catalog(db_path) as catalog:
+        columns = [row["name"] for row in
+                   catalog.connection.execute("PRAGMA table_info(runs)")]
+    for column in ["dimension", "dimensions", "failure", "restarts"]:
+        assert column in columns
+
+
+def test_stamp(tmp_path, man_params, paths):
+    run_dir = str(tmp_path)
+    assert read_stamp(run_dir) is None
+    mfdp_params, batch_params = calc_run(
+        Defaults(), man_params, paths[2] + "/Li8", "cedar", paths)
+    write_stamp(run_dir, mfdp_params, batch_params)
+    assert read_stamp(run_dir) == run_hash(mfdp_params, batch_params)
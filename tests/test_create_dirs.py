@@ -0,0 +1,69 @@
+import os
+import pytest
+from sub_modules import ncsd_multi_run
+from sub_modules.ncsd_multi_run import create_dirs, prepare_input
+from sub_modules.data_structures import DefaultPolicyObj
+from sub_modules.file_manager import Defaults, parse_mfdp
+from sub_modules.sweep import Product
+
+overwrite = DefaultPolicyObj.replace(existing_dir="overwrite")
+run_names = ["Li8", "Li8_2", "Li8_3", "Li8_4"]
+
+
+def sweep(man_params):
+    return prepare_input(man_params, Product(hbar_omega=[12, 16, 20, 24]))
+
+
+def read(path):
+    with open(path) as open_file:
+        return open_file.read()
+
+
+def test_parallel_without_chdir(man_params, paths, tmp_path, monkeypatch):
+    # the serial runs, to compare with
+    serial_paths = paths[:2] + [str(tmp_path / "serial")]
+    os.mkdir(serial_paths[2])
+    create_dirs(Defaults(), sweep(man_params), serial_paths, "cedar",
+                policy=overwrite)
+
+    def no_chdir(path):
+        raise AssertionError("chdir to " + path)
+    monkeypatch.setattr(os, "chdir", no_chdir)
+    cwd = os.getcwd()
+    batch_paths = create_dirs(Defaults(), sweep(man_params), paths, "cedar",
+                              n_workers=4, policy=overwrite)
+    assert os.getcwd() == cwd
+
+    # in run order, each written as if it had been written alone
+    working_dir = paths[2]
+    assert [os.path.basename(os.path.dirname(batch_path))
+            for batch_path in batch_paths] == run_names
+    for run_name, hbar_omega in zip(run_names, [12, 16, 20, 24]):
+        run_dir = os.path.join(working_dir, run_name)
+        serial_dir = os.path.join(serial_paths[2], run_name)
+        mfdp_path = os.path.join(run_dir, "mfdp.dat")
+        assert read(mfdp_path) == read(os.path.join(serial_dir, "mfdp.dat"))
+        assert parse_mfdp(mfdp_path).hbar_omega == hbar_omega
+        assert read(os.path.join(run_dir, "batch_ncsd")) == \
+            read(os.path.join(serial_dir, "batch_ncsd")).replace(
+                serial_dir, run_dir)
+        assert os.readlink(os.path.join(run_dir, "ncsd-it.exe")) == paths[1]
+
+
+def test_failed_runs_are_reported_together(man_params, paths, monkeypatch):
+    write_run = ncsd_multi_run.write_run
+
+    def some_fail(run_dir, *args, **kwargs):
+        if os.path.basename(run_dir) in ["Li8_2", "Li8_4"]:
+            raise IOError("disk full")
+        return write_run(run_dir, *args, **kwargs)
+    monkeypatch.setattr(ncsd_multi_run, "write_run", some_fail)
+    with pytest.raises(RuntimeError) as error:
+        create_dirs(Defaults(), sweep(man_params), paths, "cedar",
+                    n_workers=4, policy=overwrite)
+    assert "2 of 4 runs could not be created" in str(error.value)
+    assert "Li8_2" in str(error.value) and "Li8_4" in str(error.value)
+    # the others were still written
+    for run_name in ["Li8", "Li8_3"]:
+        assert os.path.exists(
+            os.path.join(paths[2], run_name, "batch_ncsd"))
@@ -0,0 +1,84 @@
+import os
+from sub_modules.harvester import parse_log, harvest, ResultsStore
+from sub_modules.ncsd_multi_run import calc_run, write_run
+from sub_modules.file_manager import Defaults
+
+log_text = """ some header ncsd prints
+ Nhw = 8
+ kappa = 2.0
+  State    Energy      J     T
+    1    -31.234     2.0   1.0
+    2    -30.100     1.0   1.0
+ done with this kappa
+ kappa = 3.0
+  State    Energy      J     T
+    1    -31.5       2.0   1.0
+"""
+
+
+def make_run(man_params, paths, run_name="Li8"):
+    run_dir = os.path.join(paths[2], run_name)
+    mfdp_params, batch_params = calc_run(Defaults(), man_params, run_dir,
+                                         "cedar", paths)
+    write_run(run_dir, mfdp_params, batch_params, "cedar", paths)
+    return run_dir
+
+
+def write_log(run_dir, text=log_text):
+    log_path = os.path.join(run_dir, "mfd.log_output_Li8")
+    with open(log_path, "w") as open_file:
+        open_file.write(text)
+    return log_path
+
+
+def test_parse_log(tmp_path):
+    log_path = str(tmp_path / "mfd.log_out")
+    with open(log_path, "w") as open_file:
+        open_file.write(log_text)
+    assert parse_log(log_path) == [
+        (8, 2.0, 1, -31.234, 2.0, 1.0),
+        (8, 2.0, 2, -30.1, 1.0, 1.0),
+        (8, 3.0, 1, -31.5, 2.0, 1.0)]
+
+
+def test_harvest(man_params, paths, tmp_path):
+    run_dir = make_run(man_params, paths)
+    log_path = write_log(run_dir)
+    store_path = str(tmp_path / "results")
+    assert harvest(paths[2], store_path, n_workers=2) == (1, 3, 0)
+    results = ResultsStore(store_path).load(
+        ["nucleus", "Nmax", "hbar_omega", "kappa", "energy", "run_dir"])
+    assert results["nucleus"] == ["Li8"] * 3
+    assert results["Nmax"] == [4] * 3
+    assert results["hbar_omega"] == [man_params.hbar_omega] * 3
+    assert results["kappa"] == [2.0, 2.0, 3.0]
+    assert results["energy"] == [-31.234, -30.1, -31.5]
+    assert results["run_dir"] == [run_dir] * 3
+
+    # nothing new, nothing read
+    assert harvest(paths[2], store_path) == (0, 0, 0)
+
+    # a changed log replaces its old rows
+    write_log(run_dir, log_text.split(" done")[0] + "\n Nhw = 10\n")
+    assert harvest(paths[2], store_path) == (1, 2, 0)
+    store = ResultsStore(store_path)
+    assert len(store.chunks) == 2
+    assert store.load(["energy"])["energy"] == [-31.234, -30.1]
+    store.compact()
+    store = ResultsStore(store_path)
+    assert len(store.chunks) == 1
+    assert store.load(["energy"])["energy"] == [-31.234, -30.1]
+
+    # and a deleted one is forgotten
+    os.remove(log_path)
+    assert harvest(paths[2], store_path) == (0, 0, 0)
+    assert ResultsStore(store_path).load(["energy"])["energy"] == []
+
+
+def test_unreadable_run_is_a_problem(man_params, paths, tmp_path):
+    run_dir = make_run(man_params, paths)
+    write_log(run_dir)
+    with open(os.path.join(run_dir, "mfdp.dat"), "w") as open_file:
+        open_file.write("not an mfdp.dat\n")
+    logs, rows, problems = harvest(paths[2], str(tmp_path / "results"))
+    assert (logs, rows, problems) == (1, 0, 1)
@@ -0,0 +1,117 @@
+import os
+from sub_modules import int_index
+from sub_modules.int_index import get_int_index, parse_tbme_name, \
+    parse_three_body_name, tbme_file_type
+from sub_modules.data_structures import DefaultParamsObj
+from sub_modules.parameter_calculations import calc_params
+from conftest import two_body, three_body
+
+
+def test_parse_names():
+    tbme = parse_tbme_name(two_body)
+    assert tbme["hbar_omega"] == 20.0
+    assert (tbme["N_1max"], tbme["N_12max"]) == (9, 10)
+    assert tbme["file_type"] == 2
+    three = parse_three_body_name(three_body)
+    assert three == {"hbar_omega": 20.0, "nmax_code": "11109"}
+    assert "error" in parse_tbme_name("no_frequency_here")
+
+
+def test_tbme_file_type_is_an_int():
+    assert tbme_file_type(two_body) == 2
+    assert tbme_file_type("TBMEAx") is None
+
+
+def test_find(paths):
+    index = get_int_index(paths[0])
+    assert index.find("tbme", hbar_omega=20, N_1max=9) == [two_body]
+    assert index.find("three_body", nmax_code="11109") == [three_body]
+    assert index.find("tbme", hbar_omega=24) == []
+
+
+def test_not_written_into_int_dir(paths):
+    get_int_index(paths[0])
+    assert sorted(os.listdir(paths[0])) == sorted([two_body, three_body])
+    assert os.path.exists(int_index.cache_path)
+
+
+def test_save_false_writes_nothing(paths):
+    get_int_index(paths[0], save=False)
+    assert not os.path.exists(int_index.cache_path)
+
+
+def old_dir(int_dir):
+    """makes int_dir's mtime old enough for the index to keep it"""
+    os.utime(int_dir, (1000, 1000))
+
+
+def test_file_rewritten_in_place(paths):
+    path = os.path.join(paths[0], two_body)
+    old_dir(paths[0])
+    index = get_int_index(paths[0])
+    with open(path, "w") as open_file:
+        open_file.write("1 2 0.5\n3 4 0.25\n")
+    os.utime(path, (1, 1))
+    old_dir(paths[0])
+    # int_dir looks the same, but the file we're about to use is stat'ed
+    get_int_index(paths[0], refresh=True, check=[two_body])
+    assert index.files[two_body]["size"] == os.path.getsize(path)
+    assert index.files[two_body]["mtime"] == 1
+
+
+def test_unchanged_dir_is_not_scanned(paths, monkeypatch):
+    old_dir(paths[0])
+    get_int_index(paths[0])
+    int_index.loaded_indexes.clear()
+
+    def no_scan(path):
+        raise AssertionError("scanned " + path)
+    monkeypatch.setattr(os, "scandir", no_scan)
+    index = get_int_index(paths[0], check=[two_body])
+    assert index.find("tbme", hbar_omega=20) == [two_body]
+    os.remove(os.path.join(paths[0], three_body))
+    old_dir(paths[0])
+    get_int_index(paths[0], refresh=True, check=[three_body])
+    assert three_body not in index
+
+
+def test_new_file_is_found(paths):
+    old_dir(paths[0])
+    index = get_int_index(paths[0])
+    new_file = two_body.replace(".20_", ".24_")
+    open(os.path.join(paths[0], new_file), "w").close()
+    get_int_index(paths[0], refresh=True)
+    assert index.find("tbme", hbar_omega=24) == [new_file]
+
+
+def test_saved_through_own_temporary_file(paths):
+    # another process's temporary file is left alone
+    other = int_index.cache_path + ".tmp"
+    with open(other, "w") as open_file:
+        open_file.write("half")
+    get_int_index(paths[0])
+    cache_dir, cache_name = os.path.split(int_index.cache_path)
+    assert sorted(name for name in os.listdir(cache_dir)
+                  if name.startswith(cache_name)) == \
+        [cache_name, os.path.basename(other)]
+    with open(other) as open_file:
+        assert open_file.read() == "half"
+
+
+def test_reloaded_from_cache(paths):
+    get_int_index(paths[0])
+    int_index.loaded_indexes.clear()
+    assert two_body in get_int_index(paths[0])
+
+
+def test_calc_params_does_no_io(man_params):
+    # none of these paths exist
+    paths = ["/no/int", "/no/ncsd-it.exe", "/no/work"]
+    mfdp_params, _ = calc_params(
+        "/no/work/Li8", paths, man_params, DefaultParamsObj, "cedar")
+    assert mfdp_params.two_body_file_type == 2
+    odd = man_params.replace(two_body_interaction="TBMEAxsrg.20_910")
+    mfdp_params, _ = calc_params(
+        "/no/work/Li8", paths, odd, DefaultParamsObj, "cedar")
+    assert mfdp_params.two_body_file_type == \
+        DefaultParamsObj.two_body_file_type
@@ -0,0 +1,95 @@
+import os
+import struct
+from sub_modules import int_verify
+from sub_modules.int_index import get_int_index
+from sub_modules.int_verify import verify_file, check_int_file, \
+    three_body_nmaxes, load_cache
+
+
+def record(data):
+    return struct.pack("<i", len(data)) + data + struct.pack("<i", len(data))
+
+
+def write(path, data):
+    with open(str(path), "wb") as open_file:
+        open_file.write(data)
+    return str(path)
+
+
+def test_text_files(tmp_path):
+    good = write(tmp_path / "good", b"10 2\n1 2 3 0.5\n1 2 4 0.25\n")
+    assert verify_file(good)["problems"] == []
+    cut = write(tmp_path / "cut", b"10 2\n1 2 3 0.5\n1 2")
+    assert len(verify_file(cut)["problems"]) == 2
+    assert verify_file(write(tmp_path / "empty", b""))["problems"] == \
+        ["it's empty"]
+
+
+def test_fortran_files(tmp_path):
+    data = record(b"\x01" * 12) + record(b"\x02" * 4000) + record(b"\x03" * 8)
+    good = write(tmp_path / "good", data)
+    cut = write(tmp_path / "cut", data[:-10])
+    assert verify_file(good)["problems"] == []
+    assert verify_file(cut)["problems"] != []
+    entry = verify_file(good, full=True)
+    assert entry["layout"] == "fortran, 3 records"
+    assert "checksum" in entry and entry["problems"] == []
+    assert verify_file(cut, full=True)["problems"] != []
+
+
+def test_cheap_check_reads_only_the_ends(tmp_path, monkeypatch):
+    data = record(b"\x01" * 12) + record(b"\x02" * 100000)
+    path = write(tmp_path / "big", data)
+
+    def no_checksum(mapped):
+        raise AssertionError("read the whole file")
+    monkeypatch.setattr(int_verify, "checksum", no_checksum)
+    monkeypatch.setattr(int_verify, "fortran_records", no_checksum)
+    entry = verify_file(path)
+    assert entry["problems"] == [] and "checksum" not in entry
+
+
+def test_cached_by_size_and_mtime(tmp_path, monkeypatch):
+    int_dir = tmp_path / "int"
+    int_dir.mkdir()
+    name = "TBMEA2srg-n3lo2.0_14.20_910"
+    path = write(int_dir / name, b"1 2 0.5\n")
+    index = get_int_index(str(int_dir))
+    assert check_int_file(index, name, "tbme") == []
+    assert os.path.realpath(path) in load_cache()
+
+    calls = []
+    real_verify = int_verify.text_problems
+    monkeypatch.setattr(int_verify, "text_problems",
+                        lambda mapped: calls.append(1) or real_verify(mapped))
+    assert check_int_file(index, name, "tbme") == []
+    assert calls == []
+    write(path, b"1 2 0.5\n1 2")
+    assert check_int_file(index, name, "tbme") != []
+    assert calls == [1]
+
+
+def test_save_false(tmp_path):
+    int_dir = tmp_path / "int"
+    int_dir.mkdir()
+    name = "TBMEA2srg-n3lo2.0_14.20_910"
+    write(int_dir / name, b"1 2 0.5\n")
+    check_int_file(get_int_index(str(int_dir), save=False), name, "tbme",
+                   save=False)
+    assert not os.path.exists(int_verify.cache_path)
+
+
+def test_smaller_than_lower_truncations(tmp_path):
+    int_dir = tmp_path / "int"
+    int_dir.mkdir()
+    write(int_dir / "TBMEA2srg.20_910", b"1 2 0.5\n")
+    write(int_dir / "TBMEA2srg.20_810", b"1 2 0.5\n" * 10)
+    index = get_int_index(str(int_dir))
+    assert len(check_int_file(index, "TBMEA2srg.20_910", "tbme")) == 1
+    assert check_int_file(index, "TBMEA2srg.20_810", "tbme") == []
+
+
+def test_three_body_nmaxes():
+    assert three_body_nmaxes("11109") == (11, 10, 9)
+    assert three_body_nmaxes("997") == (9, 9, 7)
+    assert three_body_nmaxes("x") is None
@@ -0,0 +1,63 @@
+import os
+import pytest
+from sub_modules import int_index, int_verify
+from sub_modules.data_structures import DefaultPolicyObj
+from sub_modules.manifest import Manifest, generate_from_manifest
+from sub_modules.ncsd_multi_run import ncsd_multi_run, calc_run
+from sub_modules.file_manager import Defaults
+from sub_modules.renderer import renderers
+from sub_modules.sweep import Product
+
+
+def plan(man_params, paths, tmp_path, **options):
+    plan_path = str(tmp_path / "plan.json")
+    ncsd_multi_run(man_params, paths, "cedar", run=False,
+                   sweep=Product(hbar_omega=[16, 20]), plan_path=plan_path,
+                   **options)
+    return plan_path
+
+
+def test_plan_writes_only_the_plan(man_params, paths, tmp_path,
+                                   monkeypatch):
+    def no_input(prompt=""):
+        raise AssertionError("asked: " + prompt)
+    monkeypatch.setattr("builtins.input", no_input)
+    before = sorted(os.listdir(str(tmp_path)))
+    plan_path = plan(man_params, paths, tmp_path)
+    assert sorted(os.listdir(str(tmp_path))) == sorted(before +
+                                                      ["plan.json"])
+    assert os.listdir(paths[2]) == []
+    assert not os.path.exists(int_index.cache_path)
+    assert not os.path.exists(int_verify.cache_path)
+    assert Manifest.load(plan_path).n_runs == 2
+
+
+def test_plan_prompt_counts_as_fail(man_params, paths, tmp_path):
+    os.mkdir(os.path.join(paths[2], "Li8"))
+    with pytest.raises(IOError):
+        plan(man_params, paths, tmp_path, policy=DefaultPolicyObj)
+
+
+def test_plan_rejects_chain_and_incremental(man_params, paths, tmp_path):
+    with pytest.raises(ValueError):
+        plan(man_params, paths, tmp_path, chain=True)
+    with pytest.raises(ValueError):
+        plan(man_params, paths, tmp_path, incremental=True)
+
+
+def test_round_trip(man_params, paths, tmp_path):
+    plan_path = plan(man_params, paths, tmp_path)
+    manifest = Manifest.load(plan_path)
+    assert generate_from_manifest(plan_path, run=False) == 2
+    for i, run_dir in enumerate(manifest.columns["run"]["run_dir"]):
+        planned_man, mfdp_params, batch_params = manifest.params(i)
+        assert planned_man == man_params.replace(hbar_omega=[16, 20][i])
+        # the same as working the run out again
+        assert [mfdp_params, batch_params] == calc_run(
+            Defaults(), planned_man, run_dir, "cedar", paths)
+        with open(os.path.join(run_dir, "mfdp.dat")) as open_file:
+            assert open_file.read() == \
+                renderers["MFDP"].render_params(mfdp_params)
+        with open(os.path.join(run_dir, "batch_ncsd")) as open_file:
+            assert open_file.read() == \
+                renderers["CEDAR_BATCH"].render_params(batch_params)
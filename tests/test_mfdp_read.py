@@ -0,0 +1,86 @@
+import os
+import shutil
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sub_modules import file_manager
+from sub_modules.file_manager import MFDP, Defaults, parse_mfdp, \
+    read_mfdp_tree
+from sub_modules.ncsd_multi_run import calc_run
+
+
+def write_mfdp(man_params, paths, run_name="Li8"):
+    """writes the mfdp.dat for a run, returns its path and params"""
+    run_dir = os.path.join(paths[2], run_name)
+    os.makedirs(run_dir, exist_ok=True)
+    mfdp_params, _ = calc_run(Defaults(), man_params, run_dir, "cedar",
+                              paths)
+    path = os.path.join(run_dir, "mfdp.dat")
+    MFDP(filename=path, params=mfdp_params).write()
+    return path, mfdp_params
+
+
+@pytest.mark.parametrize("changes", [
+    {},
+    # a restart, to a bigger Nmax
+    {"irest": 1, "nhw_restart": 8, "saved_pivot": "T", "Nmax_max": 10},
+    {"Z": 4, "N": 4, "kappa_vals": "1.5 2.5 4.0 8.0", "n_states": 3}])
+def test_round_trip(man_params, paths, changes):
+    path, mfdp_params = write_mfdp(man_params.replace(**changes), paths)
+    parsed = parse_mfdp(path)
+    assert parsed == mfdp_params
+    assert MFDP(filename=path).params == parsed
+    # and writing what was read gives the same file
+    copy_path = path + ".copy"
+    MFDP(filename=copy_path, params=parsed).write()
+    with open(path) as original, open(copy_path) as copied:
+        assert original.read() == copied.read()
+
+
+def test_bad_file(man_params, paths):
+    path, _ = write_mfdp(man_params, paths)
+    with open(path) as open_file:
+        lines = open_file.read().split("\n")
+    with open(path, "w") as open_file:
+        open_file.write("\n".join(lines[:10]))
+    with pytest.raises(ValueError):
+        parse_mfdp(path)
+
+
+class CountingPool(ThreadPoolExecutor):
+    """a thread pool that counts how many reads were handed to it"""
+    submitted = 0
+    lock = Lock()
+
+    def submit(self, *args, **kwargs):
+        with CountingPool.lock:
+            CountingPool.submitted += 1
+        return super(CountingPool, self).submit(*args, **kwargs)
+
+
+def test_read_tree(man_params, paths, monkeypatch):
+    path, mfdp_params = write_mfdp(man_params, paths)
+    n_runs = 40
+    for number in range(2, n_runs + 1):
+        run_dir = os.path.join(paths[2], "Li8_" + str(number))
+        os.mkdir(run_dir)
+        shutil.copy(path, run_dir)
+    broken = os.path.join(paths[2], "Li8_7", "mfdp.dat")
+    with open(broken, "w") as open_file:
+        open_file.write("not an mfdp.dat\n")
+
+    monkeypatch.setattr(file_manager, "ThreadPoolExecutor", CountingPool)
+    CountingPool.submitted = 0
+    n_workers = 2
+    results = []
+    for result in read_mfdp_tree(paths[2], n_workers=n_workers):
+        # never more than a few reads per worker waiting to be picked up
+        assert CountingPool.submitted - len(results) <= 4 * n_workers
+        results.append(result)
+    assert CountingPool.submitted == n_runs
+    assert len(results) == n_runs
+    for result_path, params, error in results:
+        if result_path == broken:
+            assert params is None and error
+        else:
+            assert params == mfdp_params and error is None
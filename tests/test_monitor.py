@@ -0,0 +1,79 @@
+import sys
+import asyncio
+from sub_modules.backends import get_backend
+from sub_modules.catalog import Catalog
+from sub_modules.monitor import Monitor
+
+# a scheduler that's one file of "job_id STATE" lines: submitting appends a
+# pending job, and the status command fails the first time it's run
+submit_script = """
+import sys, fcntl
+with open(sys.argv[1], "a+") as open_file:
+    fcntl.flock(open_file, fcntl.LOCK_EX)
+    open_file.seek(0)
+    job_id = 100 + len(open_file.readlines())
+    open_file.write(str(job_id) + " PENDING\\n")
+print("Submitted batch job " + str(job_id))
+"""
+status_script = """
+import sys, os
+if not os.path.exists(sys.argv[1] + ".failed"):
+    open(sys.argv[1] + ".failed", "w").close()
+    print("slurm_load_jobs error: Socket timed out")
+    sys.exit(1)
+# every job has left the queue by the second look
+"""
+
+
+def fake_commands(tmp_path):
+    jobs = str(tmp_path / "jobs")
+    submit = tmp_path / "submit.py"
+    status = tmp_path / "status.py"
+    submit.write_text(submit_script)
+    status.write_text(status_script)
+    return ([sys.executable, str(submit), jobs],
+            [sys.executable, str(status), jobs])
+
+
+def test_feed_survives_a_failed_poll(tmp_path):
+    submit_command, status_command = fake_commands(tmp_path)
+    batch_paths = []
+    for i in range(3):
+        run_dir = tmp_path / ("run_" + str(i))
+        run_dir.mkdir()
+        (run_dir / "batch_ncsd").write_text("")
+        batch_paths.append(str(run_dir / "batch_ncsd"))
+    monitor = Monitor("cedar", queue_cap=10, poll_interval=0.01,
+                      submit_command=submit_command,
+                      status_command=status_command)
+    counts = asyncio.run(monitor.feed(batch_paths))
+    # jobs the scheduler forgot are left for restarts.py to judge
+    assert counts == {"left_queue": 3}
+
+
+def test_poll_records_left_queue(tmp_path):
+    catalog = Catalog(str(tmp_path / "runs.db"))
+    monitor = Monitor("cedar", catalog=catalog,
+                      status_command=[sys.executable, "-c",
+                                      "print('7 RUNNING')"])
+    monitor.jobs = {"7": ["run_7", "submitted"], "8": ["run_8", "running"]}
+    assert asyncio.run(monitor.poll()) == 1
+    assert monitor.jobs == {"7": ["run_7", "running"],
+                            "8": ["run_8", "left_queue"]}
+    catalog.close()
+
+
+def test_summit_array_tasks():
+    backend = get_backend("summit")
+    assert "jobindex" in " ".join(backend.status_command())
+    output = "1234;0;RUN\n1235;1;PEND\n1235;2;RUN\n1236;   0;DONE\n"
+    assert backend.parse_status(output) == {
+        "1234": "running", "1235[1]": "submitted", "1235[2]": "running",
+        "1236": "finished"}
+
+
+def test_cedar_array_tasks():
+    backend = get_backend("cedar")
+    assert "-r" in backend.status_command()
+    assert backend.parse_status("55_1 PENDING\n55_2 RUNNING\n") == {
+        "55_1": "submitted", "55_2": "running"}
@@ -0,0 +1,44 @@
+from sub_modules.parameter_calculations import calc_params, cache_stats, \
+    clear_caches, cached_functions, occupation_restrictions, Nmax_lists
+from sub_modules.data_structures import DefaultParamsObj
+
+
+def sweep_params(man_params, paths, frequencies):
+    for hbar_omega in frequencies:
+        calc_params("/work/Li8", paths, man_params.replace(
+            hbar_omega=hbar_omega), DefaultParamsObj, "cedar")
+
+
+def test_clear_caches(man_params, paths):
+    sweep_params(man_params, paths, [16, 20])
+    assert any(info.currsize for info in cache_stats().values())
+    clear_caches()
+    for info in cache_stats().values():
+        assert (info.hits, info.misses, info.currsize) == (0, 0, 0)
+
+
+def test_cache_stats(man_params, paths):
+    clear_caches()
+    stats = cache_stats()
+    assert sorted(stats) == sorted(
+        function.__name__ for function in cached_functions)
+    # only the frequency changes, so everything after the first run is
+    # remembered
+    sweep_params(man_params, paths, [12, 16, 20, 24, 28])
+    stats = cache_stats()
+    for name in ["Ngs_func", "occupation_restrictions", "Nmax_lists",
+                 "potential_end_bit", "time_minutes"]:
+        assert stats[name].misses == 1, name
+        assert stats[name].hits >= 4, name
+    # another nucleus is worked out again
+    sweep_params(man_params.replace(Z=4, N=4), paths, [20])
+    assert cache_stats()["occupation_restrictions"].misses == 2
+
+
+def test_cached_answers_are_right():
+    clear_caches()
+    for args in [(3, 5, 9, 10), (4, 4, 9, 12), (3, 5, 9, 10)]:
+        assert occupation_restrictions(*args) == \
+            occupation_restrictions.__wrapped__(*args)
+    assert Nmax_lists(0, 8, 8) == Nmax_lists.__wrapped__(0, 8, 8)
+    assert cache_stats()["occupation_restrictions"].hits == 1
@@ -0,0 +1,70 @@
+import copy
+import pickle
+import pytest
+from sub_modules.data_structures import ManParams, PolicyParams, \
+    DefaultPolicyObj
+
+
+def test_cant_be_changed(man_params):
+    with pytest.raises(AttributeError):
+        man_params.Z = 4
+    with pytest.raises(AttributeError):
+        del man_params.Z
+    with pytest.raises(AttributeError):
+        man_params.new_key = 1
+    assert man_params.Z == 3
+    assert not hasattr(man_params, "__dict__")
+
+
+def test_replace(man_params):
+    heavier = man_params.replace(Z=4, N=6)
+    assert (heavier.Z, heavier.N) == (4, 6)
+    assert (man_params.Z, man_params.N) == (3, 5)
+    assert heavier.replace(Z=3, N=5) == man_params
+    assert man_params.replace() == man_params
+    assert man_params.replace() is not man_params
+    with pytest.raises(ValueError):
+        man_params.replace(not_a_key=1)
+
+
+def test_missing_and_extra_keys(man_params):
+    values = man_params.param_dict()
+    del values["Z"]
+    with pytest.raises(ValueError) as error:
+        ManParams(**values)
+    assert "Z" in str(error.value)
+    with pytest.raises(ValueError) as error:
+        ManParams(extra=1, **man_params.param_dict())
+    assert "extra" in str(error.value)
+
+
+def test_eq_and_hash(man_params):
+    same = ManParams(**man_params.param_dict())
+    assert same == man_params and not same != man_params
+    assert hash(same) == hash(man_params)
+    other = man_params.replace(hbar_omega=16)
+    assert other != man_params
+    # usable as dict keys and in sets
+    assert len({man_params: 1, same: 2, other: 3}) == 2
+    # different kinds of Params are never equal
+    assert DefaultPolicyObj != DefaultPolicyObj.param_dict()
+    assert PolicyParams(**DefaultPolicyObj.param_dict()) == DefaultPolicyObj
+
+
+def test_digest(man_params):
+    assert man_params.digest() == \
+        ManParams(**man_params.param_dict()).digest()
+    assert man_params.digest() != man_params.replace(N=6).digest()
+    assert len(man_params.digest()) == 40
+
+
+def test_pickle_and_copy(man_params):
+    for params in [man_params, DefaultPolicyObj]:
+        for copied in [pickle.loads(pickle.dumps(params)),
+                       copy.copy(params), copy.deepcopy(params)]:
+            assert copied == params
+            assert type(copied) is type(params)
+            assert hash(copied) == hash(params)
+            assert copied.digest() == params.digest()
+            with pytest.raises(AttributeError):
+                copied.Z = 4
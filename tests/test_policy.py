@@ -0,0 +1,83 @@
+import os
+import pytest
+from sub_modules.data_checker import check_policy, check_failed, \
+    without_prompts, manual_input_check
+from sub_modules.data_structures import DefaultPolicyObj
+from sub_modules.ncsd_multi_run import choose_run_dir
+
+quiet = without_prompts(DefaultPolicyObj).replace(int_file_problem="warn")
+
+
+def test_check_policy():
+    check_policy(DefaultPolicyObj)
+    check_policy(quiet.replace(existing_dir="suffix"))
+    # each key only takes the values that mean something for it
+    with pytest.raises(ValueError):
+        check_policy(DefaultPolicyObj.replace(existing_dir="warn"))
+    with pytest.raises(ValueError):
+        check_policy(DefaultPolicyObj.replace(tbme_freq_mismatch="skip"))
+
+
+def test_without_prompts():
+    policy = without_prompts(DefaultPolicyObj)
+    values = policy.param_dict()
+    assert values["existing_dir"] == "fail"
+    assert values["tbme_nmax_mismatch"] == "fail"
+    # what wasn't a question stays the same
+    assert values["int_file_problem"] == "warn"
+    assert without_prompts(policy) == policy
+    kept = DefaultPolicyObj.replace(existing_dir="skip")
+    assert without_prompts(kept).existing_dir == "skip"
+
+
+def test_check_failed(capsys, monkeypatch):
+    with pytest.raises(ValueError) as error:
+        check_failed("fail", "bad file", ["hbar_omega = 16"])
+    assert "bad file" in str(error.value)
+    assert "hbar_omega = 16" in str(error.value)
+
+    check_failed("warn", "bad file", ["hbar_omega = 16"])
+    assert "Warning: bad file" in capsys.readouterr().out
+
+    answers = iter(["maybe", "y"])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    check_failed("prompt", "bad file", [])
+    monkeypatch.setattr("builtins.input", lambda prompt="": "n")
+    with pytest.raises(SystemExit):
+        check_failed("prompt", "bad file", [])
+
+
+def test_manual_input_check_follows_policy(man_params, paths, capsys,
+                                           monkeypatch):
+    def no_questions(prompt=""):
+        raise AssertionError("asked " + prompt)
+    monkeypatch.setattr("builtins.input", no_questions)
+    # the interaction files are for hw=20
+    wrong_freq = man_params.replace(hbar_omega=16)
+    manual_input_check(man_params, "cedar", paths, policy=quiet)
+    with pytest.raises(ValueError) as error:
+        manual_input_check(wrong_freq, "cedar", paths, policy=quiet)
+    assert "hbar_omega = 16" in str(error.value)
+    capsys.readouterr()
+    manual_input_check(wrong_freq, "cedar", paths, policy=quiet.replace(
+        tbme_freq_mismatch="warn", three_body_freq_mismatch="warn"))
+    out = capsys.readouterr().out
+    assert out.count("Warning: Your") == 2
+    # more kappa values than kappa_points
+    too_many = man_params.replace(kappa_points=3)
+    with pytest.raises(ValueError):
+        manual_input_check(too_many, "cedar", paths, policy=quiet)
+    manual_input_check(too_many, "cedar", paths,
+                       policy=quiet.replace(kappa_points_mismatch="warn"))
+
+
+def test_existing_dir_policies(paths):
+    working_dir = paths[2]
+    os.mkdir(os.path.join(working_dir, "Li8"))
+    open(os.path.join(working_dir, "Li8", "old"), "w").close()
+    with pytest.raises(IOError):
+        choose_run_dir("Li8", working_dir, {}, "fail")
+    assert choose_run_dir("Li8", working_dir, {}, "skip") is None
+    assert choose_run_dir("Li8", working_dir, {}, "suffix").endswith("Li8_2")
+    run_dir = choose_run_dir("Li8", working_dir, {}, "overwrite")
+    assert run_dir.endswith("Li8") and not os.path.exists(run_dir)
@@ -0,0 +1,45 @@
+import os
+import pytest
+from sub_modules.renderer import Renderer, renderers
+from sub_modules.ncsd_multi_run import calc_run
+from sub_modules.file_manager import Defaults
+from sub_modules.formats import mfdp_format, cedar_batch_format, \
+    summit_batch_format
+
+
+def test_same_as_format():
+    template = "{b:>5} {a!r} {{literal}} {b} {c:.3f}\n"
+    renderer = Renderer(template)
+    assert renderer.fields == ("b", "a", "c")
+    assert renderer.render(7, "x", 1.5) == \
+        template.format(a="x", b=7, c=1.5)
+    assert Renderer("no fields").render() == "no fields"
+
+
+def test_nested_fields():
+    with pytest.raises(ValueError):
+        Renderer("{a:{width}}")
+
+
+@pytest.mark.parametrize("machine, template, filetype", [
+    ("cedar", cedar_batch_format, "CEDAR_BATCH"),
+    ("summit", summit_batch_format, "SUMMIT_BATCH")])
+def test_run_files_match_format(man_params, paths, machine, template,
+                                filetype):
+    mfdp_params, batch_params = calc_run(
+        Defaults(), man_params, paths[2] + "/Li8", machine, paths)
+    assert renderers["MFDP"].render_params(mfdp_params) == \
+        mfdp_format.format(**mfdp_params.param_dict())
+    assert renderers[filetype].render_params(batch_params) == \
+        template.format(**batch_params.param_dict())
+
+
+def test_write_many(tmp_path):
+    renderer = Renderer("{Z} {N}\n")
+    filenames = [str(tmp_path / name) for name in ["a", "b"]]
+    renderer.write_many(filenames, {"Z": [3, 3], "N": [5, 6], "extra": [0]})
+    assert [(tmp_path / name).read_text() for name in ["a", "b"]] == \
+        ["3 5\n", "3 6\n"]
+    with pytest.raises(ValueError):
+        renderer.write_many(filenames, {"Z": [3, 3]})
+    assert sorted(os.listdir(str(tmp_path))) == ["a", "b"]
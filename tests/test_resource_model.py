@@ -0,0 +1,82 @@
+from math import exp, log
+import pytest
+from sub_modules.resource_model import ResourceModel, fit, \
+    elapsed_minutes, memory_gb, run_dimension
+
+
+def record(dimension, ranks, machine="cedar", three_body=True):
+    """a past run that took exactly what the made-up model says"""
+    return {"run_dir": "run_" + str(dimension) + "_" + str(ranks),
+            "job_id": None, "machine": machine, "three_body": three_body,
+            "dimension": dimension, "ranks": ranks,
+            "minutes": exp(1.0 + 1.2 * log(dimension) - 0.9 * log(ranks)),
+            "mem_per_rank": 1e-3 * dimension / ranks}
+
+
+def history():
+    return [record(dimension, ranks) for dimension in [1e4, 1e5, 1e6]
+            for ranks in [48, 96, 192]]
+
+
+def test_fit_finds_the_coefficients():
+    points = [(r["dimension"], r["ranks"], r["minutes"]) for r in history()]
+    a, b, c = fit(points)
+    assert a == pytest.approx(1.0)
+    assert b == pytest.approx(1.2)
+    assert c == pytest.approx(-0.9)
+
+
+def test_fit_needs_enough_different_runs():
+    points = [(r["dimension"], r["ranks"], r["minutes"]) for r in history()]
+    assert fit(points[:4]) is None
+    # every run on the same number of ranks: c can't be pinned down
+    same_ranks = [(dimension, 48, minutes)
+                  for dimension, _, minutes in points]
+    assert fit(same_ranks) is None
+
+
+def test_predict():
+    model = ResourceModel(history())
+    assert model.predict("mem_per_rank", "cedar", True, 2e5, 100) == \
+        pytest.approx(2.0)
+    # too few runs to fit, so the closest one is scaled
+    model = ResourceModel(history()[:2])
+    assert model.predict("mem_per_rank", "cedar", True, 2e4, 48) == \
+        pytest.approx(1e-3 * 2e4 / 48)
+    with pytest.raises(ValueError):
+        model.predict("minutes", "summit", True, 2e4, 48)
+
+
+def test_size_for_picks_the_fewest_nodes_that_fit():
+    model = ResourceModel(history())
+    # 1000 GB over 48 ranks a node (at most 4 GB each) with the 1.3 margin
+    # needs 8 nodes
+    n_nodes, mem, minutes = model.size_for("cedar", True, 1e6)
+    assert (n_nodes, mem) == (8, 4)
+    expected = 1.5 * exp(1.0 + 1.2 * log(1e6) - 0.9 * log(8 * 48))
+    assert minutes % 15 == 0
+    assert expected <= minutes < expected + 15
+    n_nodes, _, _ = ResourceModel(history(), max_mem={"cedar": 40}) \
+        .size_for("cedar", True, 1e6)
+    assert n_nodes == 1
+
+
+def test_size(man_params):
+    records = [record(dimension, ranks) for dimension in [1e4, 1e5, 1e6]
+               for ranks in [6, 12, 24]]
+    for r in records:
+        r["machine"] = "summit"
+    sized = ResourceModel(records).size(man_params, "summit")
+    days, hours, minutes = map(int, sized.time.split())
+    n_nodes, mem, total = ResourceModel(records).size_for(
+        "summit", True, run_dimension(man_params))
+    assert (sized.n_nodes, sized.mem) == (n_nodes, float(mem))
+    assert (days * 24 + hours) * 60 + minutes == total
+
+
+def test_accounting_formats():
+    assert elapsed_minutes("1-02:03:00") == 24 * 60 + 2 * 60 + 3
+    assert elapsed_minutes("05:30") == 5.5
+    assert memory_gb("2048M") == 2.0
+    assert memory_gb("1.5 Gbytes") == 1.5
+    assert memory_gb("-") is None
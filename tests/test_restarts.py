@@ -0,0 +1,68 @@
+import os
+from sub_modules.catalog import Catalog
+from sub_modules.file_manager import Defaults
+from sub_modules.ncsd_multi_run import create_dirs
+from sub_modules.restarts import classify, steps, restart_params, \
+    restart_failed, step_done
+
+
+def make_run(man_params, paths, catalog_path):
+    """one written Li8 run, recorded as having left the queue"""
+    with Catalog(catalog_path) as catalog:
+        create_dirs(Defaults(), [man_params], paths, "cedar",
+                    catalog=catalog)
+        run_dir = os.path.join(os.path.realpath(paths[2]), "Li8")
+        catalog.set_job(run_dir, "123")
+        catalog.set_state(run_dir, "left_queue")
+    return run_dir
+
+
+def test_classify(tmp_path):
+    run_dir = str(tmp_path)
+    assert classify(run_dir) == ("unknown", "")
+    with open(os.path.join(run_dir, "ncsd-123.out"), "w") as open_file:
+        open_file.write("step 3\nslurmstepd: error: *** JOB 123 ON cdr1 "
+                        "CANCELLED DUE TO TIME LIMIT ***\n")
+    kind, evidence = classify(run_dir, "123")
+    assert kind == "walltime" and "TIME LIMIT" in evidence
+    other_dir = str(tmp_path / "other")
+    os.mkdir(other_dir)
+    assert classify(other_dir, "9", "OUT_OF_MEMORY")[0] == "oom"
+
+
+def test_steps_and_restart_params(man_params, paths, tmp_path):
+    run_dir = make_run(man_params, paths, str(tmp_path / "runs.db"))
+    with Catalog(str(tmp_path / "runs.db")) as catalog:
+        row = catalog.find()[0]
+        _, mfdp_params, _ = catalog.params(row)
+    run_steps = steps(mfdp_params, man_params.kappa_points)
+    # Li8 has Ngs = 4: Nmax 0, 2, 4 without importance truncation, then
+    # 6, 8 with 4 kappas each
+    assert run_steps[:3] == [(4, None), (6, None), (8, None)]
+    assert len(run_steps) == 3 + 2 * 4
+    assert restart_params(man_params, mfdp_params, run_dir, "walltime",
+                          "cedar").irest == man_params.irest
+    # the first two steps finished
+    for Nhw in [4, 6]:
+        open(os.path.join(run_dir, "mfdp_{}.egv".format(Nhw)), "w").close()
+    assert step_done((4, None), os.listdir(run_dir), [])
+    new = restart_params(man_params, mfdp_params, run_dir, "walltime",
+                         "cedar")
+    assert (new.nhw_restart, new.saved_pivot) == (8, "T")
+    assert new.time == "0 12 1"
+    oom = restart_params(man_params, mfdp_params, run_dir, "oom", "cedar")
+    assert oom.n_nodes == 2 * man_params.n_nodes
+
+
+def test_restart_failed_submits_nothing_by_default(man_params, paths,
+                                                  tmp_path):
+    catalog_path = str(tmp_path / "runs.db")
+    run_dir = make_run(man_params, paths, catalog_path)
+    with open(os.path.join(run_dir, "ncsd-123.out"), "w") as open_file:
+        open_file.write("DUE TO TIME LIMIT\n")
+    report = restart_failed(catalog_path, paths, "cedar")
+    assert report == [(run_dir, "walltime", "restart written from Nhw 4")]
+    assert os.path.exists(os.path.join(run_dir, "mfdp.dat.attempt_1"))
+    with Catalog(catalog_path) as catalog:
+        row = catalog.find()[0]
+        assert (row["state"], row["restarts"]) == ("generated", 1)
@@ -0,0 +1,46 @@
+import os
+import pytest
+from sub_modules import ncsd_multi_run
+from sub_modules.ncsd_multi_run import stage_runs, prepare_input
+from sub_modules.data_structures import DefaultPolicyObj
+from sub_modules.file_manager import Defaults
+from sub_modules.sweep import Product
+
+overwrite = DefaultPolicyObj.replace(existing_dir="overwrite")
+
+
+def stage(man_params, paths, machine="cedar"):
+    run_list = prepare_input(man_params, Product(hbar_omega=[16, 20]))
+    return stage_runs(Defaults(), run_list, paths, machine, n_workers=2,
+                      policy=overwrite)
+
+
+def test_staged_then_published(man_params, paths):
+    working_dir = paths[2]
+    written = stage(man_params, paths)
+    assert [os.path.basename(os.path.dirname(batch_path))
+            for batch_path, _ in written] == ["Li8", "Li8_2"]
+    assert sorted(os.listdir(working_dir)) == ["Li8", "Li8_2"]
+    for run_name in ["Li8", "Li8_2"]:
+        run_dir = os.path.join(working_dir, run_name)
+        assert os.path.islink(os.path.join(run_dir, "ncsd-it.exe"))
+        with open(os.path.join(run_dir, "batch_ncsd")) as open_file:
+            assert run_dir in open_file.read()
+
+
+def test_failed_run_changes_nothing(man_params, paths, monkeypatch):
+    working_dir = paths[2]
+    old_run = os.path.join(working_dir, "Li8")
+    os.mkdir(old_run)
+    open(os.path.join(old_run, "old"), "w").close()
+    write_run = ncsd_multi_run.write_run
+
+    def second_run_fails(run_dir, *args):
+        if os.path.basename(run_dir) == "1":
+            raise IOError("disk full")
+        return write_run(run_dir, *args)
+    monkeypatch.setattr(ncsd_multi_run, "write_run", second_run_fails)
+    with pytest.raises(RuntimeError):
+        stage(man_params, paths)
+    assert os.listdir(working_dir) == ["Li8"]
+    assert os.listdir(old_run) == ["old"]
@@ -0,0 +1,89 @@
+import os
+from threading import Thread
+import pytest
+from sub_modules.ncsd_multi_run import stream_runs, prepare_input
+from sub_modules.data_structures import DefaultPolicyObj
+from sub_modules.file_manager import Defaults
+from sub_modules.submitters import Submitter, JobArrays
+from sub_modules.sweep import Zip
+
+
+class Recorder(Submitter):
+    """remembers the runs it's given, instead of submitting them"""
+    def __init__(self):
+        super(Recorder, self).__init__("cedar", run=False)
+        self.added = []
+        self.finished = False
+        self.closed = False
+
+    def add(self, batch_path, batch_params):
+        self.added.append(os.path.basename(os.path.dirname(batch_path)))
+
+    def finish(self):
+        self.finished = True
+
+    def close(self):
+        self.closed = True
+
+
+def stream(man_params, paths, submitter, sweep, **options):
+    """runs stream_runs in a thread, fails if it doesn't finish (it used to
+    hang when a run failed), returns what it raised"""
+    raised = []
+
+    def run():
+        try:
+            stream_runs(Defaults(), prepare_input(man_params, sweep), paths,
+                        "cedar", submitter, n_workers=2, queue_size=1,
+                        **options)
+        except BaseException as e:
+            raised.append(e)
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=20)
+    assert not thread.is_alive(), "stream_runs hung"
+    return raised[0] if raised else None
+
+
+overwrite = DefaultPolicyObj.replace(existing_dir="overwrite")
+
+
+def test_all_runs(man_params, paths):
+    submitter = Recorder()
+    raised = stream(man_params, paths, submitter,
+                    Zip(Z=[3, 3, 3], N=[5, 6, 5]), policy=overwrite)
+    assert raised is None
+    assert sorted(submitter.added) == ["Li8", "Li8_2", "Li9"]
+    assert submitter.finished and submitter.closed
+
+
+def test_failing_run(man_params, paths):
+    submitter = Recorder()
+    # there's no element with Z=40 in the nucleus names
+    raised = stream(man_params, paths, submitter,
+                    Zip(Z=[3, 40, 3, 3], N=[5, 5, 6, 5]), policy=overwrite)
+    assert isinstance(raised, RuntimeError)
+    assert "1 runs had problems" in str(raised)
+    assert "Z=40" in str(raised)
+    assert sorted(submitter.added) == ["Li8", "Li8_2", "Li9"]
+    assert not submitter.finished and submitter.closed
+
+
+def test_exit_from_a_question(man_params, paths, monkeypatch):
+    def leave(prompt=""):
+        raise SystemExit(0)
+    monkeypatch.setattr("builtins.input", leave)
+    os.mkdir(os.path.join(paths[2], "Li9"))
+    submitter = Recorder()
+    raised = stream(man_params, paths, submitter,
+                    Zip(Z=[3] * 6, N=[5, 5, 5, 6, 5, 5]))
+    assert isinstance(raised, SystemExit)
+    assert not submitter.finished and submitter.closed
+
+
+def test_run_lists_are_closed(man_params, paths):
+    submitter = JobArrays("cedar", paths[2], run=False)
+    raised = stream(man_params, paths, submitter,
+                    Zip(Z=[3, 40], N=[5, 5]), policy=overwrite)
+    assert isinstance(raised, RuntimeError)
+    assert [group[1].closed for group in submitter.groups.values()] == [True]
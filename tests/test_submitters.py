@@ -0,0 +1,132 @@
+import os
+import pytest
+from sub_modules.submitters import JobArrays, TaskFarm, ChainSubmitter, \
+    restart_irest, min_stage_minutes
+from sub_modules.ncsd_multi_run import calc_run, write_run
+from sub_modules.catalog import Catalog
+from sub_modules.file_manager import Defaults
+from sub_modules.backends import get_backend
+
+
+def make_run(man_params, paths, run_name, machine="cedar", **changes):
+    """writes a run, returns (batch path, batch params, run's params)"""
+    run_dir = os.path.join(paths[2], run_name)
+    man_params = man_params.replace(**changes)
+    mfdp_params, batch_params = calc_run(Defaults(), man_params, run_dir,
+                                         machine, paths)
+    write_run(run_dir, mfdp_params, batch_params, machine, paths)
+    return os.path.join(run_dir, "batch_ncsd"), batch_params, \
+        [man_params, mfdp_params]
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """[(script path, after)] for everything "submitted" to cedar, each
+    gets job ID 100, 101, ..."""
+    scripts = []
+
+    def submit(batch_path, after=None):
+        scripts.append((batch_path, after))
+        return str(99 + len(scripts))
+    monkeypatch.setattr(get_backend("cedar"), "submit", submit)
+    return scripts
+
+
+def test_job_arrays_group_by_resources(man_params, paths, submitted,
+                                       tmp_path):
+    runs = [make_run(man_params, paths, "Li8"),
+            make_run(man_params, paths, "Li8_2", hbar_omega=16),
+            make_run(man_params, paths, "Li8_3", n_nodes=8)]
+    with Catalog(str(tmp_path / "runs.db")) as catalog:
+        for batch_path, batch_params, (m, mfdp_params) in runs:
+            catalog.add_run(os.path.dirname(batch_path), m, mfdp_params,
+                            batch_params, "cedar")
+        arrays = JobArrays("cedar", paths[2], max_running=5,
+                           catalog=catalog)
+        for batch_path, batch_params, _ in runs:
+            arrays.add(batch_path, batch_params)
+        script_paths = arrays.finish()
+        job_ids = [catalog.get(os.path.dirname(batch_path))["job_id"]
+                   for batch_path, _, _ in runs]
+    assert [script for script, _ in submitted] == script_paths
+    assert len(script_paths) == 2
+    with open(os.path.join(paths[2], "array_runs_0.txt")) as open_file:
+        assert open_file.read().split() == [runs[0][0], runs[1][0]]
+    with open(script_paths[0]) as open_file:
+        assert "#SBATCH --array=1-2%5\n" in open_file.read()
+    assert job_ids == ["100_1", "100_2", "101_1"]
+
+
+def test_job_arrays_only_on_schedulers(paths):
+    with pytest.raises(ValueError):
+        JobArrays("local", paths[2])
+
+
+def test_task_farm_size(man_params, paths, submitted):
+    farm = TaskFarm("cedar", paths[2], slots=2)
+    for number, hbar_omega in enumerate([16, 20, 24]):
+        batch_path, batch_params, _ = make_run(
+            man_params, paths, "Li8_" + str(number), hbar_omega=hbar_omega)
+        farm.add(batch_path, batch_params)
+    [script_path] = farm.finish()
+    assert submitted == [(script_path, None)]
+    backend = get_backend("cedar")
+    # 3 runs, 2 at a time: twice a run's walltime, on 2 runs' nodes
+    time = backend.format_time(2 * backend.parse_time(batch_params.time))
+    with open(script_path) as open_file:
+        script = open_file.read()
+    assert "#SBATCH --nodes=" + str(2 * batch_params.nodes) + " " in script
+    assert "#SBATCH --time=" + time + " " in script
+    assert farm.task_job_id("100", 3) == "100"
+
+
+def test_chain_stages(man_params, paths):
+    batch_path, batch_params, (_, mfdp_params) = make_run(
+        man_params, paths, "Li8")
+    stages = ChainSubmitter("cedar").stages(mfdp_params, batch_params)
+    assert [Nmax for Nmax, _, _ in stages] == [0, 2, 4, 6, 8]
+    backend = get_backend("cedar")
+    Ngs = batch_params.Ngs
+    for number, (Nmax, m, b) in enumerate(stages):
+        assert m.Nhw == Nmax + Ngs
+        assert 1 <= b.nodes <= batch_params.nodes
+        minutes = backend.parse_time(b.time)
+        assert min_stage_minutes <= minutes <= \
+            backend.parse_time(batch_params.time)
+        if number == 0:
+            assert m.irest == mfdp_params.irest
+        else:
+            assert (m.irest, m.nhw_restart, m.saved_pivot) == \
+                (restart_irest, stages[number - 1][0] + 2 + Ngs, "T")
+    # the Nmax 0 stage is tiny, Nmax 6 is a good part of the run
+    assert backend.parse_time(stages[0][2].time) == min_stage_minutes
+    assert min_stage_minutes < backend.parse_time(stages[3][2].time) < \
+        backend.parse_time(batch_params.time)
+    # the last stage is the run as it was asked for
+    _, last_mfdp, last_batch = stages[-1]
+    assert last_batch == batch_params
+    assert last_mfdp.replace(
+        irest=mfdp_params.irest, nhw_restart=mfdp_params.nhw_restart,
+        kappa_restart=mfdp_params.kappa_restart,
+        saved_pivot=mfdp_params.saved_pivot) == mfdp_params
+
+    # stage ends that aren't Nmax steps of this run are left out
+    stages = ChainSubmitter("cedar", stage_ends=[4, 5, 99]).stages(
+        mfdp_params, batch_params)
+    assert [Nmax for Nmax, _, _ in stages] == [4, 8]
+
+
+def test_chain_waits_for_each_stage(man_params, paths, submitted):
+    batch_path, batch_params, _ = make_run(man_params, paths, "Li8")
+    run_dir = os.path.dirname(batch_path)
+    chain = ChainSubmitter("cedar", stage_ends=[2, 4])
+    chain.add(batch_path, batch_params)
+    scripts = [os.path.join(run_dir, "stage_ncsd_" + str(number))
+               for number in [1, 2, 3]]
+    assert submitted == [(scripts[0], None), (scripts[1], "100"),
+                         (scripts[2], "101")]
+    for number in [1, 2, 3]:
+        for filename in ["mfdp.dat.stage_", "batch_ncsd.stage_"]:
+            assert os.path.exists(
+                os.path.join(run_dir, filename + str(number)))
+    assert chain.jobs == {"102": run_dir}
@@ -0,0 +1,34 @@
+import pytest
+from sub_modules.sweep import Group, Zip, Product
+
+
+class Half(Group):
+    """knows its length, but not its points"""
+    def __len__(self):
+        return 1
+
+
+def test_partial_group_fails_when_made():
+    with pytest.raises(TypeError):
+        Half(Z=[3])
+
+
+def test_zip_repeats_the_last_entry():
+    points = list(Zip(Z=[3, 3], N=[5, 6, 7]))
+    assert points == [{"Z": 3, "N": 5}, {"Z": 3, "N": 6}, {"Z": 3, "N": 7}]
+
+
+def test_product_of_zip():
+    sweep = Product(Zip(Z=[3, 3], N=[5, 6]), hbar_omega=[16, 20, 24])
+    assert len(sweep) == 6
+    assert sweep.point(0) == {"Z": 3, "N": 5, "hbar_omega": 16}
+    assert sweep.point(5) == {"Z": 3, "N": 6, "hbar_omega": 24}
+    with pytest.raises(IndexError):
+        sweep.point(6)
+
+
+def test_bad_axes():
+    with pytest.raises(ValueError):
+        Product(Zip(Z=[3]), Z=[4])
+    with pytest.raises(ValueError):
+        Product(not_a_parameter=[1])
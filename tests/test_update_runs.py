@@ -0,0 +1,163 @@
+import os
+import pytest
+from sub_modules.ncsd_multi_run import update_runs, prepare_input, \
+    ncsd_multi_run
+from sub_modules.catalog import stamp_filename, read_stamps
+from sub_modules.data_structures import DefaultPolicyObj
+from sub_modules.file_manager import Defaults, parse_mfdp
+from sub_modules.sweep import Product
+
+
+def update(man_params, paths, frequencies=(16, 20), existing="overwrite",
+           **changes):
+    run_list = prepare_input(man_params.replace(**changes),
+                             Product(hbar_omega=list(frequencies)))
+    return update_runs(Defaults(), run_list, paths, "cedar", n_workers=2,
+                       policy=DefaultPolicyObj.replace(existing_dir=existing))
+
+
+def names(run_dirs):
+    return [os.path.basename(run_dir) for run_dir in run_dirs]
+
+
+def finish(run_dir):
+    """what a finished run leaves behind"""
+    with open(os.path.join(run_dir, "mfd.log_output"), "w") as open_file:
+        open_file.write("results\n")
+
+
+def finished(run_dir):
+    return os.path.exists(os.path.join(run_dir, "mfd.log_output"))
+
+
+def read(run_dir, filename):
+    with open(os.path.join(run_dir, filename)) as open_file:
+        return open_file.read()
+
+
+def test_runs_keep_their_directories(man_params, paths):
+    written, report = update(man_params, paths, (16, 20, 24))
+    assert names(report["added"]) == ["Li8", "Li8_2", "Li8_3"]
+    assert len(written) == 3
+    for name in ["Li8", "Li8_2", "Li8_3"]:
+        finish(os.path.join(paths[2], name))
+
+    written, report = update(man_params, paths, (16, 20, 24))
+    assert written == []
+    assert names(report["unchanged"]) == ["Li8", "Li8_2", "Li8_3"]
+
+    # a new point goes in a new directory, the others are where they were
+    written, report = update(man_params, paths, (12, 16, 20, 24))
+    assert names(report["added"]) == ["Li8_4"]
+    assert names(report["unchanged"]) == ["Li8", "Li8_2", "Li8_3"]
+    assert parse_mfdp(os.path.join(paths[2], "Li8_4", "mfdp.dat")) \
+        .hbar_omega == 12
+    for name in ["Li8", "Li8_2", "Li8_3"]:
+        assert finished(os.path.join(paths[2], name))
+
+    # a point that's gone is an orphan, and is kept
+    _, report = update(man_params, paths, (16, 20, 24))
+    assert names(report["orphaned"]) == ["Li8_4"]
+    assert os.path.exists(os.path.join(paths[2], "Li8_4", "mfdp.dat"))
+
+
+def test_changed_runs_keep_their_results(man_params, paths):
+    update(man_params, paths)
+    li8 = os.path.join(paths[2], "Li8")
+    finish(li8)
+    stamp, key = read_stamps(li8)
+    written, report = update(man_params, paths, time="0 12 0")
+    assert names(report["changed"]) == ["Li8", "Li8_2"]
+    assert len(written) == 2
+    assert finished(li8)
+    assert "--time=0-12:00 " in read(li8, "batch_ncsd")
+    new_stamp, new_key = read_stamps(li8)
+    assert new_stamp != stamp and new_key == key
+
+
+@pytest.mark.parametrize("existing", ["skip", "prompt"])
+def test_skip_changed_runs(man_params, paths, existing, monkeypatch):
+    monkeypatch.setattr("builtins.input", lambda prompt="": "n")
+    update(man_params, paths)
+    li8 = os.path.join(paths[2], "Li8")
+    batch = read(li8, "batch_ncsd")
+    written, report = update(man_params, paths, existing=existing,
+                             time="0 12 0")
+    assert written == []
+    assert names(report["skipped"]) == ["Li8", "Li8_2"]
+    assert read(li8, "batch_ncsd") == batch
+
+
+def test_fail_on_changed_runs(man_params, paths):
+    update(man_params, paths)
+    li8 = os.path.join(paths[2], "Li8")
+    batch = read(li8, "batch_ncsd")
+    with pytest.raises(IOError):
+        update(man_params, paths, (16, 20, 24), existing="fail",
+               time="0 12 0")
+    assert read(li8, "batch_ncsd") == batch
+    assert sorted(os.listdir(paths[2])) == ["Li8", "Li8_2"]
+
+
+def test_suffix_changed_runs(man_params, paths):
+    update(man_params, paths, (16,))
+    li8 = os.path.join(paths[2], "Li8")
+    finish(li8)
+    batch = read(li8, "batch_ncsd")
+    written, report = update(man_params, paths, (16,), existing="suffix",
+                             time="0 12 0")
+    assert names(report["changed"]) == ["Li8_2"]
+    assert read(li8, "batch_ncsd") == batch and finished(li8)
+    # the old directory isn't the run anymore
+    _, report = update(man_params, paths, (16,), time="0 12 0")
+    assert names(report["unchanged"]) == ["Li8_2"]
+    assert names(report["orphaned"]) == ["Li8"]
+
+
+def test_runs_without_stamps(man_params, paths):
+    update(man_params, paths, (16, 20, 24))
+    li8, li8_2, li8_3 = [os.path.join(paths[2], name)
+                         for name in ["Li8", "Li8_2", "Li8_3"]]
+    # as if they were made before there were stamps
+    for run_dir in [li8, li8_2, li8_3]:
+        os.remove(os.path.join(run_dir, stamp_filename))
+        finish(run_dir)
+    # an old batch file, that ran ncsd-it.exe from somewhere else
+    batch = read(li8_2, "batch_ncsd").replace("./ncsd-it.exe",
+                                              "../ncsd-it.exe")
+    with open(os.path.join(li8_2, "batch_ncsd"), "w") as open_file:
+        open_file.write(batch)
+    with open(os.path.join(li8_3, "mfdp.dat"), "a") as open_file:
+        open_file.write("edited by hand\n")
+
+    written, report = update(man_params, paths, (16, 20, 24))
+    assert names(report["unchanged"]) == ["Li8"]
+    assert names(report["changed"]) == ["Li8_2"]
+    assert names(report["added"]) == ["Li8_4"]
+    assert len(written) == 2
+    assert read_stamps(li8)[1] is not None
+    assert "../ncsd-it.exe" not in read(li8_2, "batch_ncsd")
+    for run_dir in [li8, li8_2, li8_3]:
+        assert finished(run_dir)
+    assert read_stamps(li8_3) == (None, None)
+
+
+def test_other_executable_is_a_change(man_params, paths, tmp_path):
+    update(man_params, paths)
+    other_exe = str(tmp_path / "other-ncsd-it.exe")
+    with open(other_exe, "w"):
+        pass
+    run_list = prepare_input(man_params, Product(hbar_omega=[16, 20]))
+    _, report = update_runs(
+        Defaults(), run_list, [paths[0], other_exe, paths[2]], "cedar",
+        policy=DefaultPolicyObj.replace(existing_dir="overwrite"))
+    assert names(report["changed"]) == ["Li8", "Li8_2"]
+    assert os.readlink(os.path.join(paths[2], "Li8", "ncsd-it.exe")) == \
+        other_exe
+
+
+def test_incremental_cant_be_staged_or_streamed(man_params, paths):
+    for option in ["staged", "stream"]:
+        with pytest.raises(ValueError):
+            ncsd_multi_run(man_params, paths, "cedar", run=False,
+                           incremental=True, **{option: True})